@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+بنچمارک ساختارهای داده درون‌فرایندی که در هر به‌روزرسانی اجرا می‌شوند
+
+RateLimiter.is_allowed، MetricsCollector (track_user_activity، track_performance و
+get_daily_active_users) و IntelligentCache (get/set و حذف هنگام پر بودن) با
+10 هزار، 100 هزار و 1 میلیون کاربر/کلید پر می‌شوند و هر عملیات جداگانه اندازه
+گرفته می‌شود: عملیات در ثانیه، حافظه نگه‌داشته‌شده و اوج حافظه موقت هر عملیات
+(tracemalloc) و حافظه هر کاربر/کلید پس از پر کردن ساختار.
+
+عملیات هر سناریو تا --ops بار یا تا پایان --time-budget ثانیه (هر کدام زودتر)
+اجرا می‌شود تا سناریوهای O(n) در اندازه‌های بزرگ طول نکشند. خروجی JSON همراه با
+شناسه git است و با --baseline تغییر هر سناریو نسبت به اجرای قبلی چاپ می‌شود.
+
+استفاده:
+    python benchmarks/bench_bookkeeping.py
+    python benchmarks/bench_bookkeeping.py --sizes 10000,100000 --output results/bookkeeping.json
+    python benchmarks/bench_bookkeeping.py --only cache --baseline results/bookkeeping.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def cache_key(index: int) -> str:
+    # هم‌طول کلیدهای واقعی (md5 هگز)
+    return f"{index:032x}"
+
+# --- سناریوها: build(size) ساختار پرشده را می‌سازد و workload(structure, size, ops, rng)
+# تابع عملیات op(i) را برمی‌گرداند؛ حافظه فقط برای build اندازه گرفته می‌شود ---
+
+def build_rate_limiter(size):
+    from core.bot import RateLimiter
+    limiter = RateLimiter(max_requests=100, time_window=60)
+    now = time.time()
+    for user_id in range(size):
+        # چند درخواست اخیر در پنجره، مثل کاربر فعال
+        limiter.user_requests[user_id] = deque(now - offset for offset in (50, 30, 10))
+    return limiter
+
+def build_metrics(size):
+    from core.bot import MetricsCollector, UserMetrics
+    metrics = MetricsCollector()
+    now = datetime.now()
+    yesterday = now - timedelta(days=1)
+    for user_id in range(size):
+        # نیمی از کاربران امروز فعال بوده‌اند
+        seen = now if user_id % 2 else yesterday
+        metrics.user_metrics[user_id] = UserMetrics(
+            user_id=user_id, username=f"user{user_id}",
+            first_seen=seen, last_activity=seen, session_start=seen
+        )
+    metrics.bot_metrics.total_users = size
+    
+    # پنجره 1000 عملیات از ابتدا پر است (حالت پایدار ربات)
+    for index in range(metrics.performance_log.maxlen):
+        metrics.track_performance("warmup", 0.1 + index % 7 / 10, success=index % 10 != 0)
+    return metrics
+
+def build_cache(size):
+    from core.config import config
+    from services.ai_service import IntelligentCache
+    cache = IntelligentCache(max_size=size, ttl_hours=config.CACHE_TTL_HOURS, policy=config.CACHE_POLICY)
+    for index in range(size):
+        cache.set_by_key(cache_key(index), "cached response", "mock")
+    return cache
+
+def existing_user_allowed(limiter, size, ops, rng):
+    user_ids = [rng.randrange(size) for _ in range(ops)]
+    return lambda i: limiter.is_allowed(user_ids[i])
+
+def new_user_allowed(limiter, size, ops, rng):
+    return lambda i: limiter.is_allowed(size + i)
+
+def track_user_activity(metrics, size, ops, rng):
+    user_ids = [rng.randrange(size) for _ in range(ops)]
+    return lambda i: metrics.track_user_activity(user_ids[i], f"user{user_ids[i]}", "callback")
+
+def track_performance(metrics, size, ops, rng):
+    # هزینه به طول performance_log بستگی دارد، نه به تعداد کاربران
+    return lambda i: metrics.track_performance("handle_text", 0.25, success=True)
+
+def daily_active_users(metrics, size, ops, rng):
+    return lambda i: metrics.get_daily_active_users()
+
+def cache_get_hit(cache, size, ops, rng):
+    keys = [cache_key(rng.randrange(size)) for _ in range(ops)]
+    return lambda i: cache.get_by_key(keys[i])
+
+def cache_get_miss(cache, size, ops, rng):
+    return lambda i: cache.get_by_key(cache_key(size + i))
+
+def cache_set_evict(cache, size, ops, rng):
+    # کش پر است، پس هر set کلید جدید یک حذف هم انجام می‌دهد
+    return lambda i: cache.set_by_key(cache_key(size + i), "cached response", "mock")
+
+SCENARIOS = {
+    "rate_limiter.is_allowed": (build_rate_limiter, existing_user_allowed),
+    "rate_limiter.is_allowed[new_user]": (build_rate_limiter, new_user_allowed),
+    "metrics.track_user_activity": (build_metrics, track_user_activity),
+    "metrics.track_performance": (build_metrics, track_performance),
+    "metrics.get_daily_active_users": (build_metrics, daily_active_users),
+    "cache.get[hit]": (build_cache, cache_get_hit),
+    "cache.get[miss]": (build_cache, cache_get_miss),
+    "cache.set[evict]": (build_cache, cache_set_evict),
+}
+
+def timed_loop(op, first: int, ops: int, budget: float):
+    """اجرای op(first) تا op(first + ops - 1)، یا تا پایان بودجه زمانی (حداقل یک عملیات)"""
+    deadline = time.perf_counter() + budget
+    done = 0
+    start = time.perf_counter()
+    for i in range(first, first + ops):
+        op(i)
+        done += 1
+        if time.perf_counter() > deadline:
+            break
+    return done, time.perf_counter() - start
+
+def run_scenario(build, workload, size: int, args) -> dict:
+    """پر کردن ساختار، اندازه‌گیری زمان و سپس حافظه عملیات"""
+    rng = random.Random(args.seed)
+    gc.collect()
+    tracemalloc.start()
+    setup_start = time.perf_counter()
+    structure = build(size)
+    setup_seconds = time.perf_counter() - setup_start
+    setup_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ورودی‌ها برای هر دو مرحله زمان و حافظه کافی باشند
+    op = workload(structure, size, args.ops + args.alloc_ops, rng)
+    
+    # زمان: بدون tracemalloc
+    gc.collect()
+    done, elapsed = timed_loop(op, 0, args.ops, args.time_budget)
+    
+    # حافظه: ادامه همان دنباله عملیات زیر tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    alloc_ops, _ = timed_loop(op, done, args.alloc_ops, args.time_budget)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    del op, structure
+    gc.collect()
+    return {
+        "size": size,
+        "ops": done,
+        "ops_per_sec": round(done / elapsed) if elapsed else 0,
+        "us_per_op": round(elapsed / done * 1e6, 3) if done else 0,
+        "retained_bytes_per_op": round((current - before) / alloc_ops, 1),
+        "peak_transient_bytes": peak - before,
+        "alloc_ops": alloc_ops,
+        "setup_seconds": round(setup_seconds, 2),
+        "bytes_per_key": round(setup_bytes / size, 1)
+    }
+
+def compare(result: dict, baseline: dict):
+    """چاپ تغییر ops/sec و حافظه هر سناریو نسبت به اجرای پایه"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    
+    print(f"\nbaseline {baseline.get('revision')} -> {result['revision']}", file=sys.stderr)
+    for key, stats in result["results"].items():
+        old = baseline["results"].get(key)
+        if old:
+            print(f"{key:52s} {old['ops_per_sec']:>12,} -> {stats['ops_per_sec']:>12,} ops/s "
+                  f"({change(stats['ops_per_sec'], old['ops_per_sec'])}), "
+                  f"peak {old['peak_transient_bytes']} -> {stats['peak_transient_bytes']} B",
+                  file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-update bookkeeping microbenchmarks")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="تعداد کاربران/کلیدها")
+    parser.add_argument("--ops", type=int, default=50000, help="حداکثر عملیات هر سناریو")
+    parser.add_argument("--time-budget", type=float, default=2.0, help="حداکثر ثانیه اندازه‌گیری هر سناریو")
+    parser.add_argument("--alloc-ops", type=int, default=2000, help="عملیات اندازه‌گیری حافظه")
+    parser.add_argument("--only", help="فقط سناریوهایی که نامشان شامل این عبارت است")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="فایل JSON نتیجه")
+    parser.add_argument("--baseline", help="نتیجه اجرای قبلی برای مقایسه")
+    args = parser.parse_args()
+    
+    # ماژول‌های ربات مسیرهای نسبی (logs/) دارند و هنگام import تنظیمات را از محیط می‌خوانند
+    os.chdir(PROJECT_ROOT)
+    os.environ.setdefault("AI_PROVIDERS", "mock")
+    os.environ["DISK_CACHE_ENABLED"] = "false"
+    import core.bot  # noqa: F401  (پیکربندی logging ربات پیش از خاموش کردن آن)
+    logging.disable(logging.CRITICAL)
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    scenarios = {name: scenario for name, scenario in SCENARIOS.items() if not args.only or args.only in name}
+    
+    results = {}
+    print(f"{'scenario':<36} {'size':>9} {'ops/sec':>12} {'us/op':>10} {'B/op kept':>10} "
+          f"{'peak B':>10} {'B/key':>8}")
+    for name, (build, workload) in scenarios.items():
+        for size in sizes:
+            stats = run_scenario(build, workload, size, args)
+            results[f"{name}@{size}"] = stats
+            print(f"{name:<36} {size:>9,} {stats['ops_per_sec']:>12,} {stats['us_per_op']:>10} "
+                  f"{stats['retained_bytes_per_op']:>10} {stats['peak_transient_bytes']:>10,} "
+                  f"{stats['bytes_per_key']:>8}", flush=True)
+    
+    result = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"sizes": sizes, "ops": args.ops, "time_budget": args.time_budget,
+                   "alloc_ops": args.alloc_ops, "seed": args.seed},
+        "results": results
+    }
+    
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"results written to {args.output}", file=sys.stderr)
+    
+    if args.baseline:
+        compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+آزمون بار سرتاسری JournalistBot با به‌روزرسانی‌های ساختگی تلگرام
+
+ربات واقعی (Application، handlerها، rate limiter، متریک‌ها و AIService) ساخته
+می‌شود، اما Bot API یک سرور HTTP محلی روی 127.0.0.1 است (TELEGRAM_BASE_URL) و
+ارائه‌دهنده AI نوع mock (بدون شبکه و کلید API). N کاربر شبیه‌سازی‌شده هم‌زمان
+جریان‌های واقعی را طی می‌کنند: کلیک منو، انتخاب عملیات (تغییر state) و ارسال متن.
+
+خروجی JSON است: توان عملیاتی، صدک‌های p50/p95/p99 زمان هر عملیات، رشد حافظه
+(RSS و در صورت --tracemalloc حافظه پایتون)، اندازه ساختارهای هر کاربر و تعداد
+فراخوانی‌های Bot API؛ با --baseline تغییر نسبت به اجرای قبلی هم چاپ می‌شود.
+
+استفاده:
+    python benchmarks/bench_bot_load.py
+    python benchmarks/bench_bot_load.py --users 2000 --sessions 2 --output results/load.json
+    python benchmarks/bench_bot_load.py --ai-latency lognormal:1.5:0.6 --baseline results/load.json
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Journalist", "username": "load_test_bot"}
+
+# جریان‌های کاربر: (وزن، مراحل)؛ هر مرحله ("callback", داده) یا ("text", نوع متن)
+FLOWS = {
+    "headlines": (30, [("callback", "show_content_menu"), ("callback", "news_write"), ("text", "news")]),
+    "summary": (15, [("callback", "show_content_menu"), ("callback", "news_summary"), ("text", "article")]),
+    "fact_check": (15, [("callback", "show_content_menu"), ("callback", "news_factcheck"), ("text", "claim")]),
+    "video_script": (10, [("callback", "show_media_menu"), ("callback", "media_video_script"), ("text", "topic")]),
+    "prompt": (10, [("callback", "show_ai_menu"), ("callback", "ai_prompt_engineer"), ("text", "topic")]),
+    "browse": (15, [("callback", "show_content_menu"), ("callback", "main_menu"), ("callback", "show_media_menu")]),
+    "free_text": (5, [("text", "chat")]),
+}
+
+SAMPLE_TEXTS = {
+    "news": "شورای شهر تهران امروز طرح توسعه حمل‌ونقل عمومی را با {n} رأی موافق تصویب کرد و اجرای آن از ماه آینده آغاز می‌شود.",
+    "claim": "گفته می‌شود مصرف آب در شهر {n} درصد نسبت به سال گذشته کاهش یافته است.",
+    "topic": "تأثیر هوش مصنوعی بر روزنامه‌نگاری محلی، بخش {n}",
+    "chat": "سلام، چطور می‌توانم گزارش بهتری بنویسم؟ ({n})",
+    "article": " ".join(
+        f"بند {index}: گزارش‌ها نشان می‌دهد که وضعیت بازار در هفته گذشته تغییر کرده است و کارشناسان "
+        f"دلایل متفاوتی برای آن برمی‌شمارند."
+        for index in range(12)
+    ) + " شماره {n}.",
+}
+
+class StandInBotAPI:
+    """Bot API محلی: سرور HTTP/1.1 با keep-alive که به متدهای مورد استفاده ربات پاسخ ساختگی می‌دهد"""
+    
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.rate_limited_replies = 0
+        self._message_ids = itertools.count(1_000_000)
+        self._server = None
+    
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/bot"
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                
+                method = request_line.split()[1].rsplit("/", 1)[-1]
+                self.calls[method] += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                payload = json.dumps({
+                    "ok": True,
+                    "result": self._result(method, self._parse(body, headers.get("content-type", "")))
+                }).encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(payload) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    @staticmethod
+    def _parse(body: bytes, content_type: str) -> dict:
+        if not body:
+            return {}
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        return {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+    
+    def _message(self, chat_id, text: str, message_id=None) -> dict:
+        return {
+            "message_id": int(message_id) if message_id else next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+            "from": BOT_USER,
+            "text": text or ""
+        }
+    
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "sendMessage":
+            if params.get("text", "").startswith("⚠️ **محدودیت درخواست**"):
+                self.rate_limited_replies += 1
+            return self._message(params.get("chat_id"), params.get("text"))
+        if method == "editMessageText":
+            return self._message(params.get("chat_id"), params.get("text"), params.get("message_id"))
+        return True
+
+def rss_bytes() -> int:
+    """حافظه مقیم فعلی فرایند (لینوکس)؛ در غیر این صورت بیشینه RSS"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+def percentile(sorted_values, fraction: float) -> float:
+    """صدک با روش nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class LoadGenerator:
+    """ساخت Update های ساختگی و اجرای جریان‌های N کاربر روی Application"""
+    
+    def __init__(self, app, args):
+        self.app = app
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies = defaultdict(list)
+        self._update_ids = itertools.count(1)
+        self._unique = itertools.count(1)
+        flows = list(FLOWS.items())
+        self._flow_names = [name for name, _ in flows]
+        self._flow_weights = [weight for _, (weight, _) in flows]
+    
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+    
+    def _text(self, kind: str) -> str:
+        # بخشی از متن‌ها تکراری‌اند (کش و ادغام درخواست‌ها)، بقیه یکتا
+        if self.rng.random() < self.args.repeat_ratio:
+            number = self.rng.randrange(20)
+        else:
+            number = 1000 + next(self._unique)
+        return SAMPLE_TEXTS[kind].format(n=number)
+    
+    def _update(self, user_id: int, step) -> dict:
+        kind, value = step
+        update_id = next(self._update_ids)
+        chat = {"id": user_id, "type": "private"}
+        if kind == "callback":
+            return {
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "from": self._user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": value,
+                    "message": {"message_id": update_id, "date": int(time.time()), "chat": chat,
+                                "from": BOT_USER, "text": "📋 منوی اصلی"}
+                }
+            }
+        return {
+            "update_id": update_id,
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": chat,
+                        "from": self._user(user_id), "text": self._text(value)}
+        }
+    
+    async def _run_user(self, user_id: int, start_delay: float):
+        from telegram import Update
+        
+        await asyncio.sleep(start_delay)
+        for _ in range(self.args.sessions):
+            flow = self.rng.choices(self._flow_names, self._flow_weights)[0]
+            for step in FLOWS[flow][1]:
+                operation = f"callback:{step[1]}" if step[0] == "callback" else f"text:{flow}"
+                update = Update.de_json(self._update(user_id, step), self.app.bot)
+                started = time.perf_counter()
+                await self.app.process_update(update)
+                self.latencies[operation].append(time.perf_counter() - started)
+                if self.args.think_time:
+                    await asyncio.sleep(self.rng.expovariate(1.0 / self.args.think_time))
+    
+    async def run(self) -> float:
+        users = [
+            self._run_user(100_000 + index, self.args.ramp_up * index / max(self.args.users, 1))
+            for index in range(self.args.users)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*users)
+        return time.perf_counter() - started
+
+def summarize(latencies) -> dict:
+    """صدک‌ها (میلی‌ثانیه) برای هر عملیات"""
+    summary = {}
+    for operation, values in sorted(latencies.items()):
+        values = sorted(values)
+        summary[operation] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2)
+        }
+    return summary
+
+def compare(result: dict, baseline: dict):
+    """چاپ تغییر توان عملیاتی و p95 نسبت به اجرای پایه"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    
+    old_rate = baseline["throughput"]["updates_per_second"]
+    new_rate = result["throughput"]["updates_per_second"]
+    print(f"throughput: {old_rate} -> {new_rate} updates/s ({change(new_rate, old_rate)})", file=sys.stderr)
+    for operation, stats in result["operations"].items():
+        old = baseline["operations"].get(operation)
+        if old:
+            print(f"{operation:40s} p95 {old['p95_ms']:>9} -> {stats['p95_ms']:>9} ms "
+                  f"({change(stats['p95_ms'], old['p95_ms'])})", file=sys.stderr)
+    old_growth = baseline["memory"]["rss_growth_per_user_bytes"]
+    new_growth = result["memory"]["rss_growth_per_user_bytes"]
+    print(f"rss growth per user: {old_growth} -> {new_growth} bytes", file=sys.stderr)
+
+async def run_benchmark(args) -> dict:
+    api = StandInBotAPI(latency=args.api_latency)
+    os.environ["TELEGRAM_BASE_URL"] = await api.start()
+    
+    # ماژول‌های پروژه تنظیمات را هنگام import از محیط می‌خوانند، پس پس از تنظیم محیط
+    from core.bot import JournalistBot
+    from services.ai_service import ai_service
+    
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    
+    bot = JournalistBot()
+    await bot.app.initialize()
+    
+    if args.tracemalloc:
+        tracemalloc.start()
+    gc.collect()
+    rss_before = rss_bytes()
+    
+    generator = LoadGenerator(bot.app, args)
+    elapsed = await generator.run()
+    
+    gc.collect()
+    rss_after = rss_bytes()
+    traced = tracemalloc.get_traced_memory() if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    
+    updates = sum(len(values) for values in generator.latencies.values())
+    service_stats = ai_service.get_service_stats()
+    result = {
+        "benchmark": "bot_load",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "parameters": {name: value for name, value in vars(args).items() if name not in ("output", "baseline")},
+        "throughput": {
+            "updates": updates,
+            "elapsed_seconds": round(elapsed, 3),
+            "updates_per_second": round(updates / elapsed, 2) if elapsed else 0
+        },
+        "operations": summarize(generator.latencies),
+        "memory": {
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": rss_after,
+            "rss_growth_bytes": rss_after - rss_before,
+            "rss_growth_per_user_bytes": round((rss_after - rss_before) / max(args.users, 1)),
+            "python_allocated_bytes": traced[0] if traced else None,
+            "python_peak_bytes": traced[1] if traced else None
+        },
+        "state": {
+            "user_data_entries": len(bot.app.user_data),
+            "user_metrics": len(bot.metrics.user_metrics),
+            "rate_limiter_users": len(bot.rate_limiter.user_requests),
+            "performance_log": len(bot.metrics.performance_log),
+            "ai_cache_entries": service_stats["cache"].get("size")
+        },
+        "errors": {
+            "bot_errors": bot.metrics.bot_metrics.total_errors,
+            "rate_limited_replies": api.rate_limited_replies
+        },
+        "bot_api_calls": dict(api.calls),
+        "ai": {
+            "providers": service_stats["providers"],
+            "cache_hit_rate": service_stats["cache"].get("hit_rate"),
+            "coalescing": service_stats["coalescing"],
+            "concurrency": service_stats["concurrency"]
+        }
+    }
+    
+    await bot.app.shutdown()
+    await ai_service.aclose()
+    await api.stop()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end JournalistBot load test")
+    parser.add_argument("--users", type=int, default=500, help="کاربران هم‌زمان")
+    parser.add_argument("--sessions", type=int, default=2,
+                        help="جریان هر کاربر (بیش از حد rate limiter پاسخ محدودیت می‌گیرد)")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="ثانیه تا شروع همه کاربران")
+    parser.add_argument("--think-time", type=float, default=0.2, help="میانگین مکث کاربر بین مراحل (ثانیه)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="سهم متن‌های تکراری")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="تأخیر هر فراخوانی Bot API (ثانیه)")
+    parser.add_argument("--ai-latency", default="lognormal:0.8:0.5", help="توزیع زمان تا اولین توکن AI")
+    parser.add_argument("--ai-tokens-per-second", type=float, default=100)
+    parser.add_argument("--ai-output-tokens", type=int, default=150)
+    parser.add_argument("--ai-error-rates", default="", help='مثلاً "rate_limit:0.02,server_error:0.01"')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="اندازه‌گیری حافظه پایتون (کندتر)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="فایل JSON نتیجه (پیش‌فرض: stdout)")
+    parser.add_argument("--baseline", help="نتیجه اجرای قبلی برای مقایسه")
+    args = parser.parse_args()
+    
+    # ربات مسیرهای نسبی (logs/، cache/) دارد
+    os.chdir(PROJECT_ROOT)
+    os.environ.update({
+        "BOT_TOKEN": os.environ.get("BOT_TOKEN") or "123456:LOAD-TEST",
+        "AI_PROVIDERS": "mock",
+        "MOCK_LATENCY": args.ai_latency,
+        "MOCK_TOKENS_PER_SECOND": str(args.ai_tokens_per_second),
+        "MOCK_OUTPUT_TOKENS": str(args.ai_output_tokens),
+        "MOCK_ERROR_RATES": args.ai_error_rates,
+        "MOCK_SEED": str(args.seed),
+        "DISK_CACHE_ENABLED": "false"
+    })
+    
+    result = asyncio.run(run_benchmark(args))
+    
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    
+    if args.baseline:
+        compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+بنچمارک هزینه آماده‌سازی مدل Gemini در هر درخواست
+
+مقایسه ساخت GenerativeModel و GenerationConfig در هر فراخوانی (روش قبلی)
+با دریافت مدل از GeminiModelRegistry (روش فعلی). هیچ درخواست شبکه‌ای ارسال نمی‌شود.
+
+استفاده:
+    python benchmarks/bench_gemini_models.py [--iterations 20000]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import google.generativeai as genai
+
+from data.prompts import AI_MODEL_SETTINGS
+from services.providers import GeminiModelRegistry
+
+def build_per_call():
+    """روش قبلی: ساخت مدل و تنظیمات در هر درخواست"""
+    settings = dict(AI_MODEL_SETTINGS["gemini"])
+    model_name = settings.pop("model")
+    model = genai.GenerativeModel(model_name)
+    generation_config = genai.types.GenerationConfig(**settings)
+    return model, generation_config
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini per-call setup benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    
+    registry = GeminiModelRegistry()
+    registry.get_default_model()  # گرم کردن
+    
+    before = min(timeit.repeat(build_per_call, number=args.iterations, repeat=3))
+    after = min(timeit.repeat(registry.get_default_model, number=args.iterations, repeat=3))
+    
+    before_us = before / args.iterations * 1e6
+    after_us = after / args.iterations * 1e6
+    
+    print(f"iterations:          {args.iterations}")
+    print(f"per-call build:      {before_us:8.2f} us/call")
+    print(f"registry lookup:     {after_us:8.2f} us/call")
+    print(f"speedup:             {before_us / after_us:8.1f}x")
+    print(f"registry stats:      {registry.get_stats()}")
+
+if __name__ == "__main__":
+    main()
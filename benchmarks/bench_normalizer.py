@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+بنچمارک نرمال‌سازی متن فارسی
+
+روی مقاله‌های مصنوعی ~10KB سرعت نرمال‌سازی قبلی کلید کش (lower + یکی کردن
+فاصله‌ها) با normalize_for_key و normalize_text مقایسه می‌شود. همچنین برای
+گونه‌های نوشتاری یک متن (ی/ک عربی، ارقام، نیم‌فاصله، کشیده، اعراب) تعداد
+کلیدهای کش متمایز گزارش می‌شود (کمتر = hit بیشتر).
+
+استفاده:
+    python benchmarks/bench_normalizer.py [--size 10240] [--articles 50] [--repeat 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from utils.text_normalizer import normalize_for_key, normalize_text
+
+WORDS = [
+    "خبر", "گزارش", "دولت", "مجلس", "اقتصاد", "بازار", "کشور", "مردم", "سیاست", "تهران",
+    "می‌شود", "می‌گوید", "کرده‌اند", "نشان‌دهنده", "یکی", "برای", "درباره", "پیش‌بینی",
+    "۱۴۰۳", "۲۵", "درصد", "میلیارد", "تومان", "رئیس", "وزیر", "کمیسیون", "تصمیم", "افزایش",
+]
+
+# جایگزینی‌هایی که کاربران یا منابع مختلف در عمل تولید می‌کنند
+VARIANTS = [
+    ("ی", "ي"),             # ی عربی
+    ("ک", "ك"),             # ک عربی
+    ("\u200c", " "),       # نیم‌فاصله -> فاصله
+    ("\u200c", "\u200c\u200c"),  # نیم‌فاصله تکراری
+    ("۱", "١"),             # ارقام عربی
+    ("۴", "4"),             # ارقام لاتین
+    ("ا", "ـا"),            # کشیده
+    ("ر", "رَ"),            # اعراب
+]
+
+def make_article(size: int, rng: random.Random) -> str:
+    """مقاله مصنوعی با جمله‌ها و پاراگراف‌ها"""
+    parts = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) + "."
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:size]
+
+def apply_variants(text: str, indexes) -> str:
+    """اعمال جایگزینی‌های انتخاب‌شده از VARIANTS"""
+    for index in indexes:
+        source, target = VARIANTS[index]
+        text = text.replace(source, target)
+    return text
+
+def legacy_key(text: str) -> str:
+    """نرمال‌سازی قبلی IntelligentCache._generate_key"""
+    return " ".join(text.strip().lower().split())
+
+def measure(func, articles, repeat: int) -> float:
+    """بهترین زمان (میکروثانیه) برای هر مقاله"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for article in articles:
+            func(article)
+        best = min(best, time.perf_counter() - start)
+    return best / len(articles) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Persian text normalization benchmark")
+    parser.add_argument("--size", type=int, default=10240, help="article size in characters")
+    parser.add_argument("--articles", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    articles = [make_article(args.size, rng) for _ in range(args.articles)]
+    
+    # همان مقاله‌ها با همه گونه‌های نوشتاری (بدترین حالت برای نرمال‌سازی)
+    mixed = [apply_variants(article, range(len(VARIANTS))) for article in articles]
+    
+    print(f"articles: {args.articles} x {args.size} chars\n")
+    print(f"{'input':<8} {'function':<20} {'us/article':>12} {'MB/s':>10}")
+    for label, inputs in (("clean", articles), ("mixed", mixed)):
+        for name, func in (("legacy key", legacy_key),
+                           ("normalize_for_key", normalize_for_key),
+                           ("normalize_text", normalize_text)):
+            per_article = measure(func, inputs, args.repeat)
+            megabytes_per_sec = len(inputs[0].encode("utf-8")) / per_article
+            print(f"{label:<8} {name:<20} {per_article:>12.1f} {megabytes_per_sec:>10.1f}")
+    
+    # گونه‌های نوشتاری یک متن: هر ترکیب از جایگزینی‌ها
+    base = articles[0]
+    variants = {base}
+    for mask in range(1, 1 << len(VARIANTS)):
+        variants.add(apply_variants(base, [index for index in range(len(VARIANTS)) if mask >> index & 1]))
+    
+    print(f"\nspelling variants of one article: {len(variants)}")
+    print(f"distinct legacy keys:            {len({legacy_key(text) for text in variants})}")
+    print(f"distinct normalized keys:        {len({normalize_for_key(text) for text in variants})}")
+
+if __name__ == "__main__":
+    main()
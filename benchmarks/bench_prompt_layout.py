@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+مقایسه مصرف توکن ورودی دو چیدمان درخواست برای همه قالب‌های PROMPTS
+
+- inline (چیدمان قبلی): پیام system ثابت یک‌خطی و قالب کامل همراه داده کاربر در یک پیام user
+- system (چیدمان فعلی): پیام ثابت و پس از آن قالب بدون تغییر (get_system_prompt) در نقش system
+  و داده کاربر در پیام user
+
+برای هر قالب --requests درخواست با داده‌های متفاوت ساخته می‌شود و برای هر چیدمان
+میانگین توکن ورودی، طول پیشوند ثابت مشترک همه درخواست‌ها، بخش قابل کش آن (قاعده
+OpenAI: حداقل --cache-min-tokens توکن، در گام‌های --cache-block توکن) و توکن ورودی
+صورت‌حساب با تخفیف --cached-discount برای توکن‌های کش‌شده گزارش می‌شود. توکن‌ها
+به طور پیش‌فرض از طول متن تخمین زده می‌شوند (QUOTA_CHARS_PER_TOKEN)؛ با --live
+درخواست‌ها واقعاً به ارائه‌دهنده فرستاده می‌شوند و prompt_tokens و cached_tokens
+گزارش‌شده خود ارائه‌دهنده (یا شبیه‌سازی mock) ثبت می‌شود.
+
+استفاده:
+    python benchmarks/bench_prompt_layout.py
+    python benchmarks/bench_prompt_layout.py --requests 50 --cached-discount 0.9 --output results/prompt_layout.json
+    python benchmarks/bench_prompt_layout.py --live openai --requests 5 --baseline results/prompt_layout.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# پیام user هر قالب، همان‌طور که AIService می‌سازد؛ قالب‌هایی که سرویس مستقیماً
+# استفاده نمی‌کند فقط داده کاربر را می‌گیرند
+USER_MESSAGES = {
+    "headlines_and_leads": "متن خبری:\n{payload}",
+    "article_summary": "متن مقاله:\n{payload}",
+    "article_chunk_summary": "بخش مقاله:\n{payload}",
+    "fact_check": "ادعای مورد بررسی:\n{payload}",
+    "video_script": "\nموضوع: {payload}\nمدت: 60 ثانیه\nپلتفرم: instagram\n        ",
+    "prompt_engineering": "\nنیازمندی‌ها: {payload}\nسطح پیچیدگی: standard\n        ",
+}
+
+SAMPLE_SENTENCES = [
+    "شورای شهر امروز طرح توسعه حمل‌ونقل عمومی را با {n} رأی موافق تصویب کرد.",
+    "گفته می‌شود مصرف آب در استان {n} درصد نسبت به سال گذشته کاهش یافته است.",
+    "وزارت بهداشت از آغاز مرحله {n} واکسیناسیون در مدارس خبر داد.",
+    "کارشناسان می‌گویند قیمت مسکن در {n} ماه گذشته ثابت مانده است.",
+    "تیم ملی در دیدار {n} مقدماتی با نتیجه مساوی به کار خود پایان داد.",
+]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def sample_payloads(count: int, max_sentences: int, rng: random.Random) -> list:
+    """داده‌های کاربر با طول متفاوت (قطعی با --seed)"""
+    return [
+        " ".join(rng.choice(SAMPLE_SENTENCES).format(n=rng.randint(2, 99))
+                 for _ in range(rng.randint(1, max_sentences)))
+        for _ in range(count)
+    ]
+
+def build_requests(name: str, payloads: list) -> dict:
+    """(system, user) هر درخواست در دو چیدمان"""
+    from data.prompts import PROMPTS, get_system_prompt
+    user_format = USER_MESSAGES.get(name, "{payload}")
+    users = [user_format.format(payload=payload) for payload in payloads]
+    return {
+        # get_prompt قبلی خود قالب را بدون strip برمی‌گرداند
+        "inline": [(None, f"{PROMPTS[name]}\n\n{user}") for user in users],
+        "system": [(get_system_prompt(name), user) for user in users],
+    }
+
+def serialize(system, user) -> str:
+    """متن درخواست به ترتیب پیام‌ها؛ پیام ثابت SYSTEM_MESSAGE همیشه پیش از قالب system می‌آید"""
+    from services.providers import system_message
+    return f"{system_message(system)}\n\n{user}"
+
+def summarize(prompt_tokens: list, cached_tokens: list, stable_prefix_tokens: int, discount: float) -> dict:
+    """میانگین‌ها و توکن ورودی صورت‌حساب برای یک چیدمان"""
+    count = len(prompt_tokens)
+    billed = sum(tokens - cached * discount for tokens, cached in zip(prompt_tokens, cached_tokens))
+    return {
+        "avg_prompt_tokens": round(sum(prompt_tokens) / count, 1),
+        "stable_prefix_tokens": stable_prefix_tokens,
+        "avg_cached_tokens": round(sum(cached_tokens) / count, 1),
+        "cached_share_percent": round(sum(cached_tokens) / max(sum(prompt_tokens), 1) * 100, 1),
+        "billed_input_tokens": round(billed),
+        "billed_per_request": round(billed / count, 1),
+    }
+
+def estimate_layout(requests: list, args) -> dict:
+    """تخمین از روی متن: اولین درخواست پیشوند را در کش می‌نشاند، بقیه از آن می‌خوانند"""
+    from utils.text_chunker import estimate_tokens
+    texts = [serialize(system, user) for system, user in requests]
+    prompt_tokens = [estimate_tokens(text, args.chars_per_token) for text in texts]
+    stable = estimate_tokens(os.path.commonprefix(texts), args.chars_per_token)
+    cacheable = stable // args.cache_block * args.cache_block if stable >= args.cache_min_tokens else 0
+    cached_tokens = [0] + [min(cacheable, tokens) for tokens in prompt_tokens[1:]]
+    return summarize(prompt_tokens, cached_tokens, stable, args.cached_discount)
+
+async def measure_layout(provider, requests: list, args) -> dict:
+    """ارسال واقعی درخواست‌ها و ثبت مصرف گزارش‌شده ارائه‌دهنده"""
+    from utils.text_chunker import estimate_tokens
+    prompt_tokens, cached_tokens = [], []
+    for system, user in requests:
+        usage = {}
+        await provider.generate(user, usage, system=system)
+        prompt_tokens.append(usage.get("prompt_tokens") or 0)
+        cached_tokens.append(usage.get("cached_tokens") or 0)
+    texts = [serialize(system, user) for system, user in requests]
+    stable = estimate_tokens(os.path.commonprefix(texts), args.chars_per_token)
+    return summarize(prompt_tokens, cached_tokens, stable, args.cached_discount)
+
+def change(new, old) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+def compare(result: dict, baseline: dict):
+    """چاپ تغییر توکن ورودی صورت‌حساب هر درخواست (چیدمان system) نسبت به اجرای پایه"""
+    print(f"\nbaseline {baseline.get('revision')} -> {result['revision']}", file=sys.stderr)
+    for name, layouts in result["results"].items():
+        old = baseline["results"].get(name)
+        if old:
+            old_billed = old["system"]["billed_per_request"]
+            new_billed = layouts["system"]["billed_per_request"]
+            print(f"{name:24s} billed/request {old_billed:>9} -> {new_billed:>9} ({change(new_billed, old_billed)})",
+                  file=sys.stderr)
+
+async def run(args) -> dict:
+    from data.prompts import PROMPTS
+    
+    provider = None
+    if args.live:
+        from services.providers import create_providers
+        provider = create_providers([args.live])[0]
+        if not provider.is_configured():
+            raise SystemExit(f"provider {args.live} is not configured (API key)")
+    
+    rng = random.Random(args.seed)
+    results = {}
+    print(f"{'template':<24} {'layout':<7} {'prompt tok':>10} {'stable':>8} {'cached %':>9} {'billed':>10}")
+    for name in PROMPTS:
+        payloads = sample_payloads(args.requests, args.max_sentences, rng)
+        layouts = {}
+        for layout, requests in build_requests(name, payloads).items():
+            if provider is not None:
+                stats = await measure_layout(provider, requests, args)
+            else:
+                stats = estimate_layout(requests, args)
+            layouts[layout] = stats
+            print(f"{name:<24} {layout:<7} {stats['avg_prompt_tokens']:>10} {stats['stable_prefix_tokens']:>8} "
+                  f"{stats['cached_share_percent']:>9} {stats['billed_input_tokens']:>10,}", flush=True)
+        layouts["billed_change"] = change(layouts["system"]["billed_input_tokens"],
+                                          layouts["inline"]["billed_input_tokens"])
+        results[name] = layouts
+    
+    if provider is not None:
+        await provider.aclose()
+    
+    totals = {
+        layout: sum(layouts[layout]["billed_input_tokens"] for layouts in results.values())
+        for layout in ("inline", "system")
+    }
+    print(f"\nbilled input tokens, all templates: inline {totals['inline']:,} -> system {totals['system']:,} "
+          f"({change(totals['system'], totals['inline'])})")
+    
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"requests": args.requests, "max_sentences": args.max_sentences, "seed": args.seed,
+                   "live": args.live, "chars_per_token": args.chars_per_token,
+                   "cache_min_tokens": args.cache_min_tokens, "cache_block": args.cache_block,
+                   "cached_discount": args.cached_discount},
+        "results": results,
+        "totals": totals
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt layout token usage comparison")
+    parser.add_argument("--requests", type=int, default=20, help="درخواست‌های هر قالب")
+    parser.add_argument("--max-sentences", type=int, default=8, help="حداکثر جمله داده هر درخواست")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--live", help="نام ارائه‌دهنده (مثل mock یا openai) برای ارسال واقعی درخواست‌ها")
+    parser.add_argument("--chars-per-token", type=float, help="پیش‌فرض QUOTA_CHARS_PER_TOKEN")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="کوتاه‌ترین پیشوند قابل کش")
+    parser.add_argument("--cache-block", type=int, default=128, help="گام طول پیشوند کش‌شده")
+    parser.add_argument("--cached-discount", type=float, default=0.5, help="تخفیف قیمت توکن کش‌شده (0 تا 1)")
+    parser.add_argument("--output", help="فایل JSON نتیجه")
+    parser.add_argument("--baseline", help="نتیجه اجرای قبلی برای مقایسه")
+    args = parser.parse_args()
+    
+    # ماژول‌های ربات هنگام import تنظیمات را از محیط می‌خوانند
+    os.chdir(PROJECT_ROOT)
+    os.environ["DISK_CACHE_ENABLED"] = "false"
+    from core.config import config
+    logging.basicConfig(level=logging.WARNING)
+    if args.chars_per_token is None:
+        args.chars_per_token = config.QUOTA_CHARS_PER_TOKEN
+    
+    result = asyncio.run(run(args))
+    
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"results written to {args.output}", file=sys.stderr)
+    
+    if args.baseline:
+        compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
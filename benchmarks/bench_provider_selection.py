@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+شبیه‌سازی سیاست‌های انتخاب ارائه‌دهنده
+
+شبیه‌سازی رویدادمحور (بدون شبکه و با زمان مجازی): درخواست‌ها با فرایند پواسون
+می‌رسند و هر ارائه‌دهنده زمان پاسخ log-normal، ظرفیت هم‌زمانی (بیش از آن صف و
+کندی) و نرخ خطا دارد. در میانه اجرا یک ارائه‌دهنده کند می‌شود و سپس بهبود می‌یابد.
+برای هر سیاست صدک‌های زمان پاسخ، نرخ خطا و سهم ترافیک گزارش می‌شود.
+
+استفاده:
+    python benchmarks/bench_provider_selection.py
+    python benchmarks/bench_provider_selection.py --rate 40 --duration 600 --slowdown 4
+"""
+
+import argparse
+import heapq
+import math
+import random
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.provider_selection import ProviderSelector, SelectionPolicy
+
+class SimulatedProvider:
+    """مدل ساده ارائه‌دهنده: log-normal + کندی در صورت عبور از ظرفیت"""
+    
+    def __init__(self, name: str, median: float, sigma: float, capacity: int, error_rate: float):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.slowdown = 1.0
+        self.in_flight = 0
+    
+    def sample(self, rng: random.Random):
+        """(زمان پاسخ، موفقیت) برای درخواست جدید"""
+        overload = max(0, self.in_flight - self.capacity) / self.capacity
+        latency = rng.lognormvariate(math.log(self.median), self.sigma) * self.slowdown * (1 + overload)
+        return latency, rng.random() >= self.error_rate
+
+class LegacySelector:
+    """سیاست قبلی LoadBalancer: max روی (نرخ موفقیت کل، -میانگین کل زمان پاسخ)"""
+    
+    def __init__(self):
+        self.stats = {}
+    
+    def choose(self, candidates, now=None):
+        def score(key):
+            total, successes, latency_sum = self.stats.get(key, (0, 0, 0.0))
+            success_rate = successes / total * 100 if total else 0.0
+            average = latency_sum / successes if successes else 0.0
+            return success_rate, -average
+        return max(candidates, key=score)
+    
+    def request_started(self, key):
+        pass
+    
+    def request_finished(self, key, latency, success, now=None):
+        total, successes, latency_sum = self.stats.get(key, (0, 0, 0.0))
+        if success:
+            self.stats[key] = (total + 1, successes + 1, latency_sum + latency)
+        else:
+            self.stats[key] = (total + 1, successes, latency_sum)
+
+class RandomSelector(LegacySelector):
+    """پایه: انتخاب تصادفی یکنواخت"""
+    
+    def __init__(self, rng: random.Random):
+        super().__init__()
+        self.rng = rng
+    
+    def choose(self, candidates, now=None):
+        return self.rng.choice(list(candidates))
+
+def make_providers():
+    """دو ارائه‌دهنده با ظرفیت و سرعت متفاوت"""
+    return {
+        "openai": SimulatedProvider("openai", median=1.2, sigma=0.5, capacity=60, error_rate=0.01),
+        "gemini": SimulatedProvider("gemini", median=1.6, sigma=0.6, capacity=40, error_rate=0.02),
+    }
+
+def simulate(selector, rate: float, duration: float, slowdown: float, seed: int):
+    """اجرای شبیه‌سازی و برگرداندن زمان‌های پاسخ، خطاها و سهم ترافیک"""
+    rng = random.Random(seed)
+    providers = make_providers()
+    degraded = "openai"
+    slow_start, slow_end = duration / 3, duration * 2 / 3
+    
+    completions = []  # heap: (زمان پایان، شماره، ارائه‌دهنده، شروع، موفقیت)
+    latencies = []
+    errors = 0
+    share = {name: 0 for name in providers}
+    sequence = 0
+    now = 0.0
+    
+    while now < duration:
+        now += rng.expovariate(rate)
+        providers[degraded].slowdown = slowdown if slow_start <= now < slow_end else 1.0
+        
+        while completions and completions[0][0] <= now:
+            finished_at, _, name, started_at, success = heapq.heappop(completions)
+            providers[name].in_flight -= 1
+            selector.request_finished(name, finished_at - started_at, success, now=finished_at)
+            if success:
+                latencies.append(finished_at - started_at)
+        
+        name = selector.choose(list(providers), now=now)
+        provider = providers[name]
+        selector.request_started(name)
+        provider.in_flight += 1
+        share[name] += 1
+        latency, success = provider.sample(rng)
+        if not success:
+            errors += 1
+        sequence += 1
+        heapq.heappush(completions, (now + latency, sequence, name, now, success))
+    
+    return latencies, errors, share, sequence
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider selection policy simulation")
+    parser.add_argument("--rate", type=float, default=25.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=900.0, help="simulated seconds")
+    parser.add_argument("--slowdown", type=float, default=3.0, help="latency multiplier for openai in the middle third")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    
+    policies = [
+        ("legacy", lambda rng: LegacySelector()),
+        ("random", lambda rng: RandomSelector(rng)),
+    ] + [
+        (policy.value, lambda rng, policy=policy: ProviderSelector(policy.value, rng=rng))
+        for policy in SelectionPolicy
+    ]
+    
+    print(f"rate: {args.rate}/s, duration: {args.duration}s, openai x{args.slowdown} slower in the middle third\n")
+    print(f"{'policy':<12} {'p50':>7} {'p95':>7} {'p99':>7} {'mean':>7} {'errors':>8} {'openai':>8} {'gemini':>8}")
+    
+    for name, factory in policies:
+        selector = factory(random.Random(args.seed + 1))
+        latencies, errors, share, total = simulate(selector, args.rate, args.duration, args.slowdown, args.seed)
+        latencies.sort()
+        print(f"{name:<12} {percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.95):>7.2f} "
+              f"{percentile(latencies, 0.99):>7.2f} {sum(latencies) / len(latencies):>7.2f} "
+              f"{errors / total * 100:>7.2f}% {share['openai'] / total * 100:>7.1f}% "
+              f"{share['gemini'] / total * 100:>7.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # core/bot.py - نسخه بهبود یافته با Rate Limiting، Metrics و Logging پیشرفته
 
 import logging
+import json
 import time
 import asyncio
 from collections import defaultdict, deque
@@ -8,15 +9,20 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, field
 
-from telegram import Update
+from telegram import InputFile, Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from telegram.error import TelegramError, NetworkError, TimedOut
+from telegram.error import BadRequest, TelegramError, NetworkError, TimedOut
 
 from core.config import config
 from utils.keyboards import MainKeyboard
+from utils.telegram_renderer import page_cache
+from utils.text_normalizer import normalize_text
 from handlers.news_handlers import NewsHandler
 from handlers.media_handlers import MediaHandler
 from handlers.ai_handlers import AIHandler
+from services.ai_service import ai_service
+from services.deadline import Deadline
+from services.usage_accounting import request_user
 
 # تنظیم logging پیشرفته
 logging.basicConfig(
@@ -215,7 +221,14 @@ class JournalistBot:
     
     def __init__(self):
         # اجزای اصلی
-        self.app = Application.builder().token(config.BOT_TOKEN).build()
+        self.app = (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .base_url(config.TELEGRAM_BASE_URL)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         # سیستم‌های پیشرفته
         self.rate_limiter = RateLimiter(
@@ -263,6 +276,8 @@ class JournalistBot:
     async def _check_rate_limit(self, update: Update) -> bool:
         """بررسی محدودیت نرخ درخواست"""
         user_id = update.effective_user.id
+        # همه handler ها از اینجا عبور می‌کنند: مصرف توکن این update به همین کاربر نسبت داده می‌شود
+        request_user.set(user_id)
         allowed, wait_time = self.rate_limiter.is_allowed(user_id)
         
         if not allowed:
@@ -357,6 +372,18 @@ class JournalistBot:
         if not await self._check_rate_limit(update):
             return
         
+        # /stats json: خروجی قابل پردازش مصرف توکن و هزینه
+        if context.args and context.args[0].lower() == "json":
+            export = ai_service.usage.export()
+            document = json.dumps(export, ensure_ascii=False, indent=2).encode("utf-8")
+            await self._track_operation(
+                "stats_export_response",
+                update.message.reply_document,
+                InputFile(document, filename=f"usage-{datetime.now():%Y%m%d-%H%M%S}.json")
+            )
+            logger.info(f"Usage export sent to admin {user_id}")
+            return
+        
         stats = self.metrics.get_bot_stats()
         
         stats_text = f"""
@@ -376,6 +403,31 @@ class JournalistBot:
         for feature, count in list(stats['popular_features'].items())[:5]:
             stats_text += f"• {feature}: {count} بار\n"
         
+        usage = ai_service.usage
+        total = usage.total
+        stats_text += (
+            f"\n💰 **مصرف توکن:** {total.prompt_tokens:,} ورودی / {total.completion_tokens:,} خروجی "
+            f"(${total.cost:.4f})\n"
+        )
+        if total.cached_tokens:
+            stats_text += f"• {total.cached_tokens:,} توکن ورودی از کش پیشوند ارائه‌دهنده\n"
+        if total.estimated:
+            stats_text += f"• {total.estimated} پاسخ با توکن تخمینی\n"
+        for provider_name, counter in usage.providers.items():
+            stats_text += (f"• `{provider_name}`: {counter.requests} پاسخ، "
+                           f"{counter.prompt_tokens + counter.completion_tokens:,} توکن، ${counter.cost:.4f}\n")
+        stats_text += "\n🧮 **پرهزینه‌ترین عملیات:**\n"
+        for operation, counter in usage.top_operations(config.USAGE_STATS_TOP):
+            stats_text += (f"• `{operation}`: {counter.requests} درخواست، "
+                           f"{counter.prompt_tokens + counter.completion_tokens:,} توکن "
+                           f"(میانگین خروجی {counter.completion_tokens // max(counter.requests, 1)})، "
+                           f"${counter.cost:.4f}\n")
+        stats_text += "\n👤 **پرهزینه‌ترین کاربران:**\n"
+        for top_user, counter in usage.top_users(config.USAGE_STATS_TOP):
+            stats_text += (f"• `{top_user}`: {counter.requests} درخواست، "
+                           f"{counter.prompt_tokens + counter.completion_tokens:,} توکن، ${counter.cost:.4f}\n")
+        stats_text += "\n📄 خروجی کامل: `/stats json`\n"
+        
         await self._track_operation(
             "stats_command_response",
             update.message.reply_text,
@@ -500,7 +552,8 @@ class JournalistBot:
         
         # ردیابی فعالیت
         self.metrics.track_user_activity(user_id, update.effective_user.username, "callback")
-        self.metrics.track_feature_usage(f"callback_{data}")
+        # صفحه‌بندی کلید یکتا دارد؛ یک ویژگی شمرده می‌شود
+        self.metrics.track_feature_usage("callback_page" if data.startswith("page:") else f"callback_{data}")
         
         try:
             await query.answer()
@@ -545,10 +598,14 @@ class JournalistBot:
             elif data == "show_about":
                 await self.show_about(update, context)
             
+            # صفحه‌بندی پاسخ‌های بلند
+            elif data.startswith("page:"):
+                await self._track_operation("page_callback", self.show_page, update, context)
+            
             else:
                 await query.answer("این گزینه هنوز پیاده‌سازی نشده است.")
                 logger.warning(f"Unhandled callback data: {data} from user {user_id}")
-                
+        
         except Exception as e:
             logger.error(f"خطا در handle_callback: {e} - User: {user_id}, Data: {data}")
             self.metrics.track_error(user_id, "callback_error", str(e))
@@ -556,8 +613,9 @@ class JournalistBot:
     
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پردازش پیام‌های متنی"""
+        deadline = Deadline(config.AI_DEADLINE_SECONDS)  # مهلت کل پاسخ از لحظه دریافت پیام
         user_id = update.effective_user.id
-        text = update.message.text
+        text = normalize_text(update.message.text)
         user_state = context.user_data.get('state', 'idle')
         
         # بررسی محدودیت نرخ
@@ -572,27 +630,27 @@ class JournalistBot:
         try:
             # بررسی وضعیت کاربر و هدایت به handler مناسب
             if user_state == 'waiting_for_news_topic':
-                await self._track_operation("news_topic_processing", self.news_handler.process_news_topic, update, context, text)
+                await self._track_operation("news_topic_processing", self.news_handler.process_news_topic, update, context, text, deadline)
             elif user_state == 'waiting_for_article_text':
-                await self._track_operation("article_summary_processing", self.news_handler.process_article_summary, update, context, text)
+                await self._track_operation("article_summary_processing", self.news_handler.process_article_summary, update, context, text, deadline)
             elif user_state == 'waiting_for_fact_check':
-                await self._track_operation("fact_check_processing", self.news_handler.process_fact_check, update, context, text)
+                await self._track_operation("fact_check_processing", self.news_handler.process_fact_check, update, context, text, deadline)
             elif user_state == 'waiting_for_interview_topic':
-                await self._track_operation("interview_processing", self.news_handler.process_interview_questions, update, context, text)
+                await self._track_operation("interview_processing", self.news_handler.process_interview_questions, update, context, text, deadline)
             elif user_state == 'waiting_for_press_release':
-                await self._track_operation("press_release_processing", self.news_handler.process_press_release, update, context, text)
+                await self._track_operation("press_release_processing", self.news_handler.process_press_release, update, context, text, deadline)
             elif user_state == 'waiting_for_video_topic':
-                await self._track_operation("video_script_processing", self.media_handler.process_video_script, update, context, text)
+                await self._track_operation("video_script_processing", self.media_handler.process_video_script, update, context, text, deadline)
             elif user_state == 'waiting_for_podcast_topic':
-                await self._track_operation("podcast_script_processing", self.media_handler.process_podcast_script, update, context, text)
+                await self._track_operation("podcast_script_processing", self.media_handler.process_podcast_script, update, context, text, deadline)
             elif user_state == 'waiting_for_social_content':
-                await self._track_operation("social_content_processing", self.media_handler.process_social_content, update, context, text)
+                await self._track_operation("social_content_processing", self.media_handler.process_social_content, update, context, text, deadline)
             elif user_state == 'waiting_for_prompt_requirements':
-                await self._track_operation("prompt_engineering_processing", self.ai_handler.process_prompt_requirements, update, context, text)
+                await self._track_operation("prompt_engineering_processing", self.ai_handler.process_prompt_requirements, update, context, text, deadline)
             elif user_state == 'waiting_for_image_description':
-                await self._track_operation("image_prompt_processing", self.ai_handler.process_image_description, update, context, text)
+                await self._track_operation("image_prompt_processing", self.ai_handler.process_image_description, update, context, text, deadline)
             elif user_state == 'waiting_for_chatbot_specs':
-                await self._track_operation("chatbot_design_processing", self.ai_handler.process_chatbot_specs, update, context, text)
+                await self._track_operation("chatbot_design_processing", self.ai_handler.process_chatbot_specs, update, context, text, deadline)
             else:
                 # پیام عمومی
                 self.metrics.track_feature_usage("general_message")
@@ -709,6 +767,30 @@ class JournalistBot:
                 parse_mode='Markdown'
             )
     
+    async def show_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """نمایش صفحه دیگری از پاسخ صفحه‌بندی‌شده (از کش صفحه‌های رندرشده)"""
+        query = update.callback_query
+        _, key, page = query.data.split(":")
+        cached = page_cache.get(key)
+        
+        if cached is None:
+            # صفحه‌ها از کش خارج شده‌اند؛ پاسخ نمایش‌داده‌شده دست نمی‌خورد
+            await query.edit_message_reply_markup(reply_markup=MainKeyboard.get_main_menu())
+            return
+        
+        parse_mode, pages = cached
+        page = min(int(page), len(pages) - 1)
+        try:
+            await query.edit_message_text(
+                pages[page],
+                reply_markup=MainKeyboard.get_page_navigation(key, page, len(pages)),
+                parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            # کلیک دوباره روی صفحه فعلی
+            if "not modified" not in str(e).lower():
+                raise
+    
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """مدیریت خطاها با ردیابی کامل"""
         error = context.error
@@ -832,10 +914,18 @@ class JournalistBot:
                     logger.info(f"Hourly stats: {stats['total_users']} users, "
                               f"{stats['total_messages']} messages, "
                               f"{stats['avg_response_time']:.2f}s avg response")
-                
+            
             except Exception as e:
                 logger.error(f"Error in periodic tasks: {e}")
     
+    async def _post_init(self, application: Application):
+        """شروع کارهای پس‌زمینه پس از راه‌اندازی event loop"""
+        ai_service.start_maintenance()
+    
+    async def _post_shutdown(self, application: Application):
+        """بستن منابع پس از توقف ربات"""
+        await ai_service.aclose()
+    
     def _log_final_stats(self):
         """لاگ آمار نهایی"""
         final_stats = self.metrics.get_bot_stats()
@@ -1,17 +1,43 @@
 # core/config.py - ساده‌شده
 
+import logging
 import os
+from typing import Any, Callable, Dict
+
 from dotenv import load_dotenv
 
 # بارگذاری متغیرهای محیطی
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+def parse_mapping(name: str, default: str, cast: Callable[[str], Any]) -> Dict[str, Any]:
+    """خواندن تنظیم "کلید:مقدار,کلید:مقدار" از متغیر محیطی name
+
+    مورد نادرست (بدون ":"، کلید خالی یا مقدار غیرقابل تبدیل با cast) با هشدار نادیده
+    گرفته می‌شود تا یک اشتباه تایپی در .env ربات را هنگام import متوقف نکند.
+    """
+    mapping: Dict[str, Any] = {}
+    for item in os.getenv(name, default).split(","):
+        if not item.strip():
+            continue
+        key, separator, value = item.partition(":")
+        try:
+            if not separator or not key.strip():
+                raise ValueError("expected key:value")
+            mapping[key.strip()] = cast(value.strip())
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid {name} entry '{item.strip()}': {e}")
+    return mapping
+
 class Config:
     """تنظیمات ربات - ساده‌شده"""
     
     # تنظیمات اصلی (اجباری)
     BOT_TOKEN = os.getenv("BOT_TOKEN", "")
     BOT_USERNAME = os.getenv("BOT_USERNAME", "assistant_journalist_bot")
+    # آدرس Bot API (برای سرور محلی telegram-bot-api یا آزمون بار)
+    TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
     
     # کلیدهای AI
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -29,6 +55,128 @@ class Config:
     PRO_DAILY_LIMIT = 100
     MAX_TEXT_LENGTH = 4000
     
+    # ارائه‌دهندگان AI: "نام" یا "نام:نوع" (نوع: openai، gemini یا mock)؛ تنظیمات هر نام از
+    # <NAME>_API_KEY، <NAME>_BASE_URL و <NAME>_MODEL، مثلاً "openai,gemini,local:openai"
+    AI_PROVIDERS = [item.strip() for item in os.getenv("AI_PROVIDERS", "openai,gemini").split(",") if item.strip()]
+    # ارائه‌دهنده محلی شبیه‌سازی‌شده (نوع mock)؛ برای نام دیگر: <NAME>_LATENCY و ...
+    MOCK_LATENCY = os.getenv("MOCK_LATENCY", "lognormal:0.8:0.5")  # زمان تا اولین توکن
+    MOCK_TOKENS_PER_SECOND = float(os.getenv("MOCK_TOKENS_PER_SECOND", "50"))
+    MOCK_OUTPUT_TOKENS = int(os.getenv("MOCK_OUTPUT_TOKENS", "200"))
+    MOCK_ERROR_RATES = parse_mapping(
+        "MOCK_ERROR_RATES", "rate_limit:0,server_error:0,bad_request:0,timeout:0", float
+    )
+    MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
+    
+    # اتصال به ارائه‌دهندگان AI (connection pool مشترک)
+    AI_POOL_MAX_CONNECTIONS = int(os.getenv("AI_POOL_MAX_CONNECTIONS", "200"))
+    AI_POOL_MAX_KEEPALIVE = int(os.getenv("AI_POOL_MAX_KEEPALIVE", "50"))
+    AI_POOL_KEEPALIVE_EXPIRY = float(os.getenv("AI_POOL_KEEPALIVE_EXPIRY", "30"))  # ثانیه
+    AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))  # ثانیه
+    AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "30"))  # ثانیه، هر تلاش
+    AI_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_SECONDS", "45"))  # مهلت کلی هر درخواست کاربر
+    GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "100"))
+    # محدودیت هم‌زمانی تطبیقی هر ارائه‌دهنده (AIMD)
+    AI_CONCURRENCY_INITIAL = int(os.getenv("AI_CONCURRENCY_INITIAL", "10"))
+    AI_CONCURRENCY_MIN = int(os.getenv("AI_CONCURRENCY_MIN", "2"))
+    AI_CONCURRENCY_MAX = int(os.getenv("AI_CONCURRENCY_MAX", "100"))
+    # سهمیه هر ارائه‌دهنده در دقیقه (RPM/TPM)؛ با هدرهای x-ratelimit پاسخ‌ها به‌روز می‌شود
+    QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "true").lower() == "true"
+    QUOTA_RPM = parse_mapping("QUOTA_RPM", "openai:3500,gemini:60", int)
+    QUOTA_TPM = parse_mapping("QUOTA_TPM", "openai:200000,gemini:1000000", int)
+    QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", "2.0"))  # ثانیه؛ بیشتر از آن -> ارائه‌دهنده دیگر
+    QUOTA_CHARS_PER_TOKEN = float(os.getenv("QUOTA_CHARS_PER_TOKEN", "1.5"))  # برای متن فارسی
+    QUOTA_RETRY_AFTER = float(os.getenv("QUOTA_RETRY_AFTER", "5"))  # ثانیه، اگر 429 زمان نداشت
+    
+    # پنجره context هر مدل (توکن)؛ مدل‌های دیگر DEFAULT_CONTEXT_TOKENS
+    MODEL_CONTEXT_TOKENS = parse_mapping("MODEL_CONTEXT_TOKENS",
+                                         "gpt-3.5-turbo:16385,gemini-pro:30720,local-mock:32000", int)
+    DEFAULT_CONTEXT_TOKENS = int(os.getenv("DEFAULT_CONTEXT_TOKENS", "8192"))
+    
+    # خلاصه‌سازی: مقاله در یک فراخوانی، مگر از پنجره context بزرگ‌تر باشد (آن‌گاه map-reduce)
+    SUMMARY_CONTEXT_RESERVE = int(os.getenv("SUMMARY_CONTEXT_RESERVE", "1000"))  # توکن برای دستورالعمل و خطای تخمین
+    SUMMARY_MAX_LEVELS = int(os.getenv("SUMMARY_MAX_LEVELS", "3"))
+    
+    # بسته‌بندی ورودی‌های کوتاه چند درخواست در یک درخواست ارائه‌دهنده (اختیاری)
+    MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "false").lower() == "true"
+    # عملیات و حداکثر آیتم هر بسته (خروجی کل بسته باید در max_tokens جا شود)
+    MICRO_BATCH_OPERATIONS = parse_mapping("MICRO_BATCH_OPERATIONS", "sentiment_analysis:8,headlines:3", int)
+    MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "10"))
+    MICRO_BATCH_MAX_CHARS = int(os.getenv("MICRO_BATCH_MAX_CHARS", "1500"))  # فقط ورودی‌های کوتاه
+    
+    # پردازش دسته‌ای آفلاین (python main.py batch)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_CHECKPOINT_INTERVAL = float(os.getenv("BATCH_CHECKPOINT_INTERVAL", "5"))  # ثانیه
+    # قیمت هر میلیون توکن ورودی/خروجی (دلار) برای گزارش هزینه
+    AI_PRICE_INPUT_PER_1M = parse_mapping("AI_PRICE_INPUT_PER_1M", "openai:0.5,gemini:0.5", float)
+    AI_PRICE_OUTPUT_PER_1M = parse_mapping("AI_PRICE_OUTPUT_PER_1M", "openai:1.5,gemini:1.5", float)
+    # تعداد عملیات/کاربران پرهزینه در /stats (خروجی کامل: /stats json)
+    USAGE_STATS_TOP = int(os.getenv("USAGE_STATS_TOP", "5"))
+    
+    # نمایش تدریجی پاسخ (stream) در تلگرام
+    AI_STREAMING_ENABLED = os.getenv("AI_STREAMING_ENABLED", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))  # ثانیه بین ویرایش‌ها
+    # نمایش پاسخ نهایی: HTML یا MarkdownV2؛ پاسخ بلندتر از RENDER_MAX_MESSAGES پیام صفحه‌بندی می‌شود
+    RENDER_PARSE_MODE = os.getenv("RENDER_PARSE_MODE", "HTML")
+    RENDER_MAX_MESSAGES = int(os.getenv("RENDER_MAX_MESSAGES", "3"))
+    RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "1000"))  # پاسخ‌های رندرشده در حافظه
+    
+    # کش پاسخ‌های AI
+    CACHE_POLICY = os.getenv("CACHE_POLICY", "tinylfu")  # lru / lfu / tinylfu
+    CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "500"))
+    CACHE_TTL_HOURS = int(os.getenv("CACHE_TTL_HOURS", "12"))
+    DISK_CACHE_ENABLED = os.getenv("DISK_CACHE_ENABLED", "true").lower() == "true"
+    DISK_CACHE_MAX_ENTRIES = int(os.getenv("DISK_CACHE_MAX_ENTRIES", "100000"))
+    DISK_CACHE_FLUSH_INTERVAL = float(os.getenv("DISK_CACHE_FLUSH_INTERVAL", "1.0"))  # ثانیه
+    
+    # کش معنایی برای درخواست‌های تقریباً تکراری (اختیاری)
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+    SEMANTIC_CACHE_MIN_LENGTH = int(os.getenv("SEMANTIC_CACHE_MIN_LENGTH", "200"))  # کاراکتر
+    SEMANTIC_CACHE_FACT_CHECK = os.getenv("SEMANTIC_CACHE_FACT_CHECK", "false").lower() == "true"
+    # آستانه شباهت هر عملیات (عملیات بدون آستانه از کش معنایی استفاده نمی‌کنند)
+    SEMANTIC_CACHE_THRESHOLDS = parse_mapping(
+        "SEMANTIC_CACHE_THRESHOLDS",
+        "headlines:0.92,general_chat:0.92,video_script:0.95,prompt_engineering:0.95,fact_check:0.97",
+        float
+    )
+    
+    # Hedging: درخواست دوم به ارائه‌دهنده دیگر اگر پاسخ (در stream: اولین تکه) از p90 عملیات دیرتر شود
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+    HEDGE_BUDGET_PERCENT = float(os.getenv("HEDGE_BUDGET_PERCENT", "5"))  # حداکثر درصد درخواست‌های hedge شده
+    # بودجه اختصاصی هر عملیات، مثلاً "fact_check:10,headlines:5"
+    HEDGE_BUDGETS = parse_mapping("HEDGE_BUDGETS", "", float)
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # نمونه لازم برای محاسبه p90
+    HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "8.0"))  # ثانیه، تا جمع شدن نمونه‌ها
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))  # ثانیه
+    
+    # قطع‌کننده مدار هر ارائه‌دهنده
+    CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+    CIRCUIT_FAILURE_THRESHOLD = float(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "0.5"))  # نرخ خطا (0 تا 1)
+    CIRCUIT_MIN_REQUESTS = int(os.getenv("CIRCUIT_MIN_REQUESTS", "5"))  # حداقل درخواست در پنجره
+    CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "15"))
+    CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv("CIRCUIT_MAX_OPEN_SECONDS", "120"))
+    CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "2"))
+    
+    # سلامت غیرفعال ارائه‌دهندگان (از نتیجه درخواست‌های واقعی)
+    HEALTH_WINDOW_SECONDS = float(os.getenv("HEALTH_WINDOW_SECONDS", "120"))
+    HEALTH_MIN_SAMPLES = int(os.getenv("HEALTH_MIN_SAMPLES", "5"))  # حداقل نمونه برای قضاوت با نرخ خطا
+    HEALTH_DEGRADED_ERROR_RATE = float(os.getenv("HEALTH_DEGRADED_ERROR_RATE", "0.1"))  # 0 تا 1
+    HEALTH_UNHEALTHY_ERROR_RATE = float(os.getenv("HEALTH_UNHEALTHY_ERROR_RATE", "0.5"))  # 0 تا 1
+    HEALTH_UNHEALTHY_CONSECUTIVE = int(os.getenv("HEALTH_UNHEALTHY_CONSECUTIVE", "3"))  # خطای پشت سر هم
+    HEALTH_SLOW_LATENCY = float(os.getenv("HEALTH_SLOW_LATENCY", "20"))  # ثانیه (0 = غیرفعال)
+    HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "2"))  # ثانیه
+    # probe سبک (فهرست/مشخصات مدل) فقط پس از این مدت بدون ترافیک
+    HEALTH_PROBE_IDLE_SECONDS = float(os.getenv("HEALTH_PROBE_IDLE_SECONDS", "60"))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+    
+    # انتخاب ارائه‌دهنده: p2c، weighted یا least_cost
+    PROVIDER_SELECTION_POLICY = os.getenv("PROVIDER_SELECTION_POLICY", "p2c")
+    PROVIDER_EWMA_DECAY_SECONDS = float(os.getenv("PROVIDER_EWMA_DECAY_SECONDS", "10"))
+    
+    # فاصله نگهداری دوره‌ای سرویس AI
+    MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "300"))  # ثانیه
+    
     # ادمین‌ها (اختیاری)
     ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
     
@@ -45,6 +193,12 @@ class Config:
         for directory in [cls.UPLOAD_DIR, cls.CACHE_DIR, cls.LOGS_DIR]:
             os.makedirs(directory, exist_ok=True)
     
+    @classmethod
+    def provider_setting(cls, name: str, key: str, default: str = "") -> str:
+        """تنظیم یک ارائه‌دهنده از <NAME>_<KEY>، مثلاً OPENAI_API_KEY یا LOCAL_BASE_URL"""
+        attribute = f"{name.upper()}_{key}"
+        return getattr(cls, attribute, None) or os.getenv(attribute, default)
+    
     @classmethod
     def is_admin(cls, user_id: int) -> bool:
         """بررسی ادمین بودن"""
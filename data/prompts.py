@@ -5,6 +5,9 @@
 بر اساس سیستم‌های حرفه‌ای PromptCraft Master، SWIFT-VERIFY و Video Script Architect
 """
 
+import hashlib
+import json
+
 # ====================================================================
 # 1. سیستم تولید تیتر و لید خبری (Persian Headlines & Leads)
 # ====================================================================
@@ -377,6 +380,22 @@ ARTICLE_SUMMARY_SYSTEM = """
 [جمع‌بندی نهایی]
 """
 
+# سیستم خلاصه‌سازی یک بخش از مقاله طولانی (مرحله map)
+ARTICLE_CHUNK_SUMMARY_SYSTEM = """
+تو یک خلاصه‌نویس دقیق هستی و فقط یک بخش از یک مقاله طولانی را می‌بینی.
+
+## اصول خلاصه‌سازی بخش:
+- فقط اطلاعات همین بخش را بنویس و چیزی اضافه نکن
+- همه نام‌ها، آمار، تاریخ‌ها و نقل‌قول‌های مهم را نگه دار
+- حداکثر 120 کلمه
+- بدون مقدمه و نتیجه‌گیری
+
+## فرمت خروجی:
+• [نکته 1]
+• [نکته 2]
+• [...]
+"""
+
 # سیستم تولید سوالات مصاحبه
 INTERVIEW_QUESTIONS_SYSTEM = """
 تو یک روزنامه‌نگار باتجربه هستی که سوالات مصاحبه جذاب و عمیق طراحی می‌کنی.
@@ -463,6 +482,7 @@ PROMPTS = {
     # پرامپت‌های خبری
     "headlines_and_leads": HEADLINES_AND_LEADS_SYSTEM,
     "article_summary": ARTICLE_SUMMARY_SYSTEM,
+    "article_chunk_summary": ARTICLE_CHUNK_SUMMARY_SYSTEM,
     "interview_questions": INTERVIEW_QUESTIONS_SYSTEM,
     "press_release": PRESS_RELEASE_SYSTEM,
     
@@ -507,6 +527,22 @@ def get_prompt(prompt_name: str, default: str = None) -> str:
     """
     return PROMPTS.get(prompt_name, default or PROMPTS["general_chat"])
 
+def get_system_prompt(prompt_name: str) -> str:
+    """
+    متن پرامپت برای نقش system
+    
+    برای هر نام همیشه همان بایت‌ها برگردانده می‌شود (بدون قالب‌بندی یا داده
+    درخواست)، تا پیشوند ثابت درخواست در کش پیشوند ارائه‌دهنده بنشیند؛ داده کاربر
+    جداگانه در پیام user فرستاده می‌شود.
+    
+    Args:
+        prompt_name: نام پرامپت
+        
+    Returns:
+        متن پرامپت بدون فاصله ابتدا و انتها
+    """
+    return SYSTEM_PROMPTS.get(prompt_name, SYSTEM_PROMPTS["general_chat"])
+
 def list_available_prompts() -> list:
     """لیست تمام پرامپت‌های موجود"""
     return list(PROMPTS.keys())
@@ -555,6 +591,13 @@ AI_MODEL_SETTINGS = {
     "gemini": {
         "model": "gemini-pro",
         "temperature": 0.7,
+        "top_p": 0.8,
+        "top_k": 40,
+        "max_output_tokens": 1500,
+    },
+    "mock": {
+        "model": "local-mock",
+        "max_tokens": 1500,
     }
 }
 
@@ -586,6 +629,46 @@ OPTIMIZATION_TIPS = {
     ]
 }
 
+# جای‌نگهدار ورودی در دستورالعمل درخواست‌های بسته‌بندی‌شده
+MICRO_BATCH_PLACEHOLDER = "<<ورودی>>"
+
+# قالب یک درخواست با چند ورودی مستقل (micro-batching)
+MICRO_BATCH_TEMPLATE = """
+دستورالعمل زیر را برای هر یک از ورودی‌ها جداگانه اجرا کن. در دستورالعمل، به جای
+{placeholder} متن همان ورودی قرار می‌گیرد.
+
+## دستورالعمل:
+{instructions}
+
+## ورودی‌ها (JSON):
+{items}
+
+## فرمت خروجی:
+فقط یک آرایه JSON، بدون توضیح اضافه، با یک عضو برای هر ورودی:
+[{{"id": "<شناسه ورودی>", "output": <پاسخ کامل همان ورودی طبق دستورالعمل>}}]
+"""
+
+# ====================================================================
+# 9. نسخه پرامپت‌ها و تنظیمات (برای کلید کش)
+# ====================================================================
+
+def _fingerprint(text: str) -> str:
+    """hash کوتاه و پایدار"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+# متن نقش system هر پرامپت؛ یک بار در زمان import ساخته می‌شود تا بین درخواست‌ها بایت‌به‌بایت یکسان بماند
+SYSTEM_PROMPTS = {name: template.strip() for name, template in PROMPTS.items()}
+
+# یک بار در زمان import محاسبه می‌شود؛ تغییر هر قالب فقط کلیدهای همان قالب را عوض می‌کند
+PROMPT_VERSIONS = {name: _fingerprint(template) for name, template in PROMPTS.items()}
+
+# تغییر تنظیمات مدل همه پاسخ‌های کش‌شده را نامعتبر می‌کند
+MODEL_SETTINGS_VERSION = _fingerprint(json.dumps(AI_MODEL_SETTINGS, sort_keys=True))
+
+def get_prompt_version(prompt_name: str) -> str:
+    """نسخه (hash) پرامپت؛ همان پرامپتی که get_prompt برمی‌گرداند"""
+    return PROMPT_VERSIONS.get(prompt_name, PROMPT_VERSIONS["general_chat"])
+
 if __name__ == "__main__":
     # تست سریع سیستم
     print("📋 پرامپت‌های موجود:")
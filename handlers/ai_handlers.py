@@ -4,6 +4,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from utils.keyboards import MainKeyboard
 from services.ai_service import ai_service
+from services.deadline import Deadline
+from utils.stream_renderer import TelegramStreamRenderer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -81,31 +83,33 @@ class AIHandler:
             logger.error(f"خطا در handle_ai: {e}")
             await self._send_error(query)
     
-    async def process_prompt_requirements(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_prompt_requirements(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                          deadline: Deadline):
         """تولید پرامپت سفارشی"""
         context.user_data['state'] = 'idle'
         
         processing_msg = await update.message.reply_text("🤖 در حال طراحی پرامپت...")
         
         try:
-            result = await ai_service.create_prompt(text, "standard")
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="🤖 پرامپت سفارشی:")
+            result = await ai_service.create_prompt(text, "standard", on_chunk=renderer.on_chunk,
+                                                    deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"🤖 **پرامپت سفارشی:**\n\n```\n{result}\n```\n\n"
                 "💡 **نحوه استفاده:**\n"
                 "• این پرامپت را کپی کنید\n"
                 "• در ابتدای گفتگو با AI قرار دهید\n"
                 "• سپس سوالات خود را بپرسید",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_prompt_requirements: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_image_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_image_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                        deadline: Deadline):
         """بهینه‌سازی prompt تصویر"""
         context.user_data['state'] = 'idle'
         
@@ -128,25 +132,26 @@ Prompt باید:
 "A majestic landscape at sunset, oil painting style, highly detailed, 4K"
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="🖼️ Prompt تصویر بهینه‌شده:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"🖼️ **Prompt تصویر بهینه‌شده:**\n\n"
                 f"`{result}`\n\n"
                 "🎯 **استفاده:**\n"
                 "• در DALL-E، Midjourney یا Stable Diffusion\n"
                 "• کپی کرده و در AI تصویرساز قرار دهید\n"
                 "• تنظیمات مختلف آزمایش کنید",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_image_description: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_chatbot_specs(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_chatbot_specs(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                    deadline: Deadline):
         """طراحی چت‌بات"""
         context.user_data['state'] = 'idle'
         
@@ -169,17 +174,17 @@ Prompt باید:
 پرامپت باید آماده استفاده باشد.
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="💬 پرامپت چت‌بات:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"💬 **پرامپت چت‌بات:**\n\n```\n{result}\n```\n\n"
                 "🚀 **پیاده‌سازی:**\n"
                 "• این پرامپت را در سیستم AI قرار دهید\n"
                 "• تست‌های مختلف انجام دهید\n"
                 "• بر اساس عملکرد تنظیم کنید",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
@@ -4,6 +4,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from utils.keyboards import MainKeyboard
 from services.ai_service import ai_service
+from services.deadline import Deadline
+from utils.stream_renderer import TelegramStreamRenderer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -74,7 +76,8 @@ class MediaHandler:
             logger.error(f"خطا در handle_media: {e}")
             await self._send_error(query)
     
-    async def process_video_script(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_video_script(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                   deadline: Deadline):
         """تولید اسکریپت ویدیو"""
         context.user_data['state'] = 'idle'
         
@@ -84,20 +87,21 @@ class MediaHandler:
             # استخراج اطلاعات از متن
             topic, duration, platform = self._parse_video_info(text)
             
-            result = await ai_service.generate_video_script(topic, duration, platform)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="🎥 اسکریپت ویدیو:")
+            result = await ai_service.generate_video_script(topic, duration, platform, on_chunk=renderer.on_chunk,
+                                                            deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"🎥 **اسکریپت ویدیو:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_video_script: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_podcast_script(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_podcast_script(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                     deadline: Deadline):
         """تولید اسکریپت پادکست"""
         context.user_data['state'] = 'idle'
         
@@ -119,20 +123,21 @@ class MediaHandler:
 زبان: فارسی
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="📻 اسکریپت پادکست:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"📻 **اسکریپت پادکست:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_podcast_script: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_social_content(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_social_content(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                     deadline: Deadline):
         """تولید محتوای شبکه‌های اجتماعی"""
         context.user_data['state'] = 'idle'
         
@@ -154,13 +159,13 @@ class MediaHandler:
 زبان: فارسی
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="📱 محتوای شبکه‌های اجتماعی:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"📱 **محتوای شبکه‌های اجتماعی:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
@@ -4,6 +4,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from utils.keyboards import MainKeyboard
 from services.ai_service import ai_service
+from services.deadline import Deadline
+from utils.stream_renderer import TelegramStreamRenderer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -80,69 +82,68 @@ class NewsHandler:
             logger.error(f"خطا در handle_news: {e}")
             await self._send_error(query)
     
-    async def process_news_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_news_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                 deadline: Deadline):
         """تولید تیتر و لید"""
         context.user_data['state'] = 'idle'
         
         processing_msg = await update.message.reply_text("🔄 در حال تولید...")
         
         try:
-            result = await ai_service.generate_headlines(text)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="📰 تیتر و لید تولید شده:")
+            result = await ai_service.generate_headlines(text, on_chunk=renderer.on_chunk, deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"📰 **تیتر و لید تولید شده:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_news_topic: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_article_summary(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_article_summary(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                      deadline: Deadline):
         """خلاصه‌سازی مقاله"""
         context.user_data['state'] = 'idle'
         
         processing_msg = await update.message.reply_text("🔄 در حال خلاصه‌سازی...")
         
         try:
-            prompt = f"این مقاله را به صورت خلاصه و روان خلاصه کن (حداکثر 200 کلمه):\n\n{text}"
-            result = await ai_service.general_ai_chat(prompt)
+            renderer = TelegramStreamRenderer(processing_msg, title="📋 خلاصه مقاله:")
+            result = await ai_service.summarize_article(text, on_chunk=renderer.on_chunk, deadline=deadline)
             
-            await processing_msg.delete()
-            
-            await update.message.reply_text(
+            await renderer.finish(
                 f"📋 **خلاصه مقاله:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_article_summary: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_fact_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_fact_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                 deadline: Deadline):
         """راستی‌آزمایی"""
         context.user_data['state'] = 'idle'
         
         processing_msg = await update.message.reply_text("🔍 در حال بررسی...")
         
         try:
-            result = await ai_service.fact_check(text)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="✅ گزارش راستی‌آزمایی:")
+            result = await ai_service.fact_check(text, on_chunk=renderer.on_chunk, deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"✅ **گزارش راستی‌آزمایی:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_fact_check: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_interview_questions(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_interview_questions(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                          deadline: Deadline):
         """تولید سوالات مصاحبه"""
         context.user_data['state'] = 'idle'
         
@@ -164,20 +165,21 @@ class NewsHandler:
 ...
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="💬 سوالات مصاحبه:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"💬 **سوالات مصاحبه:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
             logger.error(f"خطا در process_interview_questions: {e}")
             await self._edit_error(processing_msg)
     
-    async def process_press_release(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    async def process_press_release(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                                    deadline: Deadline):
         """تولید بیانیه مطبوعاتی"""
         context.user_data['state'] = 'idle'
         
@@ -199,13 +201,13 @@ class NewsHandler:
 زبان: رسمی و حرفه‌ای
             """
             
-            result = await ai_service.general_ai_chat(prompt)
-            await processing_msg.delete()
+            renderer = TelegramStreamRenderer(processing_msg, title="📢 بیانیه مطبوعاتی:")
+            result = await ai_service.general_ai_chat(prompt, on_chunk=renderer.on_chunk, payload=text,
+                                                      deadline=deadline)
             
-            await update.message.reply_text(
+            await renderer.finish(
                 f"📢 **بیانیه مطبوعاتی:**\n\n{result}",
-                reply_markup=MainKeyboard.get_main_menu(),
-                parse_mode='Markdown'
+                reply_markup=MainKeyboard.get_main_menu()
             )
             
         except Exception as e:
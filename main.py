@@ -132,12 +132,54 @@ def main():
     finally:
         print("👋 خداحافظ!")
 
+def run_batch(argv):
+    """پردازش دسته‌ای آفلاین فایل JSONL (با ادامه از آخرین نقطه پس از قطع)"""
+    import argparse
+    import asyncio
+    import json
+    
+    parser = argparse.ArgumentParser(prog="main.py batch",
+                                     description="پردازش دسته‌ای درخواست‌های JSONL با سرویس AI")
+    parser.add_argument("input", help='فایل JSONL ورودی: {"id": ..., "type": ..., "prompt": ...} '
+                                      'یا {"id": ..., "type": "headlines", "text": ...}')
+    parser.add_argument("output", help="فایل JSONL نتیجه‌ها (همان فایل برای ادامه کار)")
+    parser.add_argument("--concurrency", type=int, default=None, help="حداکثر درخواست هم‌زمان")
+    args = parser.parse_args(argv)
+    
+    setup_logging()
+    create_directories()
+    
+    from core.config import config
+    # نمونه global (همان کش دیسک و thread نویسنده‌ای که هنگام import ساخته شده)
+    from services.ai_service import ai_service
+    from services.batch_jobs import BatchJob
+    
+    async def run():
+        try:
+            job = BatchJob(ai_service, args.input, args.output,
+                           concurrency=args.concurrency or config.BATCH_CONCURRENCY,
+                           checkpoint_interval=config.BATCH_CHECKPOINT_INTERVAL)
+            return await job.run()
+        finally:
+            await ai_service.aclose()
+    
+    try:
+        report = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n⏹️  پردازش متوقف شد؛ با اجرای دوباره همین دستور ادامه می‌یابد")
+        sys.exit(130)
+    
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["run"]["failed"] == 0 else 2)
+
 if __name__ == "__main__":
     # بررسی آرگومان‌های خط فرمان
     if len(sys.argv) > 1:
         if sys.argv[1] == "--version":
             print("Assistant Journalist Bot v1.0.0")
             sys.exit(0)
+        elif sys.argv[1] == "batch":
+            run_batch(sys.argv[2:])
         elif sys.argv[1] == "--help":
             print("""
 Assistant Journalist Bot - دستیار هوشمند خبرنگار
@@ -146,6 +188,8 @@ Assistant Journalist Bot - دستیار هوشمند خبرنگار
     python main.py              # اجرای ربات
     python main.py --version    # نمایش نسخه
     python main.py --help       # نمایش راهنما
+    python main.py batch IN.jsonl OUT.jsonl [--concurrency N]
+                                # پردازش دسته‌ای آفلاین (قابل ادامه)
 
 ویژگی‌ها:
     📰 تولید تیتر و لید خبری
@@ -4,24 +4,89 @@ import asyncio
 import hashlib
 import json
 import logging
+import os
 import random
 import time
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List, Tuple
-from enum import Enum
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Awaitable, Callable, Iterable
 
-from openai import OpenAI
-import google.generativeai as genai
+import httpx
+import openai
+from google.api_core import exceptions as google_exceptions
 from core.config import config
-from data.prompts import get_prompt
+from data.prompts import (get_system_prompt, get_prompt_version, MODEL_SETTINGS_VERSION,
+                          MICRO_BATCH_PLACEHOLDER, MICRO_BATCH_TEMPLATE)
+from services.cache_engine import create_cache_engine
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.deadline import Deadline
+from services.health_monitor import HealthMonitor, HealthState
+from services.concurrency_limiter import AdaptiveLimiter, PRIORITY_BULK, request_priority
+from services.provider_selection import ProviderSelector
+from services.providers import BaseProvider, create_providers
+from services.quota_governor import QuotaExceededError, QuotaGovernor, parse_duration
+from services.disk_cache import DiskCache
+from services.micro_batcher import MicroBatcher, parse_batch_response
+from services.semantic_cache import SemanticCache
+from services.usage_accounting import UsageAccounting, request_operation, request_user
+from utils.text_chunker import estimate_tokens, split_into_chunks
+from utils.text_normalizer import normalize_for_key
 
 logger = logging.getLogger(__name__)
 
-class AIProvider(Enum):
-    """نوع ارائه‌دهندگان AI"""
-    OPENAI = "openai"
-    GEMINI = "gemini"
+# callback دریافت متن تجمعی در حالت stream
+ChunkCallback = Callable[[str], Awaitable[None]]
+
+def _request_text(prompt: str, system: Optional[str]) -> str:
+    """متن کامل درخواست (system و prompt) برای کلید کش، تخمین توکن و سهمیه"""
+    return f"{system}\n\n{prompt}" if system else prompt
+
+# پاسخ‌های خطای سرویس (به جای exception به کاربر نمایش داده می‌شوند)
+_ERROR_REPLY_PREFIXES = ("❌", "⚠️", "⏱️")
+
+# خطاهایی که نشانه فشار بیش از حد روی ارائه‌دهنده هستند (429 و timeout)
+_OVERLOAD_ERRORS = (
+    asyncio.TimeoutError,
+    httpx.TimeoutException,
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+)
+
+# خطاهای گذرا که تلاش دوباره برایشان معنا دارد (timeout، 429، 5xx و قطع اتصال)
+_RETRYABLE_ERRORS = _OVERLOAD_ERRORS + (
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    google_exceptions.ServerError,
+    google_exceptions.TooManyRequests,
+)
+
+def is_overload_error(error: BaseException) -> bool:
+    """آیا خطا نشانه throttling یا timeout ارائه‌دهنده است"""
+    return isinstance(error, _OVERLOAD_ERRORS) or getattr(error, "status_code", None) == 429
+
+def is_retryable_error(error: BaseException) -> bool:
+    """آیا تلاش دوباره ممکن است موفق شود (خطای احراز هویت، درخواست نامعتبر یا
+    رد محتوا با تکرار درست نمی‌شود)"""
+    if isinstance(error, _RETRYABLE_ERRORS):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+def record_breaker_error(breaker: CircuitBreaker, error: BaseException):
+    """ثبت خطای یک تلاش در قطع‌کننده مدار
+
+    فقط خطاهای گذرا (timeout، 429، 5xx و قطع اتصال) شکست ارائه‌دهنده حساب می‌شوند؛
+    درخواست نامعتبر، خطای احراز هویت، رد محتوا یا prompt بیش از حد بزرگ مدار را برای
+    همه کاربران باز نمی‌کند و فقط جایگاه probe حالت half-open آزاد می‌شود.
+    """
+    if is_retryable_error(error):
+        breaker.record_failure()
+    else:
+        breaker.release()
 
 @dataclass
 class CacheEntry:
@@ -44,7 +109,8 @@ class ProviderStats:
     total_response_time: float = 0.0
     last_error: Optional[str] = None
     last_success: Optional[datetime] = None
-    consecutive_failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
     
     @property
     def success_rate(self) -> float:
@@ -59,50 +125,77 @@ class ProviderStats:
         if self.successful_requests == 0:
             return 0.0
         return self.total_response_time / self.successful_requests
-    
-    @property
-    def is_healthy(self) -> bool:
-        """وضعیت سلامت ارائه‌دهنده"""
-        return self.consecutive_failures < 3 and self.success_rate > 50
 
 class IntelligentCache:
     """سیستم کش هوشمند"""
     
-    def __init__(self, max_size: int = 1000, ttl_hours: int = 24):
-        self.cache: Dict[str, CacheEntry] = {}
+    def __init__(self, max_size: int = 1000, ttl_hours: int = 24, policy: str = "lru",
+                 disk: Optional[DiskCache] = None):
+        self.engine = create_cache_engine(policy, max_size)
+        self.disk = disk  # سطح دوم (اختیاری)
         self.max_size = max_size
         self.ttl_hours = ttl_hours
         self.hit_count = 0
         self.miss_count = 0
-        logger.info(f"Intelligent cache initialized: max_size={max_size}, ttl={ttl_hours}h")
+        self.disk_hit_count = 0
+        logger.info(f"Intelligent cache initialized: max_size={max_size}, ttl={ttl_hours}h, "
+                   f"policy={self.engine.policy.value}")
     
     def _generate_key(self, prompt: str, provider: str = "") -> str:
         """تولید کلید کش"""
-        # نرمال‌سازی پرامپت
-        normalized = prompt.strip().lower()
-        
-        # حذف whitespace اضافی
-        normalized = ' '.join(normalized.split())
+        # نرمال‌سازی پرامپت (حروف عربی/فارسی، ارقام، نیم‌فاصله، اعراب، فاصله‌ها)
+        normalized = normalize_for_key(prompt)
         
         # ایجاد hash
         content = f"{normalized}:{provider}"
         return hashlib.md5(content.encode('utf-8')).hexdigest()
     
+    def make_key(self, prompt: str, provider: str = "") -> str:
+        """کلید کش برای استفاده مستقیم در get_by_key / set_by_key"""
+        return self._generate_key(prompt, provider)
+    
+    @staticmethod
+    def template_namespace(operation: str, template_id: str, *params) -> str:
+        """بخش ثابت کلید: عملیات، قالب، نسخه قالب، نسخه تنظیمات مدل و پارامترهای جانبی"""
+        namespace = f"{operation}:{template_id}:{get_prompt_version(template_id)}:{MODEL_SETTINGS_VERSION}"
+        if params:
+            namespace += ":" + "|".join(str(param) for param in params)
+        return namespace
+    
+    @staticmethod
+    def make_payload_key(namespace: str, payload: str) -> str:
+        """کلید کش مبتنی بر قالب: فقط متن کاربر در زمان درخواست hash می‌شود"""
+        payload_hash = hashlib.md5(normalize_for_key(payload).encode('utf-8')).hexdigest()
+        return f"{namespace}:{payload_hash}"
+    
     def get(self, prompt: str, provider: str = "") -> Optional[str]:
         """دریافت از کش"""
-        key = self._generate_key(prompt, provider)
-        
-        if key not in self.cache:
-            self.miss_count += 1
-            return None
-        
-        entry = self.cache[key]
-        
-        # بررسی انقضا
-        if entry.is_expired(self.ttl_hours):
-            del self.cache[key]
+        return self.get_by_key(self._generate_key(prompt, provider))
+    
+    def contains(self, key: str) -> bool:
+        """وجود کلید در حافظه (بدون تأثیر بر آمار)"""
+        return key in self.engine
+    
+    def get_by_key(self, key: str) -> Optional[str]:
+        """دریافت از کش با کلید محاسبه‌شده"""
+        # موتور کش ورودی‌های منقضی را خودش حذف می‌کند
+        entry = self.engine.get(key)
+        if entry is None and self.disk:
+            entry = self._promote(key, self.disk.get(key))
+        return self._count_lookup(key, entry)
+    
+    async def aget_by_key(self, key: str) -> Optional[str]:
+        """مانند get_by_key برای فراخوان‌های async؛ خواندن سطح دوم (SQLite) در صورت
+        miss حافظه در thread جداگانه انجام می‌شود تا event loop مسدود نشود"""
+        entry = self.engine.get(key)
+        if entry is None and self.disk:
+            entry = self._promote(key, await asyncio.to_thread(self.disk.get, key))
+        return self._count_lookup(key, entry)
+    
+    def _count_lookup(self, key: str, entry: Optional[CacheEntry]) -> Optional[str]:
+        """ثبت hit/miss و برگرداندن محتوا"""
+        if entry is None:
             self.miss_count += 1
-            logger.debug(f"Cache entry expired and removed: {key[:8]}...")
             return None
         
         # به‌روزرسانی آمار
@@ -114,41 +207,49 @@ class IntelligentCache:
     
     def set(self, prompt: str, content: str, provider: str = ""):
         """ذخیره در کش"""
-        key = self._generate_key(prompt, provider)
-        
-        # مدیریت اندازه کش
-        if len(self.cache) >= self.max_size:
-            self._evict_lru()
-        
-        self.cache[key] = CacheEntry(
-            content=content,
-            provider=provider
+        self.set_by_key(self._generate_key(prompt, provider), content, provider)
+    
+    def set_by_key(self, key: str, content: str, provider: str = ""):
+        """ذخیره در کش با کلید محاسبه‌شده (provider فقط به عنوان اطلاعات ورودی ثبت می‌شود)"""
+        # حذف بر اساس سیاست موتور کش (O(1))
+        ttl = self.ttl_hours * 3600
+        self.engine.set(
+            key,
+            CacheEntry(content=content, provider=provider),
+            ttl=ttl
         )
+        if self.disk:
+            self.disk.put(key, content, provider, ttl)
         
-        logger.debug(f"Cache set: {key[:8]}... (size: {len(self.cache)})")
+        logger.debug(f"Cache set: {key[:8]}... (size: {len(self.engine)})")
     
-    def _evict_lru(self):
-        """حذف کمترین استفاده شده"""
-        if not self.cache:
-            return
+    def _promote(self, key: str, row: Optional[Tuple[str, str, float]]) -> Optional[CacheEntry]:
+        """انتقال ردیف خوانده‌شده از سطح دوم به حافظه با TTL باقی‌مانده"""
+        if row is None:
+            return None
         
-        # پیدا کردن کمترین hit_count
-        lru_key = min(self.cache.keys(), key=lambda k: self.cache[k].hit_count)
-        del self.cache[lru_key]
-        logger.debug(f"Cache LRU eviction: {lru_key[:8]}...")
+        content, provider, expires_at = row
+        entry = CacheEntry(content=content, provider=provider)
+        self.engine.set(key, entry, ttl=expires_at - time.time())
+        self.disk_hit_count += 1
+        logger.debug(f"Disk cache hit: {key[:8]}...")
+        return entry
+    
+    def close(self):
+        """بستن سطح دوم (نوشتن ورودی‌های باقی‌مانده)"""
+        if self.disk:
+            self.disk.close()
+    
+    async def aclose(self):
+        """close بدون مسدود کردن event loop (انتظار برای thread نویسنده تا 10 ثانیه)"""
+        await asyncio.to_thread(self.close)
     
     def clear_expired(self):
         """پاک کردن ورودی‌های منقضی"""
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if entry.is_expired(self.ttl_hours)
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
+        expired_count = self.engine.clear_expired()
         
-        if expired_keys:
-            logger.info(f"Cleared {len(expired_keys)} expired cache entries")
+        if expired_count:
+            logger.info(f"Cleared {expired_count} expired cache entries")
     
     def get_stats(self) -> Dict[str, Any]:
         """آمار کش"""
@@ -156,41 +257,85 @@ class IntelligentCache:
         hit_rate = (self.hit_count / total_requests * 100) if total_requests > 0 else 0
         
         return {
-            "size": len(self.cache),
+            "size": len(self.engine),
             "max_size": self.max_size,
             "hit_count": self.hit_count,
             "miss_count": self.miss_count,
             "hit_rate": round(hit_rate, 2),
-            "ttl_hours": self.ttl_hours
+            "ttl_hours": self.ttl_hours,
+            "disk_hit_count": self.disk_hit_count,
+            "disk": self.disk.get_stats() if self.disk else None,
+            **self.engine.get_stats()
         }
 
 class LoadBalancer:
     """تعادل بار بین ارائه‌دهندگان"""
     
-    def __init__(self):
-        self.providers: Dict[AIProvider, ProviderStats] = {
-            AIProvider.OPENAI: ProviderStats(),
-            AIProvider.GEMINI: ProviderStats()
+    def __init__(self, providers: List[BaseProvider]):
+        # ترتیب AI_PROVIDERS حفظ می‌شود (اولویت در select_alternative)
+        self.providers: Dict[BaseProvider, ProviderStats] = {provider: ProviderStats() for provider in providers}
+        self.breakers: Dict[BaseProvider, CircuitBreaker] = {
+            provider: CircuitBreaker(
+                provider.name,
+                window_seconds=config.CIRCUIT_WINDOW_SECONDS,
+                failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+                min_requests=config.CIRCUIT_MIN_REQUESTS,
+                open_seconds=config.CIRCUIT_OPEN_SECONDS,
+                max_open_seconds=config.CIRCUIT_MAX_OPEN_SECONDS,
+                half_open_probes=config.CIRCUIT_HALF_OPEN_PROBES,
+                probe_timeout=config.AI_REQUEST_TIMEOUT * 2
+            )
+            for provider in self.providers
+        }
+        self.selector = ProviderSelector(
+            policy=config.PROVIDER_SELECTION_POLICY,
+            decay_seconds=config.PROVIDER_EWMA_DECAY_SECONDS
+        )
+        # سهمیه RPM/TPM هر ارائه‌دهنده/مدل
+        self.quotas: Dict[BaseProvider, QuotaGovernor] = {
+            provider: QuotaGovernor(
+                self.selection_key(provider),
+                rpm=config.QUOTA_RPM.get(provider.name, 0),
+                tpm=config.QUOTA_TPM.get(provider.name, 0),
+                max_output_tokens=provider.max_output_tokens,
+                chars_per_token=config.QUOTA_CHARS_PER_TOKEN,
+                max_wait=config.QUOTA_MAX_WAIT,
+                retry_after=config.QUOTA_RETRY_AFTER,
+                enabled=config.QUOTA_ENABLED
+            )
+            for provider in self.providers
         }
-        logger.info("Load balancer initialized")
+        # سلامت غیرفعال از نتیجه همین تلاش‌ها
+        self.health = HealthMonitor(
+            window_seconds=config.HEALTH_WINDOW_SECONDS,
+            min_samples=config.HEALTH_MIN_SAMPLES,
+            degraded_error_rate=config.HEALTH_DEGRADED_ERROR_RATE,
+            unhealthy_error_rate=config.HEALTH_UNHEALTHY_ERROR_RATE,
+            unhealthy_consecutive=config.HEALTH_UNHEALTHY_CONSECUTIVE,
+            slow_latency=config.HEALTH_SLOW_LATENCY,
+            cache_ttl=config.HEALTH_CACHE_TTL,
+            idle_seconds=config.HEALTH_PROBE_IDLE_SECONDS,
+            probe_timeout=config.HEALTH_PROBE_TIMEOUT
+        )
+        logger.info(f"Load balancer initialized (policy={self.selector.policy.value})")
+    
+    @staticmethod
+    def selection_key(provider: BaseProvider) -> str:
+        """کلید آمار انتخاب: ارائه‌دهنده و مدل"""
+        return f"{provider.name}:{provider.model}"
+    
+    def is_available(self, provider: BaseProvider, prompt: str = "") -> bool:
+        """ارائه‌دهنده تنظیم شده، مدار آن اجازه عبور می‌دهد و سهمیه آن به‌زودی آزاد است"""
+        return (provider.is_configured() and self.breakers[provider].allows_traffic()
+                and self.quotas[provider].can_admit(prompt))
     
-    def select_provider(self) -> AIProvider:
+    def select_provider(self, prompt: str = "") -> BaseProvider:
         """انتخاب بهترین ارائه‌دهنده"""
-        available_providers = []
-        
-        # بررسی در دسترس بودن
-        if config.OPENAI_API_KEY and self.providers[AIProvider.OPENAI].is_healthy:
-            available_providers.append(AIProvider.OPENAI)
-        
-        if config.GEMINI_API_KEY and self.providers[AIProvider.GEMINI].is_healthy:
-            available_providers.append(AIProvider.GEMINI)
+        available_providers = [provider for provider in self.providers if self.is_available(provider, prompt)]
         
         if not available_providers:
-            # اگر هیچ‌کدام سالم نیستند، استفاده از هر کدام که در دسترس است
-            if config.OPENAI_API_KEY:
-                available_providers.append(AIProvider.OPENAI)
-            if config.GEMINI_API_KEY:
-                available_providers.append(AIProvider.GEMINI)
+            # مدار یا سهمیه همه بسته است: انتخاب یکی از ارائه‌دهندگان تنظیم‌شده (درخواست سریعاً رد می‌شود)
+            available_providers = [provider for provider in self.providers if provider.is_configured()]
         
         if not available_providers:
             raise RuntimeError("هیچ ارائه‌دهنده AI در دسترس نیست")
@@ -198,20 +343,35 @@ class LoadBalancer:
         if len(available_providers) == 1:
             return available_providers[0]
         
-        # انتخاب بر اساس عملکرد
-        best_provider = max(
-            available_providers,
-            key=lambda p: (
-                self.providers[p].success_rate,
-                -self.providers[p].avg_response_time,
-                -self.providers[p].consecutive_failures
-            )
-        )
+        # انتخاب بر اساس EWMA زمان پاسخ، نرخ خطا و درخواست‌های جاری
+        candidates = {self.selection_key(provider): provider for provider in available_providers}
+        best_provider = candidates[self.selector.choose(list(candidates))]
         
-        logger.debug(f"Selected provider: {best_provider.value}")
+        logger.debug(f"Selected provider: {best_provider.name}")
         return best_provider
     
-    def record_request(self, provider: AIProvider, success: bool, response_time: float, error: str = None):
+    def expected_latency(self, provider: BaseProvider) -> float:
+        """زمان پاسخ مورد انتظار ارائه‌دهنده (EWMA)"""
+        return self.selector.expected_latency(self.selection_key(provider))
+    
+    def select_alternative(self, provider: BaseProvider, prompt: str = "") -> Optional[BaseProvider]:
+        """ارائه‌دهنده در دسترس دیگر (برای hedge یا جایگزینی) یا None"""
+        for candidate in self.providers:
+            if candidate != provider and self.is_available(candidate, prompt):
+                return candidate
+        return None
+    
+    def request_started(self, provider: BaseProvider):
+        """ثبت شروع یک تلاش (برای شمارش درخواست‌های جاری)"""
+        self.selector.request_started(self.selection_key(provider))
+    
+    def request_finished(self, provider: BaseProvider, response_time: float, success: Optional[bool]):
+        """ثبت پایان یک تلاش در EWMA ها و مدل سلامت (success=None برای درخواست لغوشده)"""
+        self.selector.request_finished(self.selection_key(provider), response_time, success)
+        if success is not None:
+            self.health.record(provider.name, success, response_time)
+    
+    def record_request(self, provider: BaseProvider, success: bool, response_time: float, error: str = None):
         """ثبت نتیجه درخواست"""
         stats = self.providers[provider]
         stats.total_requests += 1
@@ -220,47 +380,199 @@ class LoadBalancer:
             stats.successful_requests += 1
             stats.total_response_time += response_time
             stats.last_success = datetime.now()
-            stats.consecutive_failures = 0
         else:
             stats.failed_requests += 1
             stats.last_error = error
-            stats.consecutive_failures += 1
+            if error:
+                self.health.record_error(provider.name, error)
         
-        logger.debug(f"Provider {provider.value} stats updated: "
+        logger.debug(f"Provider {provider.name} stats updated: "
                     f"success_rate={stats.success_rate:.1f}%, "
                     f"avg_time={stats.avg_response_time:.2f}s")
     
+    def record_usage(self, provider: BaseProvider, usage: Dict[str, Any]):
+        """ثبت توکن مصرفی یک پاسخ موفق"""
+        stats = self.providers[provider]
+        stats.prompt_tokens += usage.get("prompt_tokens") or 0
+        stats.completion_tokens += usage.get("completion_tokens") or 0
+    
+    def estimated_cost(self, provider: BaseProvider) -> float:
+        """هزینه تخمینی توکن‌های مصرف‌شده (دلار) بر اساس قیمت هر میلیون توکن"""
+        stats = self.providers[provider]
+        return (stats.prompt_tokens * config.AI_PRICE_INPUT_PER_1M.get(provider.name, 0.0)
+                + stats.completion_tokens * config.AI_PRICE_OUTPUT_PER_1M.get(provider.name, 0.0)) / 1_000_000
+    
+    def usage_totals(self) -> Dict[str, Any]:
+        """مجموع توکن و هزینه همه ارائه‌دهندگان"""
+        return {
+            "prompt_tokens": sum(stats.prompt_tokens for stats in self.providers.values()),
+            "completion_tokens": sum(stats.completion_tokens for stats in self.providers.values()),
+            "cost": sum(self.estimated_cost(provider) for provider in self.providers)
+        }
+    
     def get_stats(self) -> Dict[str, Any]:
         """آمار تعادل بار"""
+        selection_stats = self.selector.get_stats()
         return {
-            provider.value: {
+            provider.name: {
                 "total_requests": stats.total_requests,
                 "success_rate": round(stats.success_rate, 2),
                 "avg_response_time": round(stats.avg_response_time, 3),
-                "consecutive_failures": stats.consecutive_failures,
-                "is_healthy": stats.is_healthy,
-                "last_success": stats.last_success.isoformat() if stats.last_success else None
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+                "estimated_cost": round(self.estimated_cost(provider), 4),
+                "last_success": stats.last_success.isoformat() if stats.last_success else None,
+                "last_error": stats.last_error,
+                "circuit_breaker": self.breakers[provider].get_stats(),
+                "quota": self.quotas[provider].get_stats(),
+                "selection": selection_stats.get(self.selection_key(provider))
             }
             for provider, stats in self.providers.items()
         }
 
+class HedgingPolicy:
+    """زمان‌بندی و بودجه درخواست‌های hedge به تفکیک عملیات
+    
+    تأخیر hedge برابر صدک (پیش‌فرض p90) زمان پاسخ‌های اخیر همان عملیات است؛
+    برای stream صدک زمان رسیدن اولین تکه جداگانه نگه داشته می‌شود.
+    بودجه: هر درخواست budget_percent/100 اعتبار اضافه می‌کند و هر hedge یک واحد
+    مصرف می‌کند، پس نسبت hedge در بلندمدت از درصد تعیین‌شده بیشتر نمی‌شود.
+    """
+    
+    def __init__(self, budget_percent: float = 5.0, budgets: Dict[str, float] = None,
+                 percentile: float = 0.9, min_samples: int = 20, initial_delay: float = 8.0,
+                 min_delay: float = 0.5, window: int = 200, max_credit: float = 3.0):
+        self.budget_percent = budget_percent
+        self.budgets = budgets or {}
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window = window
+        self.max_credit = max_credit
+        
+        self._latencies: Dict[str, deque] = {}
+        self._first_chunk_latencies: Dict[str, deque] = {}
+        self._credits: Dict[str, float] = defaultdict(float)
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "hedges": 0, "hedge_wins": 0,
+                                                                      "budget_denied": 0})
+    
+    def record_request(self, operation: str):
+        """ثبت درخواست جدید و افزودن اعتبار hedge"""
+        self._stats[operation]["requests"] += 1
+        percent = self.budgets.get(operation, self.budget_percent)
+        self._credits[operation] = min(self._credits[operation] + percent / 100, self.max_credit)
+    
+    def record_latency(self, operation: str, response_time: float, first_chunk: bool = False):
+        """ثبت زمان پاسخ موفق (first_chunk: زمان رسیدن اولین تکه stream)"""
+        samples = self._first_chunk_latencies if first_chunk else self._latencies
+        latencies = samples.get(operation)
+        if latencies is None:
+            latencies = samples[operation] = deque(maxlen=self.window)
+        latencies.append(response_time)
+    
+    def hedge_delay(self, operation: str, first_chunk: bool = False) -> float:
+        """مدت انتظار پیش از ارسال درخواست دوم (first_chunk: پیش از باز کردن stream دوم)"""
+        latencies = (self._first_chunk_latencies if first_chunk else self._latencies).get(operation)
+        if not latencies or len(latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(latencies)
+        index = min(int(len(ordered) * self.percentile), len(ordered) - 1)
+        return max(ordered[index], self.min_delay)
+    
+    def try_acquire(self, operation: str) -> bool:
+        """مصرف یک واحد بودجه؛ False اگر بودجه این عملیات تمام شده باشد"""
+        if self._credits[operation] < 1.0:
+            self._stats[operation]["budget_denied"] += 1
+            return False
+        self._credits[operation] -= 1.0
+        self._stats[operation]["hedges"] += 1
+        return True
+    
+    def record_hedge_win(self, operation: str):
+        """درخواست hedge زودتر از درخواست اصلی پاسخ داد"""
+        self._stats[operation]["hedge_wins"] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار hedge هر عملیات"""
+        return {
+            operation: {
+                **stats,
+                "hedge_rate": round(stats["hedges"] / stats["requests"] * 100, 2) if stats["requests"] else 0,
+                "hedge_delay": round(self.hedge_delay(operation), 3)
+            }
+            for operation, stats in self._stats.items()
+        }
+
 class AIService:
     """سرویس AI پیشرفته با قابلیت‌های کامل"""
     
     def __init__(self):
-        # کلاینت‌ها
-        self.openai_client = None
-        if config.OPENAI_API_KEY:
-            self.openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
-            logger.info("OpenAI client initialized")
+        # ارائه‌دهندگان AI از رجیستری (AI_PROVIDERS)؛ هر کدام کلاینت و connection pool خود را دارند
+        self.providers: List[BaseProvider] = create_providers(config.AI_PROVIDERS)
         
-        if config.GEMINI_API_KEY:
-            genai.configure(api_key=config.GEMINI_API_KEY)
-            logger.info("Gemini client initialized")
+        # محدودیت هم‌زمانی تطبیقی هر ارائه‌دهنده (درخواست‌های تعاملی و دسته‌ای)؛
+        # سقف آن به سقف خود کلاینت ارائه‌دهنده (مثلاً کانال gRPC مشترک Gemini) محدود است
+        self.limiters: Dict[BaseProvider, AdaptiveLimiter] = {
+            provider: AdaptiveLimiter(
+                provider.name,
+                initial_limit=config.AI_CONCURRENCY_INITIAL,
+                min_limit=config.AI_CONCURRENCY_MIN,
+                max_limit=min(config.AI_CONCURRENCY_MAX, provider.max_concurrency or config.AI_CONCURRENCY_MAX)
+            )
+            for provider in self.providers
+        }
         
         # سیستم‌های پیشرفته
-        self.cache = IntelligentCache(max_size=500, ttl_hours=12)
-        self.load_balancer = LoadBalancer()
+        disk_cache = None
+        if config.DISK_CACHE_ENABLED:
+            disk_cache = DiskCache(
+                os.path.join(config.CACHE_DIR, "ai_responses.sqlite3"),
+                max_entries=config.DISK_CACHE_MAX_ENTRIES,
+                flush_interval=config.DISK_CACHE_FLUSH_INTERVAL
+            )
+        self.cache = IntelligentCache(
+            max_size=config.CACHE_MAX_SIZE,
+            ttl_hours=config.CACHE_TTL_HOURS,
+            policy=config.CACHE_POLICY,
+            disk=disk_cache
+        )
+        self.load_balancer = LoadBalancer(self.providers)
+        # بودجه ورودی یک فراخوانی خلاصه‌سازی (هر ارائه‌دهنده‌ای باید آن را بپذیرد)
+        self.summary_budget = min(
+            provider.context_tokens - provider.max_output_tokens for provider in self.providers
+        ) - config.SUMMARY_CONTEXT_RESERVE
+        self.usage = UsageAccounting(config.AI_PRICE_INPUT_PER_1M, config.AI_PRICE_OUTPUT_PER_1M)
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self.hedging = HedgingPolicy(
+            budget_percent=config.HEDGE_BUDGET_PERCENT,
+            budgets=config.HEDGE_BUDGETS,
+            percentile=config.HEDGE_PERCENTILE,
+            min_samples=config.HEDGE_MIN_SAMPLES,
+            initial_delay=config.HEDGE_INITIAL_DELAY,
+            min_delay=config.HEDGE_MIN_DELAY
+        )
+        
+        # کش معنایی برای درخواست‌های تقریباً تکراری (اختیاری)
+        self.semantic_cache = None
+        if config.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                min_length=config.SEMANTIC_CACHE_MIN_LENGTH
+            )
+        
+        # بسته‌بندی درخواست‌های کوچک (اختیاری)؛ یک batcher برای هر قالب/فضای نام
+        self._batchers: Dict[str, MicroBatcher] = {}
+        
+        # درخواست‌های در حال اجرا (single-flight) بر اساس کلید کش
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._inflight_waiters: Dict[str, int] = {}
+        self.coalescing_stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "timeouts": 0,
+            "abandoned": 0
+        }
         
         # تنظیمات retry
         self.max_retries = 3
@@ -269,203 +581,795 @@ class AIService:
         
         logger.info("Advanced AI Service initialized successfully")
     
-    async def _retry_with_backoff(self, func, *args, **kwargs) -> Tuple[Any, bool, float, str]:
-        """اجرای تابع با retry و backoff"""
-        last_error = ""
+    async def aclose(self):
+        """بستن اتصال‌های باز ارائه‌دهندگان"""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+        
+        await self.load_balancer.health.aclose()
+        for provider in self.providers:
+            await provider.aclose()
+        logger.info("AI provider connection pools closed")
+        
+        await self.cache.aclose()
+    
+    async def _retry_with_backoff(self, func, *args, deadline: Deadline = None, expected_time: float = 0.0,
+                                  **kwargs) -> Tuple[Any, bool, float, str]:
+        """اجرای تابع با retry و backoff
+        
+        فقط خطاهای گذرا (timeout، 429، 5xx) تکرار می‌شوند. func خودش هر تلاش را به زمان
+        باقی‌مانده deadline محدود می‌کند (تا timeout را از لغو تشخیص دهد) و اگر تأخیر
+        backoff به‌علاوه expected_time (زمان پاسخ مورد انتظار) از مهلت بگذرد، تلاش دوباره
+        انجام نمی‌شود تا فراخواننده بتواند به ارائه‌دهنده دیگر برود.
+        """
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        last_error = "deadline exceeded"
+        response_time = 0.0
         
         for attempt in range(self.max_retries):
+            if deadline.expired:
+                break
             start_time = time.time()
             
             try:
                 result = await func(*args, **kwargs)
                 response_time = time.time() - start_time
                 return result, True, response_time, ""
-                
+            
+            except (CircuitOpenError, QuotaExceededError) as e:
+                # مدار باز است یا سهمیه تمام شده؛ تلاش دوباره روی همین ارائه‌دهنده بی‌فایده است
+                return None, False, time.time() - start_time, str(e)
+            
             except Exception as e:
                 response_time = time.time() - start_time
-                last_error = str(e)
+                last_error = str(e) or type(e).__name__
                 
                 logger.warning(f"Attempt {attempt + 1} failed: {last_error}")
                 
+                if not is_retryable_error(e):
+                    logger.info(f"Not retrying {type(e).__name__}")
+                    break
+                
                 if attempt < self.max_retries - 1:
                     # محاسبه تأخیر exponential backoff
                     delay = min(
                         self.base_delay * (2 ** attempt) + random.uniform(0, 1),
                         self.max_delay
                     )
+                    if not deadline.allows(delay + expected_time):
+                        logger.info(f"Retry would miss the deadline ({deadline.remaining():.1f}s left)")
+                        break
                     logger.info(f"Waiting {delay:.2f}s before retry...")
                     await asyncio.sleep(delay)
         
         return None, False, response_time, last_error
     
-    async def generate_headlines(self, news_text: str) -> str:
+    async def generate_headlines(self, news_text: str, on_chunk: ChunkCallback = None,
+                                 deadline: Deadline = None) -> str:
         """تولید تیتر و لید خبری"""
-        prompt_template = get_prompt("headlines_and_leads")
-        full_prompt = f"{prompt_template}\n\nمتن خبری:\n{news_text}"
+        prompt = f"متن خبری:\n{news_text}"
         
-        return await self._call_ai_with_cache(full_prompt, "headlines")
+        return await self._call_ai_with_cache(prompt, "headlines", on_chunk=on_chunk, payload=news_text,
+                                              template="headlines_and_leads", deadline=deadline,
+                                              system=get_system_prompt("headlines_and_leads"))
     
-    async def generate_video_script(self, topic: str, duration: int = 60, platform: str = "instagram") -> str:
+    async def generate_video_script(self, topic: str, duration: int = 60, platform: str = "instagram",
+                                    on_chunk: ChunkCallback = None, deadline: Deadline = None) -> str:
         """تولید اسکریپت ویدیو"""
-        prompt_template = get_prompt("video_script")
-        
-        context = f"""
+        prompt = f"""
 موضوع: {topic}
 مدت: {duration} ثانیه
 پلتفرم: {platform}
         """
         
-        full_prompt = f"{prompt_template}\n\n{context}"
-        return await self._call_ai_with_cache(full_prompt, "video_script")
+        return await self._call_ai_with_cache(prompt, "video_script", on_chunk=on_chunk, payload=topic,
+                                              template="video_script", template_params=(duration, platform),
+                                              deadline=deadline, system=get_system_prompt("video_script"))
     
-    async def fact_check(self, claim: str) -> str:
+    async def fact_check(self, claim: str, on_chunk: ChunkCallback = None, deadline: Deadline = None) -> str:
         """راستی‌آزمایی"""
-        prompt_template = get_prompt("fact_check")
-        full_prompt = f"{prompt_template}\n\nادعای مورد بررسی:\n{claim}"
+        prompt = f"ادعای مورد بررسی:\n{claim}"
         
-        return await self._call_ai_with_cache(full_prompt, "fact_check")
+        return await self._call_ai_with_cache(prompt, "fact_check", on_chunk=on_chunk, payload=claim,
+                                              template="fact_check", deadline=deadline,
+                                              system=get_system_prompt("fact_check"))
     
-    async def create_prompt(self, requirements: str, complexity: str = "standard") -> str:
+    async def create_prompt(self, requirements: str, complexity: str = "standard",
+                            on_chunk: ChunkCallback = None, deadline: Deadline = None) -> str:
         """تولید پرامپت"""
-        prompt_template = get_prompt("prompt_engineering")
-        
-        context = f"""
+        prompt = f"""
 نیازمندی‌ها: {requirements}
 سطح پیچیدگی: {complexity}
         """
         
-        full_prompt = f"{prompt_template}\n\n{context}"
-        return await self._call_ai_with_cache(full_prompt, "prompt_engineering")
+        return await self._call_ai_with_cache(prompt, "prompt_engineering", on_chunk=on_chunk,
+                                              payload=requirements, template="prompt_engineering",
+                                              template_params=(complexity,), deadline=deadline,
+                                              system=get_system_prompt("prompt_engineering"))
     
-    async def general_ai_chat(self, message: str, context: str = None) -> str:
-        """چت عمومی"""
-        if context:
-            full_prompt = f"{context}\n\n{message}"
-        else:
-            prompt_template = get_prompt("general_chat")
-            full_prompt = f"{prompt_template}\n\n{message}"
+    async def general_ai_chat(self, message: str, context: str = None, on_chunk: ChunkCallback = None,
+                              payload: str = None, deadline: Deadline = None) -> str:
+        """چت عمومی (payload: بخش واردشده توسط کاربر در message، برای کش معنایی)
+
+        context (در صورت وجود) به جای قالب general_chat در نقش system فرستاده می‌شود.
+        """
+        system = context or get_system_prompt("general_chat")
+        return await self._call_ai_with_cache(message, "general_chat", on_chunk=on_chunk, payload=payload,
+                                              deadline=deadline, system=system)
+    
+    async def summarize_article(self, article: str, on_chunk: ChunkCallback = None,
+                                deadline: Deadline = None) -> str:
+        """خلاصه‌سازی مقاله؛ فقط مقاله بزرگ‌تر از پنجره context مدل به روش map-reduce
         
-        return await self._call_ai_with_cache(full_prompt, "general_chat")
+        بودجه یک فراخوانی از کوچک‌ترین پنجره context ارائه‌دهندگان (تا جایگزینی ممکن
+        بماند) منهای حداکثر خروجی و SUMMARY_CONTEXT_RESERVE به دست می‌آید. متن روی مرز پاراگراف/جمله به تکه‌هایی در بودجه توکن تقسیم می‌شود، تکه‌ها
+        هم‌زمان (در محدوده هم‌زمانی ارائه‌دهندگان) خلاصه می‌شوند و خلاصه نهایی از کنار
+        هم گذاشتن آن‌ها ساخته می‌شود. خلاصه هر تکه جداگانه کش می‌شود، پس ویرایش مقاله
+        فقط تکه‌های تغییرکرده را دوباره خلاصه می‌کند.
+        """
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        budget = self.summary_budget
+        system = get_system_prompt("article_summary")
+        
+        if estimate_tokens(article, config.QUOTA_CHARS_PER_TOKEN) <= budget:
+            prompt = f"متن مقاله:\n{article}"
+            return await self._call_ai_with_cache(prompt, "article_summary", on_chunk=on_chunk,
+                                                  payload=article, template="article_summary",
+                                                  deadline=deadline, system=system)
+        
+        # map: خلاصه تکه‌ها؛ اگر کنار هم هنوز از بودجه بزرگ‌تر بودند، یک سطح دیگر
+        text = article
+        for level in range(config.SUMMARY_MAX_LEVELS):
+            chunks = split_into_chunks(text, budget, config.QUOTA_CHARS_PER_TOKEN)
+            if len(chunks) == 1:
+                break
+            logger.info(f"Summarizing {len(chunks)} chunks (level {level + 1}, {len(text)} chars)")
+            summaries = await asyncio.gather(*(self._summarize_chunk(chunk, deadline) for chunk in chunks))
+            failed = next((summary for summary in summaries if summary.startswith(_ERROR_REPLY_PREFIXES)), None)
+            if failed is not None:
+                return failed
+            text = "\n\n".join(summaries)
+            if estimate_tokens(text, config.QUOTA_CHARS_PER_TOKEN) <= budget:
+                break
+        
+        # reduce: خلاصه نهایی از خلاصه بخش‌ها
+        prompt = f"خلاصه بخش‌های پیاپی مقاله:\n{text}"
+        return await self._call_ai_with_cache(prompt, "article_summary", on_chunk=on_chunk, payload=text,
+                                              template="article_summary", template_params=("reduce",),
+                                              deadline=deadline, system=system)
     
-    async def _call_ai_with_cache(self, prompt: str, operation_type: str = "general") -> str:
-        """فراخوانی AI با کش و load balancing"""
+    async def _summarize_chunk(self, chunk: str, deadline: Deadline) -> str:
+        """خلاصه یک تکه از مقاله (مرحله map)"""
+        prompt = f"بخش مقاله:\n{chunk}"
+        return await self._call_ai_with_cache(prompt, "article_chunk_summary", payload=chunk,
+                                              template="article_chunk_summary", deadline=deadline,
+                                              system=get_system_prompt("article_chunk_summary"))
+    
+    async def _call_ai_with_cache(self, prompt: str, operation_type: str = "general",
+                                  on_chunk: ChunkCallback = None, deadline: Deadline = None,
+                                  payload: Optional[str] = None, template: Optional[str] = None,
+                                  template_params: tuple = (), system: Optional[str] = None) -> str:
+        """فراخوانی AI با کش، ادغام درخواست‌های یکسان و load balancing
+        
+        system: دستورالعمل ثابت عملیات (get_system_prompt) که جدا از prompt در نقش system
+        فرستاده می‌شود؛ prompt فقط داده همین درخواست است
+        deadline: مهلت کلی درخواست (پیش‌فرض AI_DEADLINE_SECONDS از همین لحظه)؛ تولید
+        مشترک با مهلت اولین درخواست‌کننده اجرا می‌شود و هر درخواست‌کننده تا مهلت خود منتظر می‌ماند
+        payload: بخش واردشده توسط کاربر در prompt (برای کش معنایی)
+        template: نام قالب PROMPTS در prompt؛ در این صورت کلید کش از نسخه از پیش
+        محاسبه‌شده قالب و hash متن کاربر ساخته می‌شود، نه از کل prompt
+        """
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        
+        if template is not None:
+            namespace = self.cache.template_namespace(operation_type, template, *template_params)
+            cache_key = self.cache.make_payload_key(namespace, payload or "")
+        else:
+            namespace = None
+            cache_key = self.cache.make_key(_request_text(prompt, system))
+        
         # بررسی کش
-        cached_result = self.cache.get(prompt)
+        cached_result = await self.cache.aget_by_key(cache_key)
         if cached_result:
             logger.info(f"Cache hit for {operation_type}")
             return cached_result
         
+        # درخواست تقریباً تکراری؟
+        semantic_namespace = None
+        if self._semantic_threshold(payload, operation_type) is not None:
+            semantic_namespace = namespace or self._semantic_namespace(_request_text(prompt, system), payload,
+                                                                       operation_type)
+            similar_result = await self._get_similar(semantic_namespace, payload, operation_type)
+            if similar_result:
+                return similar_result
+        
+        # درخواست یکسان در حال اجرا؟ منتظر همان می‌مانیم
+        task = self._inflight.get(cache_key)
+        
+        # ورودی کوتاه: همراه درخواست‌های هم‌زمان دیگر در یک درخواست ارائه‌دهنده
+        if task is None and self._is_batchable(operation_type, prompt, payload, on_chunk):
+            try:
+                batched_result = await asyncio.wait_for(
+                    self._submit_to_batch(operation_type, prompt, payload, namespace, cache_key, system),
+                    deadline.remaining()
+                )
+            except asyncio.TimeoutError:
+                return "⏱️ زمان پاسخ‌گویی به پایان رسید. لطفاً دوباره تلاش کنید."
+            if batched_result is not None:
+                return batched_result
+            # پاسخ این آیتم در بسته قابل استفاده نبود: درخواست جداگانه
+            task = self._inflight.get(cache_key)
+        
+        if task is None:
+            if on_chunk is not None and config.AI_STREAMING_ENABLED:
+                generation = self._call_ai_streaming(prompt, operation_type, cache_key, on_chunk, deadline, system)
+            else:
+                generation = self._generate(prompt, operation_type, cache_key, deadline, system)
+            
+            task = asyncio.create_task(generation)
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda t: self._release_inflight(cache_key, t))
+            if semantic_namespace is not None:
+                task.add_done_callback(lambda t: self._remember_similar(semantic_namespace, payload, cache_key))
+            self.coalescing_stats["leaders"] += 1
+        else:
+            self.coalescing_stats["coalesced"] += 1
+            logger.info(f"Coalesced {operation_type} request onto in-flight generation")
+        
+        return await self._await_inflight(cache_key, task, operation_type, deadline)
+    
+    @staticmethod
+    def _is_batchable(operation_type: str, prompt: str, payload: Optional[str],
+                      on_chunk: Optional[ChunkCallback]) -> bool:
+        """آیا درخواست می‌تواند بسته‌بندی شود (نتیجه بسته stream نمی‌شود)"""
+        if not config.MICRO_BATCH_ENABLED or operation_type not in config.MICRO_BATCH_OPERATIONS:
+            return False
+        if on_chunk is not None and config.AI_STREAMING_ENABLED:
+            return False
+        return bool(payload) and len(payload) <= config.MICRO_BATCH_MAX_CHARS and payload in prompt
+    
+    async def _submit_to_batch(self, operation_type: str, prompt: str, payload: str,
+                               namespace: Optional[str], cache_key: str, system: Optional[str] = None) -> Optional[str]:
+        """ارسال به batcher قالب؛ None یعنی باید جداگانه فرستاده شود"""
+        instructions = prompt.replace(payload, MICRO_BATCH_PLACEHOLDER, 1)
+        batch_namespace = namespace or self._semantic_namespace(_request_text(prompt, system), payload,
+                                                                operation_type)
+        batcher = self._batchers.get(batch_namespace)
+        if batcher is None:
+            async def run_batch(items: List[Tuple[str, str]]) -> Dict[str, str]:
+                return await self._run_batch(operation_type, instructions, items, system)
+            
+            batcher = self._batchers[batch_namespace] = MicroBatcher(
+                batch_namespace, run_batch,
+                max_items=config.MICRO_BATCH_OPERATIONS[operation_type],
+                window=config.MICRO_BATCH_WINDOW_MS / 1000
+            )
+        return await batcher.submit(cache_key, payload)
+    
+    async def _run_batch(self, operation_type: str, instructions: str,
+                         items: List[Tuple[str, str]], system: Optional[str] = None) -> Dict[str, str]:
+        """یک درخواست ارائه‌دهنده برای چند ورودی؛ نتیجه هر ورودی با کلید خودش کش می‌شود
+
+        system قالب عملیات بدون تغییر می‌ماند؛ فقط بخش هر درخواست (instructions) در قالب بسته قرار می‌گیرد.
+        """
+        ids = {str(index): key for index, (key, _) in enumerate(items, 1)}
+        inputs = "\n".join(
+            json.dumps({"id": str(index), "input": payload}, ensure_ascii=False)
+            for index, (_, payload) in enumerate(items, 1)
+        )
+        batch_prompt = MICRO_BATCH_TEMPLATE.format(placeholder=MICRO_BATCH_PLACEHOLDER,
+                                                   instructions=instructions.strip(), items=inputs)
+        
+        # پاسخ بسته به چند کاربر تعلق دارد؛ مصرف آن فقط به عملیات نسبت داده می‌شود
+        request_user.set(None)
+        response = await self._generate(batch_prompt, f"{operation_type}_batch", None, system=system)
+        outputs = parse_batch_response(response)
+        
+        results = {}
+        for item_id, key in ids.items():
+            output = outputs.get(item_id)
+            if output is not None:
+                self.cache.set_by_key(key, output, "batch")
+                results[key] = output
+        logger.info(f"Micro-batch {operation_type}: {len(results)}/{len(items)} items parsed")
+        return results
+    
+    def _semantic_threshold(self, payload: Optional[str], operation_type: str) -> Optional[float]:
+        """آستانه شباهت عملیات (None یعنی کش معنایی برای این درخواست غیرفعال است)"""
+        if not self.semantic_cache or not payload:
+            return None
+        if operation_type == "fact_check" and not config.SEMANTIC_CACHE_FACT_CHECK:
+            return None
+        return config.SEMANTIC_CACHE_THRESHOLDS.get(operation_type)
+    
+    @staticmethod
+    def _semantic_namespace(prompt: str, payload: str, operation_type: str) -> str:
+        """فضای نام برای prompt بدون قالب مشخص: عملیات + hash بخش ثابت prompt"""
+        template_part = prompt.replace(payload, "", 1)
+        return f"{operation_type}:{hashlib.md5(template_part.encode('utf-8')).hexdigest()}"
+    
+    async def _get_similar(self, namespace: str, payload: str, operation_type: str) -> Optional[str]:
+        """جستجوی پاسخ کش‌شده برای درخواست تقریباً مشابه"""
+        threshold = self._semantic_threshold(payload, operation_type)
+        match = self.semantic_cache.lookup(namespace, payload, threshold)
+        if match is None:
+            return None
+        
+        similar_key, score = match
+        result = await self.cache.aget_by_key(similar_key)
+        if result is None:
+            # پاسخ از کش حذف شده
+            self.semantic_cache.remove(similar_key)
+            return None
+        
+        logger.info(f"Semantic cache hit for {operation_type} (similarity={score:.3f})")
+        return result
+    
+    def _remember_similar(self, namespace: str, payload: str, cache_key: str):
+        """ثبت اثرانگشت درخواست موفق در کش معنایی"""
+        if self.cache.contains(cache_key):
+            self.semantic_cache.add(namespace, payload, cache_key)
+    
+    async def _await_inflight(self, cache_key: str, task: asyncio.Task, operation_type: str,
+                              deadline: Deadline) -> str:
+        """انتظار برای نتیجه مشترک تا پایان مهلت و لغو مستقل برای هر درخواست"""
+        self._inflight_waiters[cache_key] = self._inflight_waiters.get(cache_key, 0) + 1
+        try:
+            # shield: لغو یا timeout یک درخواست، تولید مشترک را متوقف نمی‌کند
+            return await asyncio.wait_for(asyncio.shield(task), deadline.remaining())
+        except asyncio.TimeoutError:
+            self.coalescing_stats["timeouts"] += 1
+            logger.warning(f"{operation_type} request missed its {deadline.timeout:.0f}s deadline")
+            return "⏱️ زمان پاسخ‌گویی به پایان رسید. لطفاً دوباره تلاش کنید."
+        finally:
+            remaining = self._inflight_waiters.get(cache_key, 1) - 1
+            if remaining > 0:
+                self._inflight_waiters[cache_key] = remaining
+            else:
+                self._inflight_waiters.pop(cache_key, None)
+                if not task.done():
+                    # هیچ درخواست‌کننده‌ای باقی نمانده - هزینه ارائه‌دهنده را ادامه نمی‌دهیم
+                    self.coalescing_stats["abandoned"] += 1
+                    task.cancel()
+    
+    def _release_inflight(self, cache_key: str, task: asyncio.Task):
+        """حذف درخواست تمام‌شده از جدول in-flight"""
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"In-flight generation failed: {task.exception()}")
+    
+    async def _generate(self, prompt: str, operation_type: str, cache_key: Optional[str],
+                        deadline: Deadline = None, system: Optional[str] = None) -> str:
+        """تولید پاسخ از ارائه‌دهنده با retry و ذخیره در کش (cache_key=None: بدون ذخیره)"""
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        # عملیات برای حسابداری مصرف (تلاش‌های hedge با context همین task اجرا می‌شوند)
+        request_operation.set(operation_type)
+        request = _request_text(prompt, system)
+        
         # انتخاب ارائه‌دهنده
         try:
-            provider = self.load_balancer.select_provider()
+            provider = self.load_balancer.select_provider(request)
         except RuntimeError as e:
             logger.error(f"No AI providers available: {e}")
             return "⚠️ هیچ سرویس AI در دسترس نیست. لطفاً بعداً تلاش کنید."
         
-        # فراخوانی با retry
-        if provider == AIProvider.OPENAI:
-            result, success, response_time, error = await self._retry_with_backoff(
-                self._openai_call, prompt
+        # فراخوانی با retry (و در صورت فعال بودن، hedge به ارائه‌دهنده دیگر)
+        hedge_provider = self.load_balancer.select_alternative(provider, request) if config.HEDGING_ENABLED else None
+        if hedge_provider is not None:
+            provider, (result, success, response_time, error) = await self._hedged_call(
+                prompt, operation_type, provider, hedge_provider, deadline, system
             )
-        else:  # GEMINI
-            result, success, response_time, error = await self._retry_with_backoff(
-                self._gemini_call, prompt
-            )
-        
-        # ثبت آمار
-        self.load_balancer.record_request(provider, success, response_time, error)
+        else:
+            result, success, response_time, error = await self._provider_attempt(provider, prompt, deadline, system)
+            # ثبت آمار
+            self.load_balancer.record_request(provider, success, response_time, error)
+            
+            # retry روی همین ارائه‌دهنده ممکن نبود یا به مهلت نمی‌رسید (خطای غیرگذرا، 429،
+            # مدار باز یا زمان ناکافی): یک بار ارائه‌دهنده دیگر، اگر در زمان باقی‌مانده پاسخ می‌دهد
+            if not success:
+                alternative = self.load_balancer.select_alternative(provider, request)
+                if alternative is not None and deadline.allows(self.load_balancer.expected_latency(alternative)):
+                    logger.info(f"Failing over {operation_type} request from {provider.name} "
+                               f"to {alternative.name} ({deadline.remaining():.1f}s left): {error}")
+                    provider = alternative
+                    result, success, response_time, error = await self._provider_attempt(provider, prompt, deadline,
+                                                                                         system)
+                    self.load_balancer.record_request(provider, success, response_time, error)
         
         if success and result:
+            self.hedging.record_latency(operation_type, response_time)
             # ذخیره در کش
-            self.cache.set(prompt, result, provider.value)
-            logger.info(f"Successful {operation_type} request via {provider.value} "
+            if cache_key is not None:
+                self.cache.set_by_key(cache_key, result, provider.name)
+            logger.info(f"Successful {operation_type} request via {provider.name} "
                        f"in {response_time:.2f}s")
             return result
         else:
             logger.error(f"All retry attempts failed for {operation_type}: {error}")
             return f"❌ خطا در پردازش درخواست. لطفاً دوباره تلاش کنید.\n\nجزئیات فنی: {error[:100]}..."
     
-    async def _openai_call(self, prompt: str) -> str:
-        """فراخوانی OpenAI"""
-        if not self.openai_client:
-            raise RuntimeError("OpenAI client not initialized")
+    async def _provider_attempt(self, provider: BaseProvider, prompt: str, deadline: Deadline = None,
+                                system: Optional[str] = None) -> Tuple[Any, bool, float, str]:
+        """فراخوانی یک ارائه‌دهنده با retry؛ هر تلاش از سهمیه، محدودکننده هم‌زمانی و قطع‌کننده مدار عبور می‌کند"""
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        breaker = self.load_balancer.breakers[provider]
+        quota = self.load_balancer.quotas[provider]
+        limiter = self.limiters[provider]
         
-        def sync_call():
-            try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "تو یک دستیار هوشمند و حرفه‌ای هستی که به زبان فارسی پاسخ می‌دهی."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    max_tokens=1500,
-                    temperature=0.7,
-                    timeout=30.0
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                logger.error(f"OpenAI API error: {e}")
-                raise
+        async def guarded_call(prompt: str) -> str:
+            # رزرو سهمیه (انتظار کوتاه یا QuotaExceededError)، جایگاه هم‌زمانی، سپس بررسی مدار؛
+            # کل تلاش به زمان باقی‌مانده deadline محدود است و timeout آن (برخلاف لغو بازنده
+            # hedge یا درخواست‌کننده) شکست گذرای ارائه‌دهنده حساب می‌شود
+            async with asyncio.timeout(deadline.remaining()) as attempt:
+                reservation = await quota.acquire(_request_text(prompt, system))
+                try:
+                    async with limiter.slot() as outcome:
+                        if not breaker.try_acquire():
+                            reservation.cancel()
+                            raise CircuitOpenError(f"Circuit open for {provider.name}")
+                        self.load_balancer.request_started(provider)
+                        start_time = time.monotonic()
+                        usage: Dict[str, Any] = {}
+                        try:
+                            result = await provider.generate(prompt, usage, deadline.cap(config.AI_REQUEST_TIMEOUT),
+                                                             system=system)
+                        except asyncio.CancelledError:
+                            reservation.settle(None)
+                            if attempt.expired():
+                                # ارائه‌دهنده تا پایان مهلت پاسخ نداد
+                                outcome["overloaded"] = True
+                                breaker.record_failure()
+                                self.load_balancer.request_finished(provider, time.monotonic() - start_time, False)
+                            else:
+                                breaker.release()
+                                self.load_balancer.request_finished(provider, time.monotonic() - start_time, None)
+                            raise
+                        except Exception as e:
+                            outcome["overloaded"] = is_overload_error(e)
+                            self._observe_quota_error(provider, e, reservation)
+                            record_breaker_error(breaker, e)
+                            self.load_balancer.request_finished(provider, time.monotonic() - start_time, False)
+                            raise
+                        quota.observe_headers(usage.get("headers"))
+                        reservation.settle(usage.get("total_tokens"))
+                        self._record_usage(provider, _request_text(prompt, system), result, usage)
+                        outcome["latency"] = time.monotonic() - start_time
+                        breaker.record_success()
+                        self.load_balancer.request_finished(provider, outcome["latency"], True)
+                        return result
+                except BaseException:
+                    # لغو در صف جایگاه هم‌زمانی (بازنده hedge، مهلت درخواست‌کننده یا توقف) سهمیه را نگه ندارد
+                    reservation.cancel()
+                    raise
         
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, sync_call)
+        return await self._retry_with_backoff(guarded_call, prompt, deadline=deadline,
+                                              expected_time=self.load_balancer.expected_latency(provider))
     
-    async def bulk_process(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """پردازش دسته‌ای درخواست‌ها"""
-        logger.info(f"Starting bulk processing of {len(requests)} requests")
+    def _record_usage(self, provider: BaseProvider, request: str, result: str, usage: Dict[str, Any],
+                      operation_type: Optional[str] = None):
+        """ثبت توکن پاسخ موفق در آمار ارائه‌دهنده و حسابداری کاربر/عملیات
+
+        اگر ارائه‌دهنده مصرف را گزارش نکرد (مثلاً stream بدون usage_metadata در Gemini)،
+        توکن‌ها از طول متن درخواست (system و prompt) و پاسخ تخمین زده می‌شوند.
+        operation_type=None: عملیات context درخواست
+        """
+        estimated = False
+        if not usage.get("prompt_tokens"):
+            usage["prompt_tokens"] = estimate_tokens(request, config.QUOTA_CHARS_PER_TOKEN)
+            estimated = True
+        if usage.get("completion_tokens") is None:
+            usage["completion_tokens"] = estimate_tokens(result or "", config.QUOTA_CHARS_PER_TOKEN)
+            estimated = True
+        self.load_balancer.record_usage(provider, usage)
+        self.usage.record(provider.name, usage["prompt_tokens"], usage["completion_tokens"], estimated,
+                          operation=operation_type, cached_tokens=usage.get("cached_tokens") or 0)
+    
+    def _observe_quota_error(self, provider: BaseProvider, error: Exception, reservation):
+        """به‌روزرسانی سهمیه از خطای ارائه‌دهنده؛ 429 تا Retry-After ارائه‌دهنده را مسدود می‌کند"""
+        quota = self.load_balancer.quotas[provider]
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        quota.observe_headers(headers)
+        
+        if isinstance(error, (openai.RateLimitError, google_exceptions.ResourceExhausted)) \
+                or getattr(error, "status_code", None) == 429:
+            # درخواست رد شده سهمیه‌ای مصرف نکرده است
+            reservation.cancel()
+            retry_after = None
+            if headers:
+                retry_after = parse_duration(headers.get("retry-after-ms"))
+                retry_after = retry_after / 1000 if retry_after is not None else parse_duration(headers.get("retry-after"))
+            quota.throttle(retry_after)
+        else:
+            reservation.settle(None)
+    
+    async def _hedged_call(self, prompt: str, operation_type: str, primary: BaseProvider, secondary: BaseProvider,
+                           deadline: Deadline = None,
+                           system: Optional[str] = None) -> Tuple[BaseProvider, Tuple[Any, bool, float, str]]:
+        """درخواست به primary؛ اگر تا صدک p90 عملیات پاسخی نیامد، درخواست دوم (hedge) به secondary.
+        اولین پاسخ موفق برنده است و دیگری لغو می‌شود.
+
+        فقط درخواست دوم زمان‌بندی‌شده از بودجه hedge می‌خورد؛ اگر primary پیش از آن شکست
+        خورد، مانند _generate بدون بودجه به ارائه‌دهنده دیگر منتقل می‌شود (failover، نه hedge).
+        """
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        request = _request_text(prompt, system)
+        self.hedging.record_request(operation_type)
+        legs = {asyncio.create_task(self._provider_attempt(primary, prompt, deadline, system)): primary}
+        hedge_delay = self.hedging.hedge_delay(operation_type)
+        hedge_decided = hedged = failed_over = False
+        last_outcome = (primary, (None, False, 0.0, "no response"))
         
-        results = []
-        semaphore = asyncio.Semaphore(3)  # محدودیت همزمانی
+        try:
+            while legs:
+                done, _ = await asyncio.wait(
+                    set(legs), timeout=None if hedge_decided else hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    provider = legs.pop(task)
+                    outcome = task.result()
+                    result, success, response_time, error = outcome
+                    self.load_balancer.record_request(provider, success, response_time, error)
+                    if success and result:
+                        if hedged and provider == secondary:
+                            self.hedging.record_hedge_win(operation_type)
+                            logger.info(f"Hedged {operation_type} request won via {secondary.name}")
+                        return provider, outcome
+                    last_outcome = (provider, outcome)
+                
+                if not done:
+                    # primary تا تأخیر hedge پاسخ نداد: درخواست دوم از بودجه hedge
+                    hedge_decided = True
+                    if self.hedging.try_acquire(operation_type):
+                        logger.info(f"Hedging {operation_type} request to {secondary.name} "
+                                   f"after {hedge_delay:.2f}s")
+                        hedged = True
+                        legs[asyncio.create_task(self._provider_attempt(secondary, prompt, deadline,
+                                                                        system))] = secondary
+                elif not legs and not hedged and not failed_over:
+                    # primary شکست خورد و درخواست دیگری در جریان نیست: یک failover بدون بودجه hedge
+                    hedge_decided = failed_over = True
+                    alternative = self.load_balancer.select_alternative(primary, request)
+                    if alternative is not None and deadline.allows(self.load_balancer.expected_latency(alternative)):
+                        logger.info(f"Failing over {operation_type} request from {primary.name} "
+                                   f"to {alternative.name} ({deadline.remaining():.1f}s left): {last_outcome[1][3]}")
+                        legs[asyncio.create_task(self._provider_attempt(alternative, prompt, deadline,
+                                                                        system))] = alternative
+            
+            return last_outcome
+        finally:
+            # لغو درخواست بازنده (یا همه، اگر خود این فراخوانی لغو شده باشد)
+            for task in legs:
+                task.cancel()
+    
+    async def _call_ai_streaming(self, prompt: str, operation_type: str, cache_key: str,
+                                 on_chunk: ChunkCallback, deadline: Deadline = None,
+                                 system: Optional[str] = None) -> str:
+        """فراخوانی AI در حالت stream با بازگشت به حالت عادی در صورت خطا"""
+        text = ""
+        try:
+            async for chunk in self._hedged_stream(prompt, operation_type, cache_key, deadline, system):
+                text += chunk
+                await on_chunk(text)
+            return text.strip()
+        except Exception as e:
+            logger.warning(f"Streaming {operation_type} failed, falling back to regular call: {e}")
+            return await self._generate(prompt, operation_type, cache_key, deadline, system)
+    
+    async def _hedged_stream(self, prompt: str, operation_type: str, cache_key: str,
+                             deadline: Deadline = None, system: Optional[str] = None) -> AsyncIterator[str]:
+        """stream با hedge زمان رسیدن اولین تکه
         
-        async def process_single(request):
-            async with semaphore:
+        اگر primary تا صدک p90 زمان اولین تکه چیزی نفرستاد، stream دوم (از بودجه hedge) به
+        ارائه‌دهنده دیگر باز می‌شود؛ اولین stream که تکه‌ای بفرستد ادامه می‌یابد و دیگری
+        بسته می‌شود. شکست همه streamها به فراخواننده می‌رسد تا به حالت عادی برگردد.
+        """
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        request = _request_text(prompt, system)
+        primary = self.load_balancer.select_provider(request)
+        secondary = self.load_balancer.select_alternative(primary, request) if config.HEDGING_ENABLED else None
+        streams = {primary: self._stream_from_provider(prompt, operation_type, cache_key, deadline, system, primary)}
+        if secondary is None:
+            async for chunk in streams[primary]:
+                yield chunk
+            return
+        
+        self.hedging.record_request(operation_type)
+        start_time = time.monotonic()
+        legs = {asyncio.ensure_future(anext(streams[primary])): primary}
+        hedge_delay = self.hedging.hedge_delay(operation_type, first_chunk=True)
+        hedge_decided = False
+        winner = first = error = None
+        
+        try:
+            while legs and winner is None:
+                done, _ = await asyncio.wait(
+                    set(legs), timeout=None if hedge_decided else hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    provider = legs.pop(task)
+                    if task.exception() is None:
+                        winner, first = provider, task.result()
+                        break
+                    error = task.exception()
+                
+                if not done:
+                    # primary تا تأخیر hedge تکه‌ای نفرستاد: stream دوم از بودجه hedge
+                    hedge_decided = True
+                    if self.hedging.try_acquire(operation_type):
+                        logger.info(f"Hedging {operation_type} stream to {secondary.name} "
+                                   f"after {hedge_delay:.2f}s without a first chunk")
+                        streams[secondary] = self._stream_from_provider(prompt, operation_type, cache_key, deadline,
+                                                                        system, secondary)
+                        legs[asyncio.ensure_future(anext(streams[secondary]))] = secondary
+        finally:
+            # لغو stream بازنده (یا همه، اگر خود این فراخوانی لغو شده باشد) و آزاد کردن جایگاه آن
+            for task in legs:
+                task.cancel()
+            await asyncio.gather(*legs, return_exceptions=True)
+            for provider, stream in streams.items():
+                if provider is not winner:
+                    await stream.aclose()
+        
+        if winner is None:
+            raise error
+        self.hedging.record_latency(operation_type, time.monotonic() - start_time, first_chunk=True)
+        if winner is secondary:
+            self.hedging.record_hedge_win(operation_type)
+            logger.info(f"Hedged {operation_type} stream won via {secondary.name}")
+        
+        try:
+            yield first
+            async for chunk in streams[winner]:
+                yield chunk
+        finally:
+            await streams[winner].aclose()
+    
+    async def _stream_from_provider(self, prompt: str, operation_type: str, cache_key: str,
+                                    deadline: Deadline = None, system: Optional[str] = None,
+                                    provider: Optional[BaseProvider] = None) -> AsyncIterator[str]:
+        """stream از ارائه‌دهنده (پیش‌فرض: انتخاب load balancer) و ذخیره متن نهایی در کش"""
+        deadline = deadline or Deadline(config.AI_DEADLINE_SECONDS)
+        request = _request_text(prompt, system)
+        provider = provider or self.load_balancer.select_provider(request)
+        breaker = self.load_balancer.breakers[provider]
+        quota = self.load_balancer.quotas[provider]
+        
+        reservation = await quota.acquire(request)
+        try:
+            async with self.limiters[provider].slot() as outcome:
+                if not breaker.try_acquire():
+                    reservation.cancel()
+                    raise CircuitOpenError(f"Circuit open for {provider.name}")
+                
+                self.load_balancer.request_started(provider)
+                start_time = time.time()
+                parts = []
+                usage: Dict[str, Any] = {}
+                chunks = provider.stream(prompt, usage, deadline.cap(config.AI_REQUEST_TIMEOUT), system=system)
                 try:
-                    prompt = request.get('prompt', '')
-                    operation_type = request.get('type', 'general')
-                    
-                    result = await self._call_ai_with_cache(prompt, operation_type)
-                    
-                    return {
-                        'id': request.get('id'),
-                        'success': True,
-                        'result': result,
-                        'error': None
-                    }
+                    while True:
+                        # انتظار برای هر تکه به زمان باقی‌مانده deadline محدود است؛ timeout آن
+                        # (TimeoutError) مثل هر خطای گذرای دیگر شکست ارائه‌دهنده ثبت می‌شود
+                        async with asyncio.timeout(deadline.remaining()):
+                            try:
+                                chunk = await anext(chunks)
+                            except StopAsyncIteration:
+                                break
+                        parts.append(chunk)
+                        yield chunk
+                except (asyncio.CancelledError, GeneratorExit):
+                    reservation.settle(None)
+                    breaker.release()
+                    self.load_balancer.request_finished(provider, time.time() - start_time, None)
+                    raise
                 except Exception as e:
-                    logger.error(f"Bulk processing error for request {request.get('id')}: {e}")
-                    return {
-                        'id': request.get('id'),
-                        'success': False,
-                        'result': None,
-                        'error': str(e)
-                    }
-        
-        # اجرای همزمان درخواست‌ها
-        tasks = [process_single(req) for req in requests]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # فیلتر نتایج
-        processed_results = []
-        for result in results:
-            if isinstance(result, Exception):
-                processed_results.append({
-                    'success': False,
-                    'error': str(result)
-                })
-            else:
-                processed_results.append(result)
+                    outcome["overloaded"] = is_overload_error(e)
+                    self._observe_quota_error(provider, e, reservation)
+                    record_breaker_error(breaker, e)
+                    self.load_balancer.request_finished(provider, time.time() - start_time, False)
+                    self.load_balancer.record_request(provider, False, time.time() - start_time, str(e))
+                    raise
+                
+                response_time = time.time() - start_time
+                quota.observe_headers(usage.get("headers"))
+                reservation.settle(usage.get("total_tokens"))
+                result = "".join(parts).strip()
+                self._record_usage(provider, request, result, usage, operation_type)
+                if not result:
+                    breaker.record_failure()
+                    self.load_balancer.request_finished(provider, response_time, False)
+                    self.load_balancer.record_request(provider, False, response_time, "Empty streamed response")
+                    raise RuntimeError(f"Empty streamed response from {provider.name}")
+                
+                outcome["latency"] = response_time
+                breaker.record_success()
+                self.load_balancer.request_finished(provider, response_time, True)
+                self.load_balancer.record_request(provider, True, response_time)
+        except BaseException:
+            # لغو در صف جایگاه هم‌زمانی (بازنده hedge، مهلت درخواست‌کننده یا توقف) سهمیه را نگه ندارد
+            reservation.cancel()
+            raise
+        
+        self.cache.set_by_key(cache_key, result, provider.name)
+        logger.info(f"Successful streamed {operation_type} request via {provider.name} "
+                   f"in {response_time:.2f}s")
+    
+    async def bulk_process(self, requests: List[Dict[str, Any]], concurrency: int = None) -> List[Dict[str, Any]]:
+        """پردازش دسته‌ای درخواست‌ها (نتیجه‌ها به ترتیب ورودی)"""
+        logger.info(f"Starting bulk processing of {len(requests)} requests")
+        
+        processed_results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        async for index, result in self.bulk_process_stream(requests, concurrency):
+            processed_results[index] = result
         
         successful = sum(1 for r in processed_results if r.get('success'))
         logger.info(f"Bulk processing completed: {successful}/{len(requests)} successful")
         
         return processed_results
     
+    async def bulk_process_stream(self, requests: Iterable[Dict[str, Any]],
+                                  concurrency: int = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """پردازش دسته‌ای با حداکثر concurrency درخواست هم‌زمان
+        
+        درخواست‌ها به تدریج از requests خوانده می‌شوند و (شماره، نتیجه) هر کدام به
+        ترتیب پایان برگردانده می‌شود؛ پس فایل‌های بزرگ نه کامل در حافظه بارگذاری
+        می‌شوند و نه نتیجه‌هایشان تا پایان کار نگه داشته می‌شود.
+        """
+        concurrency = max(concurrency or config.BATCH_CONCURRENCY, 1)
+        pending: Dict[asyncio.Task, int] = {}
+        try:
+            for index, request in enumerate(requests):
+                if len(pending) >= concurrency:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield pending.pop(task), task.result()
+                pending[asyncio.create_task(self._process_bulk_request(request))] = index
+            
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield pending.pop(task), task.result()
+        finally:
+            # مصرف‌کننده زودتر متوقف شد (یا لغو شد): درخواست‌های باقی‌مانده لغو می‌شوند
+            for task in pending:
+                task.cancel()
+    
+    async def _process_bulk_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """اجرای یک درخواست دسته‌ای؛ خطا در نتیجه ثبت می‌شود، نه به صورت exception"""
+        # همزمانی با محدودکننده تطبیقی هر ارائه‌دهنده کنترل می‌شود؛
+        # درخواست‌های دسته‌ای پشت درخواست‌های تعاملی صف می‌کشند
+        request_priority.set(PRIORITY_BULK)
+        try:
+            result = await self._bulk_call(request)
+            if result.startswith(_ERROR_REPLY_PREFIXES):
+                return {
+                    'id': request.get('id'),
+                    'success': False,
+                    'result': None,
+                    'error': result
+                }
+            
+            return {
+                'id': request.get('id'),
+                'success': True,
+                'result': result,
+                'error': None
+            }
+        except Exception as e:
+            logger.error(f"Bulk processing error for request {request.get('id')}: {e}")
+            return {
+                'id': request.get('id'),
+                'success': False,
+                'result': None,
+                'error': str(e)
+            }
+    
     async def optimize_prompt(self, prompt: str, target_length: int = None) -> str:
         """بهینه‌سازی پرامپت"""
         optimization_prompt = f"""
@@ -484,9 +1388,31 @@ class AIService:
         
         return await self._call_ai_with_cache(optimization_prompt, "prompt_optimization")
     
-    async def analyze_sentiment(self, text: str) -> Dict[str, Any]:
-        """تحلیل احساسات متن"""
-        analysis_prompt = f"""
+    def _bulk_call(self, request: Dict[str, Any]) -> Awaitable[str]:
+        """فراخوانی سرویس برای یک درخواست دسته‌ای
+
+        {"type": ..., "text": ...} بدون prompt برای عملیات قالب‌دار (headlines، fact_check و
+        sentiment_analysis) از مسیر همان عملیات می‌گذرد؛ پس کلید کش قالب دارد و ورودی‌های
+        کوتاه با MICRO_BATCH_ENABLED کنار هم در یک درخواست ارائه‌دهنده فرستاده می‌شوند.
+        در غیر این صورت prompt خام فرستاده می‌شود و text (اگر بخشی از prompt باشد) داده
+        کاربر آن است، برای کش معنایی و micro-batch.
+        """
+        operation_type = request.get('type', 'general')
+        text = request.get('text') or None
+        prompt = request.get('prompt')
+        if text and not prompt:
+            if operation_type == "headlines":
+                return self.generate_headlines(text)
+            if operation_type == "fact_check":
+                return self.fact_check(text)
+            if operation_type == "sentiment_analysis":
+                return self._call_ai_with_cache(self._sentiment_prompt(text), operation_type, payload=text)
+        prompt = prompt or text or ''
+        return self._call_ai_with_cache(prompt, operation_type, payload=text if text and text in prompt else None)
+    
+    @staticmethod
+    def _sentiment_prompt(text: str) -> str:
+        return f"""
 احساسات متن زیر را تحلیل کن:
 
 "{text}"
@@ -499,11 +1425,12 @@ class AIService:
     "summary": "خلاصه تحلیل"
 }}
         """
-        
+    
+    async def analyze_sentiment(self, text: str) -> Dict[str, Any]:
+        """تحلیل احساسات متن"""
+        result = await self._call_ai_with_cache(self._sentiment_prompt(text), "sentiment_analysis", payload=text)
         try:
-            result = await self._call_ai_with_cache(analysis_prompt, "sentiment_analysis")
             # تلاش برای parse کردن JSON
-            import json
             return json.loads(result)
         except json.JSONDecodeError:
             # اگر JSON نبود، خام برگردان
@@ -517,19 +1444,30 @@ class AIService:
         return {
             "cache": cache_stats,
             "load_balancer": lb_stats,
+            "providers": {provider.name: provider.get_stats() for provider in self.providers},
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else None,
+            "hedging": self.hedging.get_stats(),
+            "concurrency": {provider.name: limiter.get_stats() for provider, limiter in self.limiters.items()},
+            "micro_batching": {name: batcher.get_stats() for name, batcher in self._batchers.items()},
+            "usage": self.usage.export(user_limit=config.USAGE_STATS_TOP),
+            "coalescing": {
+                **self.coalescing_stats,
+                "in_flight": len(self._inflight)
+            },
             "configuration": {
                 "max_retries": self.max_retries,
                 "base_delay": self.base_delay,
                 "max_delay": self.max_delay,
-                "openai_available": bool(self.openai_client),
-                "gemini_available": bool(config.GEMINI_API_KEY)
+                "available_providers": [provider.name for provider in self.providers if provider.is_configured()]
             }
         }
     
     async def health_check(self) -> Dict[str, Any]:
-        """بررسی سلامت سرویس"""
-        logger.info("Performing AI service health check...")
-        
+        """بررسی سلامت سرویس از مدل سلامت غیرفعال (بدون درخواست AI و بدون انتظار)
+
+        برای ارائه‌دهنده بدون ترافیک اخیر یک probe سبک در پس‌زمینه زمان‌بندی می‌شود.
+        """
+        health = self.load_balancer.health
         health_status = {
             "overall": "healthy",
             "providers": {},
@@ -537,74 +1475,35 @@ class AIService:
             "timestamp": datetime.now().isoformat()
         }
         
-        # تست سریع هر ارائه‌دهنده
-        test_prompt = "سلام، این یک تست سلامت است."
-        
-        # تست OpenAI
-        if self.openai_client:
-            try:
-                start_time = time.time()
-                await asyncio.wait_for(self._openai_call(test_prompt), timeout=10.0)
-                response_time = time.time() - start_time
-                
-                health_status["providers"]["openai"] = {
-                    "status": "healthy",
-                    "response_time": round(response_time, 3),
-                    "error": None
-                }
-            except Exception as e:
-                health_status["providers"]["openai"] = {
-                    "status": "unhealthy",
-                    "response_time": None,
-                    "error": str(e)
-                }
-                health_status["overall"] = "degraded"
-        else:
-            health_status["providers"]["openai"] = {
-                "status": "unavailable",
-                "response_time": None,
-                "error": "Client not initialized"
-            }
-        
-        # تست Gemini
-        if config.GEMINI_API_KEY:
-            try:
-                start_time = time.time()
-                await asyncio.wait_for(self._gemini_call(test_prompt), timeout=10.0)
-                response_time = time.time() - start_time
-                
-                health_status["providers"]["gemini"] = {
-                    "status": "healthy",
-                    "response_time": round(response_time, 3),
-                    "error": None
-                }
-            except Exception as e:
-                health_status["providers"]["gemini"] = {
-                    "status": "unhealthy",
+        for provider in self.providers:
+            if not provider.is_configured():
+                health_status["providers"][provider.name] = {
+                    "status": "unavailable",
                     "response_time": None,
-                    "error": str(e)
+                    "error": "Provider not configured"
                 }
-                if health_status["overall"] != "degraded":
-                    health_status["overall"] = "degraded"
-        else:
-            health_status["providers"]["gemini"] = {
-                "status": "unavailable",
-                "response_time": None,
-                "error": "API key not configured"
-            }
+                continue
+            
+            health.schedule_probe(provider.name, provider.probe)
+            provider_health = dict(health.evaluate(provider.name))
+            breaker_state = self.load_balancer.breakers[provider].state.value
+            provider_health["circuit"] = breaker_state
+            if breaker_state == "open":
+                provider_health["status"] = HealthState.UNHEALTHY.value
+                provider_health["error"] = provider_health["error"] or "Circuit open"
+            health_status["providers"][provider.name] = provider_health
         
-        # بررسی وضعیت کلی
-        healthy_providers = sum(
-            1 for provider in health_status["providers"].values()
-            if provider["status"] == "healthy"
-        )
+        # بررسی وضعیت کلی (unknown تا اولین ترافیک یا probe قابل استفاده فرض می‌شود)
+        statuses = [provider["status"] for provider in health_status["providers"].values()
+                    if provider["status"] != "unavailable"]
+        usable = [status for status in statuses if status != HealthState.UNHEALTHY.value]
         
-        if healthy_providers == 0:
+        if not usable:
             health_status["overall"] = "critical"
-        elif healthy_providers < len([p for p in health_status["providers"].values() if p["status"] != "unavailable"]):
+        elif len(usable) < len(statuses) or HealthState.DEGRADED.value in usable:
             health_status["overall"] = "degraded"
         
-        logger.info(f"Health check completed: {health_status['overall']}")
+        logger.debug(f"Health check: {health_status['overall']}")
         return health_status
     
     async def periodic_maintenance(self):
@@ -614,45 +1513,38 @@ class AIService:
         # پاک کردن کش منقضی
         self.cache.clear_expired()
         
-        # ریست آمار ناسالم
-        for provider, stats in self.load_balancer.providers.items():
-            if stats.consecutive_failures > 5:
-                logger.warning(f"Resetting consecutive failures for {provider.value}")
-                stats.consecutive_failures = max(0, stats.consecutive_failures - 1)
+        # probe ارائه‌دهندگان بدون ترافیک اخیر
+        for provider in self.providers:
+            if provider.is_configured():
+                self.load_balancer.health.schedule_probe(provider.name, provider.probe)
+        
+        # وضعیت مدارها خودکار (بر اساس زمان) تغییر می‌کند؛ فقط گزارش
+        for provider, breaker in self.load_balancer.breakers.items():
+            breaker_stats = breaker.get_stats()
+            logger.info(f"Circuit {provider.name}: {breaker_stats['state']}, "
+                       f"error_rate={breaker_stats['window_error_rate']}%")
         
         logger.info("Periodic maintenance completed")
     
+    def start_maintenance(self, interval: float = None):
+        """زمان‌بندی اجرای دوره‌ای periodic_maintenance در event loop جاری"""
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.create_task(
+                self._maintenance_loop(interval or config.MAINTENANCE_INTERVAL)
+            )
+    
+    async def _maintenance_loop(self, interval: float):
+        """حلقه نگهداری دوره‌ای"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.periodic_maintenance()
+            except Exception as e:
+                logger.error(f"Periodic maintenance failed: {e}")
+    
     def __del__(self):
         """پاکسازی منابع"""
         logger.info("AI Service cleanup completed")
 
 # نمونه global برای استفاده آسان
 ai_service = AIService()
-    
-    async def _gemini_call(self, prompt: str) -> str:
-        """فراخوانی Gemini"""
-        def sync_call():
-            try:
-                model = genai.GenerativeModel('gemini-pro')
-                
-                # تنظیمات مدل
-                generation_config = genai.types.GenerationConfig(
-                    temperature=0.7,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=1500,
-                )
-                
-                response = model.generate_content(
-                    prompt,
-                    generation_config=generation_config
-                )
-                
-                if response.text:
-                    return response.text.strip()
-                else:
-                    raise RuntimeError("Empty response from Gemini")
-                    
-            except Exception as e:
-                logger.error(f"Gemini API error: {e}")
-                raise
@@ -0,0 +1,184 @@
+# services/batch_jobs.py - پردازش دسته‌ای آفلاین فایل JSONL با قابلیت ادامه پس از قطع
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Set
+
+logger = logging.getLogger(__name__)
+
+class BatchJob:
+    """اجرای فایل JSONL درخواست‌ها از طریق AIService.bulk_process_stream
+
+    هر خط ورودی یک شیء {"id": ..., "type": ..., "prompt": ...} یا برای عملیات قالب‌دار
+    {"id": ..., "type": ..., "text": ...} است (همان قالب bulk_process). نتیجه هر درخواست بلافاصله پس از پایان به صورت یک خط به فایل
+    خروجی اضافه می‌شود؛ خود فایل خروجی نقطه بازیابی است: در اجرای دوباره، شناسه‌هایی
+    که نتیجه موفق دارند رد می‌شوند و فقط بقیه (از جمله ناموفق‌ها) دوباره فرستاده
+    می‌شوند. برای شناسه‌ای که چند خط دارد، آخرین خط معتبر است.
+
+    آمار تجمعی همه اجراها (تعداد، توکن، هزینه و زمان) در فایل <output>.state.json
+    نگه داشته می‌شود.
+    """
+    
+    def __init__(self, ai_service, input_path: str, output_path: str, concurrency: int = 8,
+                 checkpoint_interval: float = 5.0):
+        self.ai_service = ai_service
+        self.input_path = input_path
+        self.output_path = output_path
+        self.state_path = f"{output_path}.state.json"
+        self.concurrency = concurrency
+        self.checkpoint_interval = checkpoint_interval
+        
+        self.previous = self._load_state()
+        self.skipped = 0
+        self.invalid = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._started = 0.0
+        self._usage_start: Dict[str, Any] = {}
+    
+    def _load_state(self) -> Dict[str, Any]:
+        """آمار تجمعی اجراهای قبلی"""
+        try:
+            with open(self.state_path, encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+    
+    def _load_completed(self) -> Set[str]:
+        """شناسه‌های موفق در خروجی قبلی؛ خط ناقص انتهای فایل (قطع هنگام نوشتن) حذف می‌شود"""
+        completed: Set[str] = set()
+        if not os.path.exists(self.output_path):
+            return completed
+        
+        valid_size = 0
+        with open(self.output_path, "rb") as output_file:
+            for line in output_file:
+                if not line.endswith(b"\n"):
+                    break
+                valid_size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("success"):
+                    completed.add(str(record.get("id")))
+        
+        if valid_size < os.path.getsize(self.output_path):
+            logger.warning(f"Truncating partial last line of {self.output_path}")
+            with open(self.output_path, "r+b") as output_file:
+                output_file.truncate(valid_size)
+        return completed
+    
+    def _read_requests(self, completed: Set[str]) -> Iterator[Dict[str, Any]]:
+        """خواندن تدریجی درخواست‌های انجام‌نشده از فایل ورودی"""
+        with open(self.input_path, encoding="utf-8") as input_file:
+            for line_number, line in enumerate(input_file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self.invalid += 1
+                    logger.warning(f"Skipping invalid JSON on line {line_number} of {self.input_path}")
+                    continue
+                if not isinstance(request, dict) or not (request.get("prompt") or request.get("text")):
+                    self.invalid += 1
+                    logger.warning(f"Skipping line {line_number}: no prompt or text")
+                    continue
+                
+                # شناسه پیش‌فرض شماره خط است تا ادامه کار بدون شناسه صریح هم ممکن باشد
+                request["id"] = str(request.get("id", f"line-{line_number}"))
+                if request["id"] in completed:
+                    self.skipped += 1
+                    continue
+                yield request
+    
+    def _usage_delta(self) -> Dict[str, Any]:
+        """توکن و هزینه مصرف‌شده در این اجرا"""
+        current = self.ai_service.load_balancer.usage_totals()
+        return {name: current[name] - self._usage_start.get(name, 0) for name in current}
+    
+    def report(self) -> Dict[str, Any]:
+        """گزارش این اجرا و مجموع همه اجراها"""
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        processed = self.succeeded + self.failed
+        usage = self._usage_delta()
+        totals = self.previous.get("totals", {})
+        return {
+            "input": self.input_path,
+            "output": self.output_path,
+            "run": {
+                "processed": processed,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "skipped_completed": self.skipped,
+                "invalid_lines": self.invalid,
+                "elapsed_seconds": round(elapsed, 2),
+                "items_per_minute": round(processed / elapsed * 60, 1) if elapsed else 0,
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "estimated_cost": round(usage["cost"], 4)
+            },
+            "totals": {
+                "succeeded": totals.get("succeeded", 0) + self.succeeded,
+                "failed_attempts": totals.get("failed_attempts", 0) + self.failed,
+                "elapsed_seconds": round(totals.get("elapsed_seconds", 0) + elapsed, 2),
+                "prompt_tokens": totals.get("prompt_tokens", 0) + usage["prompt_tokens"],
+                "completion_tokens": totals.get("completion_tokens", 0) + usage["completion_tokens"],
+                "estimated_cost": round(totals.get("estimated_cost", 0) + usage["cost"], 4),
+                "runs": totals.get("runs", 0) + 1
+            },
+            "updated_at": datetime.now().isoformat()
+        }
+    
+    def _save_state(self) -> Dict[str, Any]:
+        """ذخیره اتمی آمار (نوشتن در فایل موقت و جایگزینی)"""
+        state = self.report()
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.state_path)
+        return state
+    
+    async def run(self) -> Dict[str, Any]:
+        """پردازش درخواست‌های باقی‌مانده و برگرداندن گزارش"""
+        completed = self._load_completed()
+        if completed:
+            logger.info(f"Resuming batch: {len(completed)} items already completed")
+        
+        self._started = time.monotonic()
+        self._usage_start = self.ai_service.load_balancer.usage_totals()
+        last_checkpoint = self._started
+        
+        with open(self.output_path, "a", encoding="utf-8") as output_file:
+            try:
+                stream = self.ai_service.bulk_process_stream(self._read_requests(completed), self.concurrency)
+                async for _, result in stream:
+                    if result["success"]:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                    result["finished_at"] = datetime.now().isoformat()
+                    output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    output_file.flush()
+                    
+                    now = time.monotonic()
+                    if now - last_checkpoint >= self.checkpoint_interval:
+                        last_checkpoint = now
+                        os.fsync(output_file.fileno())
+                        state = self._save_state()
+                        logger.info(f"Batch progress: {state['run']['processed']} done "
+                                   f"({state['run']['items_per_minute']}/min, "
+                                   f"${state['run']['estimated_cost']})")
+            finally:
+                output_file.flush()
+                os.fsync(output_file.fileno())
+                state = self._save_state()
+        
+        logger.info(f"Batch finished: {self.succeeded} succeeded, {self.failed} failed, "
+                   f"{self.skipped} already completed")
+        return state
@@ -0,0 +1,393 @@
+# services/cache_engine.py - موتورهای کش با سیاست‌های حذف O(1) و انقضای TTL
+
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class EvictionPolicy(Enum):
+    """سیاست‌های حذف کش"""
+    LRU = "lru"
+    LFU = "lfu"
+    TINY_LFU = "tinylfu"
+
+class CacheEngine:
+    """پایه موتورهای کش - مدیریت TTL با heap انقضا (پاکسازی سرشکن)"""
+    
+    policy: EvictionPolicy = None
+    
+    # حداکثر تعداد ورودی منقضی که در هر set پاک می‌شود
+    EXPIRE_BATCH = 4
+    
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self.evictions = 0
+        self.expirations = 0
+        self._expire_at: Dict[Hashable, float] = {}
+        self._expiry_heap: List[Tuple[float, Hashable]] = []
+    
+    # ---- رابط عمومی ----
+    
+    def get(self, key: Hashable, now: float = None) -> Optional[Any]:
+        """دریافت مقدار (None در صورت نبود یا انقضا)"""
+        expire_at = self._expire_at.get(key)
+        if expire_at is not None and expire_at <= (now if now is not None else time.time()):
+            self.delete(key)
+            self.expirations += 1
+            return None
+        return self._get(key)
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, now: float = None):
+        """ذخیره مقدار با TTL اختیاری (ثانیه)"""
+        now = now if now is not None else time.time()
+        self._expire_some(now)
+        
+        self._put(key, value)
+        
+        if ttl is not None:
+            expire_at = now + ttl
+            self._expire_at[key] = expire_at
+            heapq.heappush(self._expiry_heap, (expire_at, key))
+            self._compact_heap()
+        else:
+            self._expire_at.pop(key, None)
+    
+    def delete(self, key: Hashable) -> bool:
+        """حذف کلید"""
+        self._expire_at.pop(key, None)
+        return self._remove(key)
+    
+    def clear_expired(self, now: float = None) -> int:
+        """پاک کردن تمام ورودی‌های منقضی"""
+        return self._expire_some(now if now is not None else time.time(), limit=None)
+    
+    def __len__(self) -> int:
+        raise NotImplementedError
+    
+    def __contains__(self, key: Hashable) -> bool:
+        raise NotImplementedError
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار موتور"""
+        return {
+            "policy": self.policy.value,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+    
+    # ---- پیاده‌سازی سیاست (در زیرکلاس‌ها) ----
+    
+    def _get(self, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+    
+    def _put(self, key: Hashable, value: Any):
+        raise NotImplementedError
+    
+    def _remove(self, key: Hashable) -> bool:
+        raise NotImplementedError
+    
+    def _on_evict(self, key: Hashable):
+        """اعلام حذف توسط سیاست"""
+        self._expire_at.pop(key, None)
+        self.evictions += 1
+    
+    # ---- انقضا ----
+    
+    def _expire_some(self, now: float, limit: Optional[int] = EXPIRE_BATCH) -> int:
+        """حذف ورودی‌های منقضی از سر heap (ورودی‌های کهنه heap نادیده گرفته می‌شوند)"""
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now and (limit is None or removed < limit):
+            expire_at, key = heapq.heappop(heap)
+            if self._expire_at.get(key) == expire_at:
+                self.delete(key)
+                self.expirations += 1
+                removed += 1
+        return removed
+    
+    def _compact_heap(self):
+        """بازسازی heap وقتی ورودی‌های کهنه زیاد شوند"""
+        if len(self._expiry_heap) > 2 * len(self._expire_at) + 64:
+            self._expiry_heap = [(expire_at, key) for key, expire_at in self._expire_at.items()]
+            heapq.heapify(self._expiry_heap)
+
+class LRUCacheEngine(CacheEngine):
+    """LRU واقعی با OrderedDict"""
+    
+    policy = EvictionPolicy.LRU
+    
+    def __init__(self, max_size: int):
+        super().__init__(max_size)
+        self._data: OrderedDict = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+    
+    def _get(self, key: Hashable) -> Optional[Any]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+    
+    def _put(self, key: Hashable, value: Any):
+        if key in self._data:
+            self._data.move_to_end(key)
+        elif len(self._data) >= self.max_size:
+            victim, _ = self._data.popitem(last=False)
+            self._on_evict(victim)
+        self._data[key] = value
+    
+    def _remove(self, key: Hashable) -> bool:
+        return self._data.pop(key, _MISSING) is not _MISSING
+
+class LFUCacheEngine(CacheEngine):
+    """LFU با سطل‌های فرکانس (در هر سطل به ترتیب LRU)"""
+    
+    policy = EvictionPolicy.LFU
+    
+    def __init__(self, max_size: int):
+        super().__init__(max_size)
+        self._values: Dict[Hashable, Any] = {}
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = {}
+        self._min_freq = 0
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+    
+    def _touch(self, key: Hashable):
+        """افزایش فرکانس کلید و انتقال به سطل بعدی"""
+        freq = self._freq[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+    
+    def _get(self, key: Hashable) -> Optional[Any]:
+        if key not in self._values:
+            return None
+        self._touch(key)
+        return self._values[key]
+    
+    def _put(self, key: Hashable, value: Any):
+        if key in self._values:
+            self._values[key] = value
+            self._touch(key)
+            return
+        
+        if len(self._values) >= self.max_size:
+            if self._min_freq not in self._buckets:
+                # کمینه پس از _remove نامعتبر شده و درجی از آن زمان نبوده است
+                self._min_freq = min(self._buckets)
+            bucket = self._buckets[self._min_freq]
+            victim, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._min_freq]
+            del self._values[victim]
+            del self._freq[victim]
+            self._on_evict(victim)
+        
+        self._values[key] = value
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+    
+    def _remove(self, key: Hashable) -> bool:
+        if key not in self._values:
+            return False
+        freq = self._freq.pop(key)
+        del self._values[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                # کمینه در درج بعدی 1 می‌شود یا هنگام evict دوباره محاسبه می‌شود
+                self._min_freq = 0
+        return True
+
+class FrequencySketch:
+    """Count-Min Sketch با 4 ردیف شمارنده (حداکثر 15) و کاهش دوره‌ای (aging)"""
+    
+    MAX_COUNT = 15
+    _HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+    _HALVE_TABLE = bytes(value >> 1 for value in range(256))
+    
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity:
+            width <<= 1
+        self._width = width
+        self._mask = width - 1
+        # چهار ردیف پشت سر هم در یک bytearray
+        self._table = bytearray(4 * width)
+        self._additions = 0
+        self._sample_size = 10 * width
+    
+    def _indexes(self, key: Hashable) -> Tuple[int, int, int, int]:
+        """چهار اندیس مستقل از برش‌های 32 بیتی یک hash ضربی 128 بیتی"""
+        mixed = (hash(key) & 0xFFFFFFFFFFFFFFFF) * self._HASH_MULTIPLIER
+        mask = self._mask
+        width = self._width
+        return (
+            mixed & mask,
+            width + ((mixed >> 32) & mask),
+            2 * width + ((mixed >> 64) & mask),
+            3 * width + ((mixed >> 96) & mask)
+        )
+    
+    def frequency(self, key: Hashable) -> int:
+        """تخمین فرکانس"""
+        table = self._table
+        i0, i1, i2, i3 = self._indexes(key)
+        return min(table[i0], table[i1], table[i2], table[i3])
+    
+    def increment(self, key: Hashable):
+        """ثبت یک دسترسی"""
+        table = self._table
+        added = False
+        for index in self._indexes(key):
+            if table[index] < self.MAX_COUNT:
+                table[index] += 1
+                added = True
+        if added:
+            self._additions += 1
+            if self._additions >= self._sample_size:
+                self._reset()
+    
+    def _reset(self):
+        """نصف کردن همه شمارنده‌ها تا فرکانس‌های قدیمی کم‌رنگ شوند"""
+        self._table = self._table.translate(self._HALVE_TABLE)
+        self._additions //= 2
+
+class TinyLFUCacheEngine(CacheEngine):
+    """W-TinyLFU: پنجره LRU کوچک + SLRU اصلی با پذیرش بر اساس فرکانس"""
+    
+    policy = EvictionPolicy.TINY_LFU
+    
+    WINDOW_RATIO = 0.01
+    PROTECTED_RATIO = 0.8
+    
+    def __init__(self, max_size: int):
+        super().__init__(max_size)
+        self.window_size = max(1, int(max_size * self.WINDOW_RATIO))
+        self.main_size = max_size - self.window_size
+        self.protected_size = int(self.main_size * self.PROTECTED_RATIO)
+        
+        self._window: OrderedDict = OrderedDict()
+        self._probation: OrderedDict = OrderedDict()
+        self._protected: OrderedDict = OrderedDict()
+        self._sketch = FrequencySketch(max_size)
+        self.rejections = 0
+    
+    def __len__(self) -> int:
+        return len(self._window) + len(self._probation) + len(self._protected)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._window or key in self._probation or key in self._protected
+    
+    def _get(self, key: Hashable) -> Optional[Any]:
+        # فرکانس فقط برای hit ثبت می‌شود؛ miss در درج بعدی (_put) شمرده می‌شود
+        if key in self._window:
+            self._sketch.increment(key)
+            self._window.move_to_end(key)
+            return self._window[key]
+        
+        if key in self._protected:
+            self._sketch.increment(key)
+            self._protected.move_to_end(key)
+            return self._protected[key]
+        
+        if key in self._probation:
+            self._sketch.increment(key)
+            # ارتقا به بخش محافظت‌شده
+            value = self._probation.pop(key)
+            self._protected[key] = value
+            if len(self._protected) > self.protected_size:
+                demoted, demoted_value = self._protected.popitem(last=False)
+                self._probation[demoted] = demoted_value
+            return value
+        
+        return None
+    
+    def _put(self, key: Hashable, value: Any):
+        for segment in (self._window, self._protected, self._probation):
+            if key in segment:
+                segment[key] = value
+                segment.move_to_end(key)
+                return
+        
+        self._sketch.increment(key)
+        self._window[key] = value
+        if len(self._window) > self.window_size:
+            candidate, candidate_value = self._window.popitem(last=False)
+            self._admit(candidate, candidate_value)
+    
+    def _admit(self, candidate: Hashable, value: Any):
+        """پذیرش کاندید پنجره در بخش اصلی در برابر قربانی probation"""
+        if self.main_size == 0:
+            self._on_evict(candidate)
+            return
+        
+        if len(self._probation) + len(self._protected) < self.main_size:
+            self._probation[candidate] = value
+            return
+        
+        if not self._probation:
+            # همه در protected هستند - قدیمی‌ترین را به probation منتقل کن
+            demoted, demoted_value = self._protected.popitem(last=False)
+            self._probation[demoted] = demoted_value
+        
+        victim = next(iter(self._probation))
+        if self._sketch.frequency(candidate) > self._sketch.frequency(victim):
+            del self._probation[victim]
+            self._on_evict(victim)
+            self._probation[candidate] = value
+        else:
+            self.rejections += 1
+            self._on_evict(candidate)
+    
+    def _remove(self, key: Hashable) -> bool:
+        for segment in (self._window, self._probation, self._protected):
+            if segment.pop(key, _MISSING) is not _MISSING:
+                return True
+        return False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["rejections"] = self.rejections
+        return stats
+
+_MISSING = object()
+
+_ENGINES = {
+    EvictionPolicy.LRU: LRUCacheEngine,
+    EvictionPolicy.LFU: LFUCacheEngine,
+    EvictionPolicy.TINY_LFU: TinyLFUCacheEngine,
+}
+
+def create_cache_engine(policy: str, max_size: int) -> CacheEngine:
+    """ساخت موتور کش بر اساس نام سیاست"""
+    try:
+        engine_class = _ENGINES[EvictionPolicy(policy.lower())]
+    except ValueError:
+        logger.warning(f"Unknown cache policy '{policy}', falling back to lru")
+        engine_class = LRUCacheEngine
+    return engine_class(max_size)
@@ -0,0 +1,179 @@
+# services/circuit_breaker.py - قطع‌کننده مدار برای هر ارائه‌دهنده AI
+
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class BreakerState(Enum):
+    """وضعیت‌های قطع‌کننده مدار"""
+    CLOSED = "closed"        # عادی: همه درخواست‌ها عبور می‌کنند
+    OPEN = "open"            # قطع: هیچ درخواستی ارسال نمی‌شود
+    HALF_OPEN = "half_open"  # آزمایشی: تعداد محدودی درخواست probe
+
+class CircuitOpenError(RuntimeError):
+    """ارائه‌دهنده به دلیل باز بودن مدار درخواست نمی‌پذیرد"""
+
+class CircuitBreaker:
+    """قطع‌کننده مدار با نرخ خطای پنجره زمانی متحرک
+
+    پنجره به bucket های زمانی تقسیم می‌شود تا خطاهای قدیمی خودبه‌خود کنار بروند.
+    وقتی نرخ خطا (با حداقل تعداد درخواست) از آستانه بگذرد مدار باز می‌شود؛ پس از
+    زمان انتظار، چند درخواست probe اجازه عبور دارند و با موفقیت آن‌ها مدار بسته
+    می‌شود. شکست probe مدار را با زمان انتظار دوبرابر (تا سقف) دوباره باز می‌کند.
+    """
+    
+    def __init__(self, name: str, window_seconds: float = 60.0, buckets: int = 12,
+                 failure_threshold: float = 0.5, min_requests: int = 10, open_seconds: float = 15.0,
+                 max_open_seconds: float = 120.0, half_open_probes: int = 2, probe_timeout: float = 60.0):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_width = window_seconds / buckets
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = probe_timeout
+        
+        # bucket ها: شماره بازه زمانی، موفق، ناموفق
+        self._bucket_epoch = [-1] * buckets
+        self._successes = [0] * buckets
+        self._failures = [0] * buckets
+        
+        self.state = BreakerState.CLOSED
+        self._open_until = 0.0
+        self._current_open_seconds = open_seconds
+        self._probes_started: deque = deque()
+        self._probe_successes = 0
+        
+        self.opened_count = 0
+        self.rejected_count = 0
+        self.last_state_change: Optional[float] = None
+    
+    def _bucket(self, now: float) -> int:
+        """bucket زمان فعلی (bucket کهنه بازنشانی می‌شود)"""
+        epoch = int(now / self.bucket_width)
+        index = epoch % self.buckets
+        if self._bucket_epoch[index] != epoch:
+            self._bucket_epoch[index] = epoch
+            self._successes[index] = 0
+            self._failures[index] = 0
+        return index
+    
+    def _window_counts(self, now: float):
+        """(موفق، ناموفق) در پنجره زمانی"""
+        oldest_epoch = int(now / self.bucket_width) - self.buckets + 1
+        successes = failures = 0
+        for index in range(self.buckets):
+            if self._bucket_epoch[index] >= oldest_epoch:
+                successes += self._successes[index]
+                failures += self._failures[index]
+        return successes, failures
+    
+    def _set_state(self, state: BreakerState, now: float):
+        if state != self.state:
+            logger.warning(f"Circuit breaker {self.name}: {self.state.value} -> {state.value}")
+            self.state = state
+            self.last_state_change = now
+    
+    def _expire_probes(self, now: float):
+        """آزاد کردن probe هایی که نتیجه‌شان هرگز ثبت نشد (مثلاً لغو شدند)"""
+        while self._probes_started and now - self._probes_started[0] > self.probe_timeout:
+            self._probes_started.popleft()
+    
+    def allows_traffic(self, now: float = None) -> bool:
+        """آیا می‌توان این ارائه‌دهنده را انتخاب کرد (بدون تغییر وضعیت)"""
+        now = now if now is not None else time.time()
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN:
+            return now >= self._open_until
+        self._expire_probes(now)
+        return len(self._probes_started) < self.half_open_probes
+    
+    def try_acquire(self, now: float = None) -> bool:
+        """اجازه ارسال یک درخواست؛ در حالت half-open یک probe ثبت می‌شود"""
+        now = now if now is not None else time.time()
+        if self.state == BreakerState.CLOSED:
+            return True
+        
+        if self.state == BreakerState.OPEN:
+            if now < self._open_until:
+                self.rejected_count += 1
+                return False
+            self._set_state(BreakerState.HALF_OPEN, now)
+            self._probes_started.clear()
+            self._probe_successes = 0
+        
+        self._expire_probes(now)
+        if len(self._probes_started) >= self.half_open_probes:
+            self.rejected_count += 1
+            return False
+        self._probes_started.append(now)
+        return True
+    
+    def release(self):
+        """درخواست بدون نتیجه پایان یافت (لغو شد)"""
+        if self.state == BreakerState.HALF_OPEN and self._probes_started:
+            self._probes_started.popleft()
+    
+    def record_success(self, now: float = None):
+        """ثبت درخواست موفق"""
+        now = now if now is not None else time.time()
+        self._successes[self._bucket(now)] += 1
+        
+        if self.state == BreakerState.HALF_OPEN:
+            self.release()
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                # بازیابی: شروع دوباره با پنجره تمیز
+                self._set_state(BreakerState.CLOSED, now)
+                self._current_open_seconds = self.open_seconds
+                self._bucket_epoch = [-1] * self.buckets
+    
+    def record_failure(self, now: float = None):
+        """ثبت درخواست ناموفق"""
+        now = now if now is not None else time.time()
+        self._failures[self._bucket(now)] += 1
+        
+        if self.state == BreakerState.HALF_OPEN:
+            self.release()
+            self._current_open_seconds = min(self._current_open_seconds * 2, self.max_open_seconds)
+            self._trip(now)
+        elif self.state == BreakerState.CLOSED:
+            successes, failures = self._window_counts(now)
+            total = successes + failures
+            if total >= self.min_requests and failures / total >= self.failure_threshold:
+                self._trip(now)
+    
+    def _trip(self, now: float):
+        """باز کردن مدار"""
+        self._open_until = now + self._current_open_seconds
+        self.opened_count += 1
+        self._set_state(BreakerState.OPEN, now)
+    
+    def error_rate(self, now: float = None) -> float:
+        """نرخ خطا در پنجره زمانی (0 تا 1)"""
+        successes, failures = self._window_counts(now if now is not None else time.time())
+        total = successes + failures
+        return failures / total if total else 0.0
+    
+    def get_stats(self, now: float = None) -> Dict[str, Any]:
+        """وضعیت و آمار قطع‌کننده"""
+        now = now if now is not None else time.time()
+        successes, failures = self._window_counts(now)
+        total = successes + failures
+        return {
+            "state": self.state.value,
+            "window_requests": total,
+            "window_error_rate": round(failures / total * 100, 2) if total else 0,
+            "open_for": round(max(self._open_until - now, 0.0), 1) if self.state == BreakerState.OPEN else 0,
+            "probes_in_flight": len(self._probes_started),
+            "opened_count": self.opened_count,
+            "rejected_count": self.rejected_count
+        }
@@ -0,0 +1,160 @@
+# services/concurrency_limiter.py - محدودیت هم‌زمانی تطبیقی برای هر ارائه‌دهنده
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# اولویت درخواست‌ها: تعاملی (کاربر منتظر است) پیش از دسته‌ای
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# اولویت درخواست جاری؛ bulk_process آن را برای زیرکارهای خود تنظیم می‌کند
+request_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority",
+                                                                       default=PRIORITY_INTERACTIVE)
+
+class AdaptiveLimiter:
+    """محدودکننده هم‌زمانی با افزایش جمعی و کاهش ضربی (AIMD) و تشخیص تورم زمان پاسخ
+
+    - پاسخ موفق با زمان عادی: limit به اندازه 1/limit زیاد می‌شود (حدود +1 در هر دور)،
+      فقط وقتی واقعاً از نیمی از ظرفیت استفاده شده باشد.
+    - 429، timeout یا وقتی میانگین کوتاه‌مدت زمان پاسخ از tolerance برابر میانگین
+      بلندمدت بیشتر شود (شیب زمان پاسخ، مثل Vegas/Gradient): limit × backoff_ratio؛
+      حداکثر یک کاهش در هر بازه زمان پاسخ تا یک موج خطا limit را فرو نریزد.
+    """
+    
+    def __init__(self, name: str, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 backoff_ratio: float = 0.7, tolerance: float = 2.0, short_window: int = 10,
+                 long_window: int = 500):
+        self.name = name
+        self.limit = float(max(min(initial_limit, max_limit), min_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self._short_alpha = 2.0 / (short_window + 1)
+        self._long_alpha = 2.0 / (long_window + 1)
+        
+        self.in_flight = 0
+        self._waiters = (deque(), deque())  # به ترتیب اولویت
+        self.short_rtt = 0.0
+        self.long_rtt = 0.0
+        self._last_decrease = 0.0
+        
+        self.increases = 0
+        self.decreases = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters[0]) + len(self._waiters[1])
+    
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+    
+    def _wake_waiters(self):
+        """بیدار کردن منتظرها به ترتیب اولویت تا پر شدن ظرفیت"""
+        for queue in self._waiters:
+            while queue and self._has_capacity():
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(None)
+    
+    async def acquire(self, priority: int = None):
+        """گرفتن یک جایگاه (در صورت پر بودن، انتظار در صف اولویت)"""
+        if priority is None:
+            priority = request_priority.get()
+        if self._has_capacity() and not self.queue_depth:
+            self.in_flight += 1
+            return
+        
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._waiters[PRIORITY_BULK if priority >= PRIORITY_BULK else PRIORITY_INTERACTIVE]
+        queue.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # جایگاه داده شده بود ولی درخواست لغو شد
+                self.in_flight -= 1
+                self._wake_waiters()
+            else:
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+    
+    def release(self, latency: float = None, overloaded: bool = False, now: float = None):
+        """آزاد کردن جایگاه و به‌روزرسانی limit
+
+        latency=None (بدون overloaded) یعنی نتیجه‌ای برای یادگیری وجود ندارد (مثلاً لغو یا خطای معمولی).
+        """
+        now = now if now is not None else time.monotonic()
+        in_flight_before = self.in_flight
+        self.in_flight = max(self.in_flight - 1, 0)
+        
+        if overloaded:
+            self.dropped += 1
+            self._decrease(now, "overload")
+        elif latency is not None:
+            self._on_sample(latency, in_flight_before, now)
+        
+        self._wake_waiters()
+    
+    @asynccontextmanager
+    async def slot(self, priority: int = None):
+        """async with limiter.slot() as outcome: ... ; outcome['latency'|'overloaded'] را پر کنید"""
+        await self.acquire(priority)
+        outcome: Dict[str, Any] = {"latency": None, "overloaded": False}
+        try:
+            yield outcome
+        finally:
+            self.release(outcome["latency"], outcome["overloaded"])
+    
+    def _on_sample(self, latency: float, in_flight: int, now: float):
+        if not self.long_rtt:
+            self.short_rtt = self.long_rtt = latency
+            return
+        self.short_rtt += self._short_alpha * (latency - self.short_rtt)
+        self.long_rtt += self._long_alpha * (latency - self.long_rtt)
+        
+        if self.short_rtt > self.long_rtt * self.tolerance:
+            self._decrease(now, "latency inflation")
+        elif in_flight * 2 >= self.limit and self.limit < self.max_limit:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+            self.increases += 1
+    
+    def _decrease(self, now: float, reason: str):
+        # حداکثر یک کاهش در هر بازه زمان پاسخ
+        if now - self._last_decrease < max(self.short_rtt, 0.1):
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(self.limit * self.backoff_ratio, float(self.min_limit))
+        self.decreases += 1
+        logger.info(f"Concurrency limit for {self.name}: {previous:.1f} -> {self.limit:.1f} ({reason})")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """limit فعلی، درخواست‌های جاری و عمق صف"""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_interactive": len(self._waiters[PRIORITY_INTERACTIVE]),
+            "queue_bulk": len(self._waiters[PRIORITY_BULK]),
+            "max_queue_depth": self.max_queue_depth,
+            "short_rtt": round(self.short_rtt, 3),
+            "long_rtt": round(self.long_rtt, 3),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "overload_signals": self.dropped
+        }
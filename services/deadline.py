@@ -0,0 +1,40 @@
+# services/deadline.py - مهلت کلی هر درخواست از handler تا فراخوانی ارائه‌دهنده
+
+import time
+from typing import Optional
+
+class Deadline:
+    """زمان پایان مطلق یک درخواست کاربر
+
+    handler آن را هنگام دریافت پیام می‌سازد و همان شیء تا فراخوانی ارائه‌دهنده
+    منتقل می‌شود؛ timeout هر تلاش، تأخیر retry و تصمیم جایگزینی ارائه‌دهنده همه
+    از زمان باقی‌مانده محاسبه می‌شوند، نه از مقادیر ثابت.
+    """
+    
+    __slots__ = ("timeout", "expires_at")
+    
+    def __init__(self, timeout: float, now: float = None):
+        now = now if now is not None else time.monotonic()
+        self.timeout = timeout
+        self.expires_at = now + timeout
+    
+    def remaining(self, now: float = None) -> float:
+        """ثانیه باقی‌مانده (حداقل صفر)"""
+        now = now if now is not None else time.monotonic()
+        return max(self.expires_at - now, 0.0)
+    
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+    
+    def cap(self, timeout: Optional[float]) -> float:
+        """timeout محدودشده به زمان باقی‌مانده"""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+    
+    def allows(self, seconds: float) -> bool:
+        """آیا کاری با این مدت پیش از پایان مهلت تمام می‌شود"""
+        return self.remaining() >= seconds
+    
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s of {self.timeout:.1f}s)"
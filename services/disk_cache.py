@@ -0,0 +1,197 @@
+# services/disk_cache.py - کش سطح دوم روی دیسک (SQLite در حالت WAL)
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """کش پایدار پاسخ‌ها: خواندن مستقیم، نوشتن با تأخیر و دسته‌ای در thread جداگانه"""
+    
+    def __init__(self, path: str, max_entries: int = 100000, flush_interval: float = 1.0,
+                 batch_size: int = 500):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        
+        # نوشتن‌ها و به‌روزرسانی زمان دسترسی منتظر flush
+        self._pending: Dict[str, Tuple[str, str, float, float]] = {}
+        self._touched: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        
+        self.hit_count = 0
+        self.miss_count = 0
+        self.written_count = 0
+        self.compacted_count = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._create_schema(self._reader)
+        
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="disk-cache-writer", daemon=True)
+        self._writer_thread.start()
+        logger.info(f"Disk cache initialized: {path} (max_entries={max_entries})")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """اتصال SQLite با تنظیمات WAL"""
+        connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+    
+    @staticmethod
+    def _create_schema(connection: sqlite3.Connection):
+        """ایجاد جدول و ایندکس‌ها"""
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                provider TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses(expires_at);
+            CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+        """)
+        connection.commit()
+    
+    def get(self, key: str, now: float = None) -> Optional[Tuple[str, str, float]]:
+        """دریافت (content, provider, expires_at) یا None در صورت نبود یا انقضا"""
+        now = now if now is not None else time.time()
+        
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            content, provider, _, expires_at = pending
+            row = (content, provider, expires_at) if expires_at > now else None
+        else:
+            with self._reader_lock:
+                row = self._reader.execute(
+                    "SELECT content, provider, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+        
+        if row is None:
+            self.miss_count += 1
+            return None
+        
+        self.hit_count += 1
+        with self._pending_lock:
+            self._touched[key] = now
+        return row
+    
+    def put(self, key: str, content: str, provider: str = "", ttl: float = 3600.0, now: float = None):
+        """ثبت برای نوشتن دسته‌ای (write-behind)"""
+        now = now if now is not None else time.time()
+        with self._pending_lock:
+            self._pending[key] = (content, provider, now, now + ttl)
+            pending_count = len(self._pending)
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+    
+    def flush(self):
+        """درخواست نوشتن فوری"""
+        self._wakeup.set()
+    
+    def close(self):
+        """نوشتن باقی‌مانده‌ها و توقف thread نویسنده"""
+        self._stopping = True
+        self._wakeup.set()
+        self._writer_thread.join(timeout=10.0)
+        with self._reader_lock:
+            self._reader.close()
+        logger.info("Disk cache closed")
+    
+    def _writer_loop(self):
+        """حلقه نویسنده: flush دوره‌ای و فشرده‌سازی"""
+        connection = self._connect()
+        last_compaction = time.time()
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                
+                try:
+                    self._write_batch(connection)
+                    if self._stopping or time.time() - last_compaction > 60:
+                        self._compact(connection)
+                        last_compaction = time.time()
+                except sqlite3.Error as e:
+                    logger.error(f"Disk cache write failed: {e}")
+                
+                if self._stopping:
+                    break
+        finally:
+            connection.close()
+    
+    def _write_batch(self, connection: sqlite3.Connection):
+        """نوشتن دسته‌ای ورودی‌ها در یک تراکنش"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+        
+        if not pending and not touched:
+            return
+        
+        with connection:
+            if pending:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO responses (key, content, provider, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(key, content, provider, created_at, expires_at, created_at)
+                     for key, (content, provider, created_at, expires_at) in pending.items()]
+                )
+            if touched:
+                connection.executemany(
+                    "UPDATE responses SET last_access = ? WHERE key = ?",
+                    [(accessed_at, key) for key, accessed_at in touched.items()]
+                )
+        self.written_count += len(pending)
+        logger.debug(f"Disk cache flushed {len(pending)} entries, {len(touched)} access updates")
+    
+    def _compact(self, connection: sqlite3.Connection):
+        """حذف ورودی‌های منقضی و محدود کردن اندازه (حذف کم‌استفاده‌ترین‌ها)"""
+        with connection:
+            removed = connection.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            
+            (count,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                # تا 90% ظرفیت کاهش می‌یابد تا فشرده‌سازی مکرر لازم نشود
+                overflow = count - int(self.max_entries * 0.9)
+                removed += connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+        
+        if removed:
+            self.compacted_count += removed
+            logger.info(f"Disk cache compaction removed {removed} entries")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار کش دیسک"""
+        with self._pending_lock:
+            pending_count = len(self._pending)
+        return {
+            "path": self.path,
+            "max_entries": self.max_entries,
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "written": self.written_count,
+            "pending_writes": pending_count,
+            "compacted": self.compacted_count
+        }
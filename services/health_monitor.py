@@ -0,0 +1,212 @@
+# services/health_monitor.py - سلامت ارائه‌دهندگان از روی ترافیک واقعی (بدون مصرف توکن)
+
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class HealthState(Enum):
+    """وضعیت سلامت یک ارائه‌دهنده"""
+    HEALTHY = "healthy"
+    DEGRADED = "degraded"      # نرخ خطا یا زمان پاسخ بالا، اما قابل استفاده
+    UNHEALTHY = "unhealthy"
+    UNKNOWN = "unknown"        # هنوز نه ترافیکی بوده نه probe
+
+class ProviderHealth:
+    """نتیجه تلاش‌های اخیر یک ارائه‌دهنده
+
+    هر تلاش واقعی (و هر probe) یک رویداد (زمان، موفق) در پنجره زمانی است؛ تعداد
+    رویدادها به max_events محدود است تا حافظه و هزینه ارزیابی ثابت بماند. زمان
+    پاسخ فقط از ترافیک واقعی (EWMA) محاسبه می‌شود، نه از probe.
+    """
+    
+    def __init__(self, name: str, max_events: int = 256, latency_alpha: float = 0.2):
+        self.name = name
+        self.latency_alpha = latency_alpha
+        self.events: deque = deque(maxlen=max_events)
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.last_activity: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.source = None  # "traffic" یا "probe"
+        
+        self.probe_task: Optional[asyncio.Task] = None
+        self.last_probe: Optional[float] = None
+        self.probe_latency: Optional[float] = None
+        self.probes = 0
+        self.probe_failures = 0
+    
+    def record(self, success: bool, now: float, latency: Optional[float] = None,
+               error: Optional[str] = None, source: str = "traffic"):
+        """ثبت نتیجه یک تلاش"""
+        self.events.append((now, success))
+        self.last_activity = now
+        self.source = source
+        if success:
+            self.consecutive_failures = 0
+            self.last_success = now
+            if latency is not None and source == "traffic":
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                else:
+                    self.latency_ewma += self.latency_alpha * (latency - self.latency_ewma)
+        else:
+            self.consecutive_failures += 1
+            self.last_failure = now
+            if error:
+                self.last_error = error
+    
+    def window_counts(self, now: float, window: float):
+        """(موفق، ناموفق) در پنجره زمانی"""
+        successes = failures = 0
+        for timestamp, success in reversed(self.events):
+            if timestamp < now - window:
+                break
+            if success:
+                successes += 1
+            else:
+                failures += 1
+        return successes, failures
+
+class HealthMonitor:
+    """مدل سلامت غیرفعال ارائه‌دهندگان
+
+    وضعیت فقط از نتیجه و زمان پاسخ درخواست‌های واقعی ساخته می‌شود، پس بررسی
+    سلامت هزینه‌ای ندارد و می‌توان آن را هر چند ثانیه فراخواند. برای ارائه‌دهنده‌ای
+    که idle_seconds ترافیکی نداشته، یک probe سبک (مثلاً مشخصات مدل) در پس‌زمینه
+    اجرا می‌شود؛ نتیجه آن در ارزیابی بعدی دیده می‌شود. ارزیابی برای cache_ttl ثانیه
+    cache می‌شود.
+    """
+    
+    def __init__(self, window_seconds: float = 120.0, min_samples: int = 5,
+                 degraded_error_rate: float = 0.1, unhealthy_error_rate: float = 0.5,
+                 unhealthy_consecutive: int = 3, slow_latency: float = 20.0,
+                 cache_ttl: float = 2.0, idle_seconds: float = 60.0, probe_timeout: float = 5.0):
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.degraded_error_rate = degraded_error_rate
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.unhealthy_consecutive = unhealthy_consecutive
+        self.slow_latency = slow_latency
+        self.cache_ttl = cache_ttl
+        self.idle_seconds = idle_seconds
+        self.probe_timeout = probe_timeout
+        
+        self.providers: Dict[str, ProviderHealth] = {}
+        self._cached: Dict[str, Dict[str, Any]] = {}
+        self._cached_at: Dict[str, float] = {}
+    
+    def _health(self, name: str) -> ProviderHealth:
+        health = self.providers.get(name)
+        if health is None:
+            health = self.providers[name] = ProviderHealth(name)
+        return health
+    
+    def record(self, name: str, success: bool, latency: Optional[float] = None, error: Optional[str] = None):
+        """ثبت نتیجه یک درخواست واقعی"""
+        self._health(name).record(success, time.monotonic(), latency, error)
+    
+    def record_error(self, name: str, error: str):
+        """ثبت متن آخرین خطا (نتیجه تلاش جداگانه ثبت شده است)"""
+        self._health(name).last_error = error
+    
+    def evaluate(self, name: str) -> Dict[str, Any]:
+        """وضعیت فعلی ارائه‌دهنده (cache شده برای cache_ttl ثانیه)"""
+        now = time.monotonic()
+        cached_at = self._cached_at.get(name)
+        if cached_at is not None and now - cached_at < self.cache_ttl:
+            return self._cached[name]
+        
+        health = self._health(name)
+        successes, failures = health.window_counts(now, self.window_seconds)
+        total = successes + failures
+        error_rate = failures / total if total else 0.0
+        
+        if health.last_activity is None:
+            state = HealthState.UNKNOWN
+        elif health.consecutive_failures >= self.unhealthy_consecutive:
+            state = HealthState.UNHEALTHY
+        elif total >= self.min_samples and error_rate >= self.unhealthy_error_rate:
+            state = HealthState.UNHEALTHY
+        elif total >= self.min_samples and error_rate >= self.degraded_error_rate:
+            state = HealthState.DEGRADED
+        elif self.slow_latency and health.latency_ewma is not None and health.latency_ewma > self.slow_latency:
+            state = HealthState.DEGRADED
+        elif health.last_success is None:
+            # فقط خطا، هرچند کمتر از آستانه‌ها
+            state = HealthState.UNHEALTHY
+        else:
+            state = HealthState.HEALTHY
+        
+        def age(timestamp: Optional[float]) -> Optional[float]:
+            return round(now - timestamp, 1) if timestamp is not None else None
+        
+        result = {
+            "status": state.value,
+            "response_time": round(health.latency_ewma, 3) if health.latency_ewma is not None else None,
+            "error": health.last_error if state != HealthState.HEALTHY else None,
+            "window_requests": total,
+            "window_error_rate": round(error_rate * 100, 2),
+            "consecutive_failures": health.consecutive_failures,
+            "source": health.source,
+            "last_activity_age": age(health.last_activity),
+            "last_success_age": age(health.last_success),
+            "last_probe_age": age(health.last_probe),
+            "probe_latency": round(health.probe_latency, 3) if health.probe_latency is not None else None,
+            "probes": health.probes,
+            "probe_failures": health.probe_failures
+        }
+        self._cached[name] = result
+        self._cached_at[name] = now
+        return result
+    
+    def needs_probe(self, name: str) -> bool:
+        """بدون ترافیک اخیر و بدون probe اخیر یا در حال اجرا"""
+        health = self._health(name)
+        if health.probe_task is not None and not health.probe_task.done():
+            return False
+        now = time.monotonic()
+        idle = health.last_activity is None or now - health.last_activity >= self.idle_seconds
+        return idle and (health.last_probe is None or now - health.last_probe >= self.idle_seconds)
+    
+    def schedule_probe(self, name: str, probe: Callable[[float], Awaitable[Any]]) -> bool:
+        """اجرای probe در پس‌زمینه در صورت نیاز (بدون انتظار برای نتیجه)"""
+        if not self.needs_probe(name):
+            return False
+        health = self._health(name)
+        health.last_probe = time.monotonic()
+        health.probe_task = asyncio.create_task(self._run_probe(health, probe))
+        return True
+    
+    async def _run_probe(self, health: ProviderHealth, probe: Callable[[float], Awaitable[Any]]):
+        health.probes += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(probe(self.probe_timeout), timeout=self.probe_timeout)
+        except NotImplementedError:
+            # ارائه‌دهنده probe ندارد؛ وضعیت فقط از ترافیک واقعی می‌آید
+            health.probes -= 1
+            return
+        except Exception as e:
+            health.probe_failures += 1
+            health.record(False, time.monotonic(), error=f"probe: {e}", source="probe")
+            logger.warning(f"Health probe failed for {health.name}: {e}")
+        else:
+            health.probe_latency = time.monotonic() - start
+            health.record(True, time.monotonic(), source="probe")
+        # نتیجه probe در ارزیابی بعدی دیده شود
+        self._cached_at.pop(health.name, None)
+    
+    async def aclose(self):
+        """لغو probe های در حال اجرا"""
+        tasks = [health.probe_task for health in self.providers.values()
+                 if health.probe_task is not None and not health.probe_task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,129 @@
+# services/micro_batcher.py - بسته‌بندی درخواست‌های کوچک در یک درخواست ارائه‌دهنده
+
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (کلید، ورودی) هر آیتم -> {کلید: نتیجه} برای آیتم‌هایی که پاسخ معتبر داشتند
+BatchRunner = Callable[[List[Tuple[str, str]]], Awaitable[Dict[str, str]]]
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+def parse_batch_response(text: str) -> Dict[str, str]:
+    """استخراج {شناسه: خروجی} از آرایه JSON پاسخ
+
+    پاسخ بریده‌شده (رسیدن به max_tokens) هم پذیرفته می‌شود: اشیای کامل تا محل
+    بریدگی خوانده می‌شوند و بقیه آیتم‌ها جداگانه فرستاده خواهند شد.
+    """
+    text = _CODE_FENCE_RE.sub("", text.strip())
+    start = text.find("[")
+    if start < 0:
+        return {}
+    
+    decoder = json.JSONDecoder()
+    results = {}
+    position = start + 1
+    while position < len(text):
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text) or text[position] == "]":
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+        if not isinstance(item, dict) or "id" not in item:
+            continue
+        output = item.get("output")
+        if isinstance(output, (dict, list)):
+            output = json.dumps(output, ensure_ascii=False)
+        if isinstance(output, str) and output.strip():
+            results[str(item["id"])] = output.strip()
+    return results
+
+class MicroBatcher:
+    """جمع‌آوری درخواست‌ها تا max_items آیتم یا window ثانیه و اجرای یکجای آن‌ها
+
+    submit برای آیتمی که در بسته پاسخ معتبر نگرفت (یا تنها آیتم بسته بود) None
+    برمی‌گرداند تا فراخواننده آن را جداگانه بفرستد. آیتم‌های با کلید یکسان در
+    یک بسته فقط یک بار فرستاده می‌شوند.
+    """
+    
+    def __init__(self, name: str, run_batch: BatchRunner, max_items: int = 8, window: float = 0.01):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_items = max_items
+        self.window = window
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._running: set = set()
+        
+        self.batches = 0
+        self.batched_items = 0
+        self.singles = 0
+        self.unparsed = 0
+    
+    async def submit(self, key: str, payload: str) -> Optional[str]:
+        """افزودن آیتم به بسته جاری و انتظار برای نتیجه آن"""
+        entry = self._pending.get(key)
+        if entry is not None:
+            future = entry[1]
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = (payload, future)
+            if len(self._pending) >= self.max_items:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        # shield: لغو یک درخواست‌کننده نتیجه مشترک را لغو نمی‌کند
+        return await asyncio.shield(future)
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        items, self._pending = self._pending, {}
+        if not items:
+            return
+        if len(items) == 1:
+            # بسته تک‌آیتمی سودی ندارد؛ فراخواننده درخواست عادی می‌فرستد
+            self.singles += 1
+            for _, future in items.values():
+                if not future.done():
+                    future.set_result(None)
+            return
+        task = asyncio.create_task(self._run(items))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+    
+    async def _run(self, items: Dict[str, Tuple[str, asyncio.Future]]):
+        self.batches += 1
+        self.batched_items += len(items)
+        try:
+            results = await self.run_batch([(key, payload) for key, (payload, _) in items.items()])
+        except Exception as e:
+            logger.warning(f"Micro-batch {self.name} failed: {e}")
+            results = {}
+        
+        for key, (_, future) in items.items():
+            result = results.get(key)
+            if result is None:
+                self.unparsed += 1
+            if not future.done():
+                future.set_result(result)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار بسته‌ها"""
+        return {
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "avg_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0,
+            "singles": self.singles,
+            "unparsed_items": self.unparsed,
+            "pending": len(self._pending)
+        }
@@ -0,0 +1,149 @@
+# services/provider_selection.py - انتخاب ارائه‌دهنده بر اساس EWMA زمان پاسخ، نرخ خطا و بار جاری
+
+import logging
+import math
+import random
+import time
+from enum import Enum
+from typing import Any, Dict, Hashable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class SelectionPolicy(Enum):
+    """سیاست‌های انتخاب ارائه‌دهنده"""
+    P2C = "p2c"                        # power of two choices روی هزینه
+    WEIGHTED = "weighted"              # انتخاب تصادفی با وزن معکوس هزینه
+    LEAST_COST = "least_cost"          # همیشه کم‌هزینه‌ترین
+
+class EndpointScore:
+    """آمار یک ارائه‌دهنده/مدل: EWMA زمان پاسخ (peak-sensitive)، EWMA خطا و درخواست‌های جاری
+
+    میانگین‌ها با زمان (نه تعداد درخواست) میرا می‌شوند، پس تغییر رفتار ارائه‌دهنده
+    در چند ثانیه دیده می‌شود. نمونه بزرگ‌تر از میانگین فوراً جایگزین می‌شود تا کندی
+    ناگهانی بلافاصله اثر بگذارد.
+    """
+    
+    __slots__ = ("latency", "error_rate", "in_flight", "last_update", "selected", "completed", "failed")
+    
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.last_update = 0.0
+        self.selected = 0
+        self.completed = 0
+        self.failed = 0
+
+class ProviderSelector:
+    """انتخاب بین ارائه‌دهندگان به نسبت ظرفیت اندازه‌گیری‌شده
+
+    هزینه هر گزینه = EWMA زمان پاسخ × (درخواست‌های جاری + 1) / (1 - EWMA خطا).
+    اطلاعات گزینه‌ای که مدتی ترافیک نگرفته به سمت مقدار اولیه برمی‌گردد تا
+    ارائه‌دهنده بهبودیافته دوباره امتحان شود.
+    """
+    
+    def __init__(self, policy: str = "p2c", decay_seconds: float = 10.0, initial_latency: float = 1.0,
+                 idle_reset_seconds: float = 60.0, rng: random.Random = None):
+        try:
+            self.policy = SelectionPolicy(policy)
+        except ValueError:
+            logger.warning(f"Unknown selection policy '{policy}', falling back to p2c")
+            self.policy = SelectionPolicy.P2C
+        self.decay_seconds = decay_seconds
+        self.initial_latency = initial_latency
+        self.idle_reset_seconds = idle_reset_seconds
+        self.rng = rng or random.Random()
+        self._scores: Dict[Hashable, EndpointScore] = {}
+    
+    def _score(self, key: Hashable) -> EndpointScore:
+        score = self._scores.get(key)
+        if score is None:
+            score = self._scores[key] = EndpointScore()
+        return score
+    
+    def cost(self, key: Hashable, now: float = None) -> float:
+        """هزینه تخمینی ارسال درخواست بعدی به این گزینه"""
+        now = now if now is not None else time.monotonic()
+        score = self._score(key)
+        latency = score.latency if score.latency is not None else self.initial_latency
+        error_rate = score.error_rate
+        
+        # بازگشت تدریجی به مقدار اولیه در صورت نبود نمونه جدید
+        idle = now - score.last_update
+        if score.latency is not None and idle > 0:
+            weight = math.exp(-idle / self.idle_reset_seconds)
+            latency = latency * weight + self.initial_latency * (1 - weight)
+            error_rate *= weight
+        
+        return latency * (score.in_flight + 1) / max(1.0 - error_rate, 0.01)
+    
+    def expected_latency(self, key: Hashable) -> float:
+        """زمان پاسخ مورد انتظار یک درخواست (بدون در نظر گرفتن بار جاری)"""
+        score = self._scores.get(key)
+        return score.latency if score is not None and score.latency is not None else self.initial_latency
+    
+    def choose(self, candidates: Sequence[Hashable], now: float = None) -> Hashable:
+        """انتخاب یک گزینه طبق سیاست"""
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        elif self.policy == SelectionPolicy.P2C:
+            first, second = self.rng.sample(list(candidates), 2)
+            chosen = first if self.cost(first, now) <= self.cost(second, now) else second
+        elif self.policy == SelectionPolicy.WEIGHTED:
+            weights = [1.0 / max(self.cost(candidate, now), 1e-6) for candidate in candidates]
+            chosen = self.rng.choices(list(candidates), weights=weights, k=1)[0]
+        else:
+            chosen = min(candidates, key=lambda candidate: self.cost(candidate, now))
+        
+        self._score(chosen).selected += 1
+        return chosen
+    
+    def request_started(self, key: Hashable):
+        """ثبت شروع درخواست"""
+        self._score(key).in_flight += 1
+    
+    def request_finished(self, key: Hashable, latency: float, success: Optional[bool], now: float = None):
+        """ثبت پایان درخواست
+
+        success=None یعنی درخواست لغو شد: فقط اگر از میانگین کندتر بوده به عنوان
+        حد پایین زمان پاسخ ثبت می‌شود و در نرخ خطا اثری ندارد.
+        """
+        now = now if now is not None else time.monotonic()
+        score = self._score(key)
+        score.in_flight = max(score.in_flight - 1, 0)
+        
+        weight = math.exp(-(now - score.last_update) / self.decay_seconds) if score.last_update else 0.0
+        score.last_update = now
+        
+        if success is None:
+            if score.latency is not None and latency > score.latency:
+                score.latency = latency
+            return
+        
+        score.completed += 1
+        score.error_rate = score.error_rate * weight + (0.0 if success else 1.0) * (1 - weight)
+        if not success:
+            score.failed += 1
+            return
+        
+        if score.latency is None or latency > score.latency:
+            score.latency = latency
+        else:
+            score.latency = score.latency * weight + latency * (1 - weight)
+    
+    def get_stats(self, now: float = None) -> Dict[str, Any]:
+        """آمار هر گزینه"""
+        total_selected = sum(score.selected for score in self._scores.values()) or 1
+        return {
+            str(key): {
+                "ewma_latency": round(score.latency, 3) if score.latency is not None else None,
+                "ewma_error_rate": round(score.error_rate * 100, 2),
+                "in_flight": score.in_flight,
+                "cost": round(self.cost(key, now), 3),
+                "selected": score.selected,
+                "traffic_share": round(score.selected / total_selected * 100, 2),
+                "completed": score.completed,
+                "failed": score.failed
+            }
+            for key, score in self._scores.items()
+        }
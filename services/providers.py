@@ -0,0 +1,556 @@
+# services/providers.py - ارائه‌دهندگان AI پشت یک رابط async مشترک
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+from openai import AsyncOpenAI
+import google.generativeai as genai
+
+from core.config import config, parse_mapping
+from data.prompts import AI_MODEL_SETTINGS
+from utils.text_chunker import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_MESSAGE = "تو یک دستیار هوشمند و حرفه‌ای هستی که به زبان فارسی پاسخ می‌دهی."
+
+def system_message(system: Optional[str] = None) -> str:
+    """متن نقش system: دستورالعمل ثابت ربات (پاسخ فارسی) و در صورت وجود، قالب عملیات پس از آن"""
+    return f"{SYSTEM_MESSAGE}\n\n{system}" if system else SYSTEM_MESSAGE
+
+def record_usage(usage: Optional[Dict[str, Any]], prompt_tokens: Optional[int],
+                 completion_tokens: Optional[int], total_tokens: Optional[int], headers=None,
+                 cached_tokens: Optional[int] = None):
+    """ثبت مصرف توکن و هدرهای rate-limit پاسخ در usage (در صورت درخواست)
+
+    cached_tokens: بخشی از prompt_tokens که از کش پیشوند ارائه‌دهنده خوانده شد
+    """
+    if usage is None:
+        return
+    usage["prompt_tokens"] = prompt_tokens
+    usage["completion_tokens"] = completion_tokens
+    usage["total_tokens"] = total_tokens
+    usage["cached_tokens"] = cached_tokens or 0
+    if headers is not None:
+        usage["headers"] = headers
+
+def create_http_pool() -> httpx.AsyncClient:
+    """ایجاد connection pool مشترک با keep-alive"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.AI_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=config.AI_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=config.AI_POOL_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            config.AI_REQUEST_TIMEOUT,
+            connect=config.AI_CONNECT_TIMEOUT
+        )
+    )
+
+class BaseProvider(ABC):
+    """رابط مشترک ارائه‌دهندگان AI
+
+    هر ارائه‌دهنده یک نام یکتا (کلید آمار، سهمیه، قیمت و کش) و یک نوع (کلاس ثبت‌شده)
+    دارد؛ چند ارائه‌دهنده می‌توانند از یک نوع باشند، مثلاً OpenAI و یک مدل محلی
+    سازگار با API آن. usage در صورت وجود با مصرف توکن و هدرهای پاسخ پر می‌شود.
+    system دستورالعمل ثابت عملیات (نقش system) است و prompt فقط داده همان درخواست؛
+    system بدون تغییر در ابتدای درخواست فرستاده می‌شود تا در کش پیشوند ارائه‌دهنده بنشیند.
+    """
+    
+    kind = ""
+    max_concurrency: Optional[int] = None  # سقف هم‌زمانی خود کلاینت (در صورت وجود)
+    
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        self.name = name
+        self.settings = settings
+        self.model = settings.get("model", name)
+    
+    @property
+    def max_output_tokens(self) -> int:
+        """حداکثر توکن خروجی مدل"""
+        return self.settings.get("max_tokens", self.settings.get("max_output_tokens", 0))
+    
+    @property
+    def context_tokens(self) -> int:
+        """پنجره context مدل (ورودی و خروجی)"""
+        return config.MODEL_CONTEXT_TOKENS.get(self.model, config.DEFAULT_CONTEXT_TOKENS)
+    
+    def is_configured(self) -> bool:
+        """کلید/آدرس لازم تنظیم شده است"""
+        return True
+    
+    @abstractmethod
+    async def generate(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, system: Optional[str] = None) -> str:
+        """تولید کامل پاسخ"""
+    
+    @abstractmethod
+    def stream(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None, system: Optional[str] = None) -> AsyncIterator[str]:
+        """تولید پاسخ به صورت stream (تکه‌های متن به محض دریافت)"""
+    
+    @abstractmethod
+    async def probe(self, timeout: Optional[float] = None):
+        """بررسی سبک در دسترس بودن (بدون مصرف توکن)؛ در صورت خطا exception می‌دهد"""
+    
+    async def aclose(self):
+        """بستن اتصال‌های باز"""
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار ارائه‌دهنده"""
+        return {
+            "kind": self.kind,
+            "model": self.model,
+            "configured": self.is_configured()
+        }
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(name={self.name!r}, model={self.model!r})"
+
+# نوع -> کلاس ارائه‌دهنده
+PROVIDER_TYPES: Dict[str, Type[BaseProvider]] = {}
+
+def register_provider(kind: str) -> Callable[[Type[BaseProvider]], Type[BaseProvider]]:
+    """decorator ثبت کلاس ارائه‌دهنده با نام نوع آن"""
+    def decorator(provider_class: Type[BaseProvider]) -> Type[BaseProvider]:
+        provider_class.kind = kind
+        PROVIDER_TYPES[kind] = provider_class
+        return provider_class
+    return decorator
+
+def model_settings(name: str, kind: str) -> Dict[str, Any]:
+    """تنظیمات مدل: AI_MODEL_SETTINGS با نام (یا نوع) ارائه‌دهنده و <NAME>_MODEL"""
+    settings = dict(AI_MODEL_SETTINGS.get(name) or AI_MODEL_SETTINGS.get(kind, {}))
+    model = config.provider_setting(name, "MODEL")
+    if model:
+        settings["model"] = model
+    return settings
+
+def create_providers(specs: List[str]) -> List[BaseProvider]:
+    """ساخت ارائه‌دهندگان از AI_PROVIDERS؛ هر مورد "نام" یا "نام:نوع" است"""
+    providers = []
+    for spec in specs:
+        name, _, kind = spec.partition(":")
+        name = name.strip()
+        kind = kind.strip() or name
+        provider_class = PROVIDER_TYPES.get(kind)
+        if provider_class is None:
+            raise ValueError(f"Unknown AI provider type '{kind}' (known: {', '.join(PROVIDER_TYPES)})")
+        if any(provider.name == name for provider in providers):
+            raise ValueError(f"Duplicate AI provider name '{name}'")
+        providers.append(provider_class(name, model_settings(name, kind)))
+    return providers
+
+@register_provider("openai")
+class OpenAIProvider(BaseProvider):
+    """OpenAI یا هر سرور سازگار با API آن (vLLM، Ollama و ...) از طریق <NAME>_BASE_URL"""
+    
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        super().__init__(name, settings)
+        self.client = None
+        api_key = config.provider_setting(name, "API_KEY")
+        if api_key:
+            base_url = config.provider_setting(name, "BASE_URL") or None
+            self.client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=create_http_pool(),
+                timeout=config.AI_REQUEST_TIMEOUT,
+                max_retries=0  # retry توسط خود سرویس انجام می‌شود
+            )
+            logger.info(f"OpenAI async client initialized for {name} "
+                       f"(pool={config.AI_POOL_MAX_CONNECTIONS}, "
+                       f"keepalive={config.AI_POOL_MAX_KEEPALIVE}, base_url={base_url or 'default'})")
+    
+    def is_configured(self) -> bool:
+        return self.client is not None
+    
+    @staticmethod
+    def _messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": system_message(system)
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    @staticmethod
+    def _cached_tokens(response_usage) -> Optional[int]:
+        """توکن‌های prompt خوانده‌شده از کش پیشوند (prompt_tokens_details.cached_tokens)"""
+        details = getattr(response_usage, "prompt_tokens_details", None)
+        return getattr(details, "cached_tokens", None)
+    
+    async def generate(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, system: Optional[str] = None) -> str:
+        """فراخوانی OpenAI"""
+        if not self.client:
+            raise RuntimeError(f"OpenAI client not initialized for {self.name}")
+        
+        try:
+            # with_raw_response: هدرهای x-ratelimit برای کنترل سهمیه
+            raw_response = await self.client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=self._messages(prompt, system),
+                max_tokens=self.settings["max_tokens"],
+                temperature=self.settings["temperature"],
+                timeout=timeout or config.AI_REQUEST_TIMEOUT
+            )
+            response = await raw_response.parse()
+            if response.usage:
+                record_usage(usage, response.usage.prompt_tokens, response.usage.completion_tokens,
+                             response.usage.total_tokens, raw_response.headers,
+                             self._cached_tokens(response.usage))
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"OpenAI API error ({self.name}): {e}")
+            raise
+    
+    async def stream(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None, system: Optional[str] = None) -> AsyncIterator[str]:
+        """فراخوانی OpenAI به صورت stream"""
+        if not self.client:
+            raise RuntimeError(f"OpenAI client not initialized for {self.name}")
+        
+        raw_response = await self.client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=self._messages(prompt, system),
+            max_tokens=self.settings["max_tokens"],
+            temperature=self.settings["temperature"],
+            stream=True,
+            stream_options={"include_usage": True},  # مصرف توکن در آخرین تکه
+            timeout=timeout or config.AI_REQUEST_TIMEOUT
+        )
+        stream = await raw_response.parse()
+        async for chunk in stream:
+            if chunk.usage:
+                record_usage(usage, chunk.usage.prompt_tokens, chunk.usage.completion_tokens,
+                             chunk.usage.total_tokens, raw_response.headers, self._cached_tokens(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    async def probe(self, timeout: Optional[float] = None):
+        """دریافت مشخصات مدل از /models (رایگان و بدون توکن)"""
+        if not self.client:
+            raise RuntimeError(f"OpenAI client not initialized for {self.name}")
+        await self.client.models.retrieve(self.model, timeout=timeout or config.HEALTH_PROBE_TIMEOUT)
+    
+    async def aclose(self):
+        if self.client:
+            await self.client.close()
+
+class GeminiModelRegistry:
+    """رجیستری مدل‌های Gemini - یک نمونه مشترک برای هر ترکیب مدل، تنظیمات و system_instruction
+
+    system_instruction در Gemini بخشی از خود مدل است، پس برای هر قالب (get_system_prompt)
+    یک نمونه ساخته و نگه داشته می‌شود؛ تعداد قالب‌ها ثابت و کوچک است.
+    """
+    
+    def __init__(self, default_settings: Dict[str, Any] = None):
+        self._models: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self._default_settings = default_settings or AI_MODEL_SETTINGS["gemini"]
+        self._default_models: Dict[Optional[str], Any] = {}
+        self.created_count = 0
+        self.reused_count = 0
+    
+    @staticmethod
+    def _make_key(model_name: str, generation_settings: Dict[str, Any],
+                  system_instruction: Optional[str] = None) -> Tuple:
+        """کلید رجیستری بر اساس نام مدل، تنظیمات تولید و system_instruction"""
+        return (model_name, tuple(sorted(generation_settings.items())), system_instruction)
+    
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None, **generation_settings) -> Any:
+        """دریافت (یا ساخت یک‌باره) مدل با تنظیمات مشخص"""
+        key = self._make_key(model_name, generation_settings, system_instruction)
+        model = self._models.get(key)
+        if model is not None:
+            self.reused_count += 1
+            return model
+        
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(
+                    model_name,
+                    generation_config=genai.types.GenerationConfig(**generation_settings),
+                    system_instruction=system_instruction
+                )
+                self._models[key] = model
+                self.created_count += 1
+                logger.info(f"Gemini model registered: {model_name} {dict(key[1])}")
+            else:
+                self.reused_count += 1
+        return model
+    
+    def get_default_model(self, system_instruction: Optional[str] = None) -> Any:
+        """مدل پیش‌فرض بر اساس AI_MODEL_SETTINGS (با system_instruction درخواست)"""
+        model = self._default_models.get(system_instruction)
+        if model is not None:
+            self.reused_count += 1
+            return model
+        
+        settings = dict(self._default_settings)
+        model_name = settings.pop("model")
+        model = self._default_models[system_instruction] = self.get_model(model_name, system_instruction, **settings)
+        return model
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار رجیستری"""
+        return {
+            "models": len(self._models),
+            "created": self.created_count,
+            "reused": self.reused_count
+        }
+
+@register_provider("gemini")
+class GeminiProvider(BaseProvider):
+    """Google Gemini؛ کلید API در کتابخانه سراسری است، پس فقط یک کلید Gemini پشتیبانی می‌شود"""
+    
+    # Gemini از یک کانال gRPC مشترک استفاده می‌کند و سقف آن GEMINI_MAX_CONCURRENCY است
+    max_concurrency = config.GEMINI_MAX_CONCURRENCY
+    
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        super().__init__(name, settings)
+        self.api_key = config.provider_setting(name, "API_KEY")
+        self.models = GeminiModelRegistry(settings)
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+            logger.info(f"Gemini async client initialized for {name} "
+                       f"(max_concurrency={config.GEMINI_MAX_CONCURRENCY})")
+    
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+    
+    @staticmethod
+    def _record_metadata(usage: Optional[Dict[str, Any]], metadata):
+        record_usage(usage, metadata.prompt_token_count, metadata.candidates_token_count,
+                     metadata.total_token_count, cached_tokens=getattr(metadata, "cached_content_token_count", None))
+    
+    async def generate(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, system: Optional[str] = None) -> str:
+        """فراخوانی Gemini (system به صورت system_instruction مدل)"""
+        try:
+            model = self.models.get_default_model(system_message(system))
+            
+            response = await model.generate_content_async(
+                prompt,
+                request_options={"timeout": timeout or config.AI_REQUEST_TIMEOUT}
+            )
+            
+            metadata = getattr(response, "usage_metadata", None)
+            if metadata:
+                self._record_metadata(usage, metadata)
+            
+            if response.text:
+                return response.text.strip()
+            else:
+                raise RuntimeError("Empty response from Gemini")
+        
+        except Exception as e:
+            logger.error(f"Gemini API error ({self.name}): {e}")
+            raise
+    
+    async def stream(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None, system: Optional[str] = None) -> AsyncIterator[str]:
+        """فراخوانی Gemini به صورت stream"""
+        model = self.models.get_default_model(system_message(system))
+        response = await model.generate_content_async(
+            prompt,
+            stream=True,
+            request_options={"timeout": timeout or config.AI_REQUEST_TIMEOUT}
+        )
+        async for chunk in response:
+            metadata = getattr(chunk, "usage_metadata", None)
+            if metadata and metadata.total_token_count:
+                self._record_metadata(usage, metadata)
+            if chunk.text:
+                yield chunk.text
+    
+    async def probe(self, timeout: Optional[float] = None):
+        """دریافت مشخصات مدل (models.get، بدون توکن)؛ کتابخانه نسخه async ندارد"""
+        timeout = timeout or config.HEALTH_PROBE_TIMEOUT
+        model_name = self.model if self.model.startswith("models/") else f"models/{self.model}"
+        await asyncio.wait_for(
+            asyncio.to_thread(genai.get_model, model_name, request_options={"timeout": timeout}),
+            timeout=timeout
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "models": self.models.get_stats()}
+
+class MockProviderError(RuntimeError):
+    """خطای شبیه‌سازی‌شده با status_code، مثل خطای HTTP ارائه‌دهنده واقعی"""
+    
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+# نوع خطای تزریقی -> کد وضعیت (timeout جداگانه شبیه‌سازی می‌شود)
+_MOCK_ERROR_STATUS = {"rate_limit": 429, "server_error": 500, "bad_request": 400}
+
+# کش پیشوند شبیه‌سازی‌شده، مثل OpenAI: فقط پیشوند حداقل 1024 توکنی، در گام‌های 128 توکن
+_MOCK_CHARS_PER_TOKEN = 1.5
+_MOCK_PREFIX_MIN_TOKENS = 1024
+_MOCK_PREFIX_BLOCK_TOKENS = 128
+_MOCK_PREFIX_ENTRIES = 4096
+
+_MOCK_VOCABULARY = ("خبر", "گزارش", "منبع", "رویداد", "تحلیل", "مردم", "دولت", "شهر", "امروز",
+                    "اعلام", "کرد", "است", "شد", "در", "به", "از", "با", "این", "که", "را")
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """توزیع زمان (ثانیه): fixed:s، uniform:min:max، normal:mean:stdev، lognormal:median:sigma
+    یا exponential:mean"""
+    kind, *params = spec.strip().split(":")
+    values = [float(value) for value in params]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+@register_provider("mock")
+class MockProvider(BaseProvider):
+    """ارائه‌دهنده محلی شبیه‌سازی‌شده برای آزمون بار و failover بدون شبکه و کلید API
+
+    زمان تا اولین توکن از توزیع <NAME>_LATENCY، تولید توکن‌ها با نرخ
+    <NAME>_TOKENS_PER_SECOND و خطا با احتمال‌های <NAME>_ERROR_RATES (rate_limit،
+    server_error، bad_request و timeout) شبیه‌سازی می‌شود؛ پیش‌فرض همه تنظیمات
+    MOCK_* است. متن پاسخ فقط به system و prompt بستگی دارد و اعداد تصادفی از
+    <NAME>_SEED تولید می‌شوند، پس اجراها تکرارپذیرند. کش پیشوند ارائه‌دهنده هم
+    شبیه‌سازی می‌شود (cached_tokens در usage).
+    """
+    
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        super().__init__(name, settings)
+        self.latency = parse_latency(self._setting("LATENCY", config.MOCK_LATENCY))
+        self.tokens_per_second = float(self._setting("TOKENS_PER_SECOND", config.MOCK_TOKENS_PER_SECOND))
+        self.output_tokens = int(self._setting("OUTPUT_TOKENS", config.MOCK_OUTPUT_TOKENS))
+        error_rates = f"{self.name.upper()}_ERROR_RATES"
+        self.error_rates = config.MOCK_ERROR_RATES if os.getenv(error_rates) is None \
+            else parse_mapping(error_rates, "", float)
+        self.rng = random.Random(int(self._setting("SEED", config.MOCK_SEED)))
+        
+        self.calls = 0
+        self.probes = 0
+        self.injected: Dict[str, int] = {kind: 0 for kind in self.error_rates}
+        self.cached_tokens = 0
+        self._prefixes: OrderedDict = OrderedDict()
+    
+    def _setting(self, key: str, default: Any) -> Any:
+        return os.getenv(f"{self.name.upper()}_{key}", default)
+    
+    def _response_tokens(self, prompt: str) -> List[str]:
+        """متن قطعی پاسخ برای prompt (هر کلمه یک توکن)"""
+        digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()
+        rng = random.Random(digest)
+        count = max(int(self.output_tokens * rng.uniform(0.5, 1.5)), 1)
+        count = min(count, self.max_output_tokens or count)
+        return [f"[{self.name}:{digest[:8]}]"] + [f" {rng.choice(_MOCK_VOCABULARY)}" for _ in range(count - 1)]
+    
+    async def _start(self, prompt: str, timeout: Optional[float], tokens: int) -> float:
+        """تزریق خطا و محاسبه زمان تا اولین توکن؛ پاسخی که دیرتر از timeout تمام شود timeout می‌خورد"""
+        self.calls += 1
+        timeout = timeout or config.AI_REQUEST_TIMEOUT
+        first_token = self.latency(self.rng)
+        
+        roll = self.rng.random()
+        for kind, rate in self.error_rates.items():
+            if roll >= rate:
+                roll -= rate
+                continue
+            self.injected[kind] += 1
+            if kind == "timeout":
+                await asyncio.sleep(timeout)
+                raise asyncio.TimeoutError(f"Simulated timeout from {self.name}")
+            await asyncio.sleep(min(first_token, timeout))
+            raise MockProviderError(f"Simulated {kind} from {self.name}", _MOCK_ERROR_STATUS.get(kind, 500))
+        
+        if first_token + tokens / self.tokens_per_second > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError(f"Simulated slow response from {self.name}")
+        return first_token
+    
+    @staticmethod
+    def _request_text(prompt: str, system: Optional[str]) -> str:
+        """متن درخواست به ترتیب پیام‌ها (system سپس user)، مثل OpenAIProvider"""
+        return f"{system_message(system)}\n\n{prompt}"
+    
+    def _prefix_cached_tokens(self, text: str) -> int:
+        """توکن‌های بلندترین پیشوند از قبل دیده‌شده؛ پیشوندهای این درخواست هم ثبت می‌شوند"""
+        cached = 0
+        total = estimate_tokens(text, _MOCK_CHARS_PER_TOKEN)
+        for tokens in range(_MOCK_PREFIX_MIN_TOKENS, total + 1, _MOCK_PREFIX_BLOCK_TOKENS):
+            key = hashlib.md5(text[:int(tokens * _MOCK_CHARS_PER_TOKEN)].encode("utf-8")).digest()
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                cached = tokens
+            else:
+                self._prefixes[key] = None
+                if len(self._prefixes) > _MOCK_PREFIX_ENTRIES:
+                    self._prefixes.popitem(last=False)
+        return cached
+    
+    def _record(self, text: str, usage: Optional[Dict[str, Any]], tokens: int):
+        prompt_tokens = estimate_tokens(text, _MOCK_CHARS_PER_TOKEN)
+        cached_tokens = self._prefix_cached_tokens(text)
+        self.cached_tokens += cached_tokens
+        record_usage(usage, prompt_tokens, tokens, prompt_tokens + tokens, cached_tokens=cached_tokens)
+    
+    async def generate(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, system: Optional[str] = None) -> str:
+        text = self._request_text(prompt, system)
+        tokens = self._response_tokens(text)
+        first_token = await self._start(text, timeout, len(tokens))
+        await asyncio.sleep(first_token + len(tokens) / self.tokens_per_second)
+        self._record(text, usage, len(tokens))
+        return "".join(tokens)
+    
+    async def stream(self, prompt: str, usage: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None, system: Optional[str] = None) -> AsyncIterator[str]:
+        text = self._request_text(prompt, system)
+        tokens = self._response_tokens(text)
+        first_token = await self._start(text, timeout, len(tokens))
+        await asyncio.sleep(first_token)
+        interval = 1.0 / self.tokens_per_second
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(interval)
+            yield token
+        self._record(text, usage, len(tokens))
+    
+    async def probe(self, timeout: Optional[float] = None):
+        """probe شبیه‌سازی‌شده: کسری از زمان تا اولین توکن، با خطای سرور و timeout تزریقی"""
+        self.probes += 1
+        timeout = timeout or config.HEALTH_PROBE_TIMEOUT
+        roll = self.rng.random()
+        if roll < self.error_rates.get("timeout", 0.0):
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError(f"Simulated probe timeout from {self.name}")
+        if roll < self.error_rates.get("timeout", 0.0) + self.error_rates.get("server_error", 0.0):
+            raise MockProviderError(f"Simulated probe failure from {self.name}", 500)
+        # درخواست metadata بسیار سریع‌تر از تولید متن است
+        await asyncio.sleep(min(self.latency(self.rng) / 10, timeout))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "calls": self.calls, "probes": self.probes,
+                "injected_errors": dict(self.injected), "cached_tokens": self.cached_tokens}
@@ -0,0 +1,236 @@
+# services/quota_governor.py - کنترل سهمیه RPM/TPM هر ارائه‌دهنده با سطل توکن
+
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# مدت‌زمان در هدرهای OpenAI، مثلاً "1s"، "6m0s"، "20ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+class QuotaExceededError(RuntimeError):
+    """ظرفیت سهمیه ارائه‌دهنده در زمان انتظار مجاز آزاد نمی‌شود"""
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """تبدیل "6m0s" یا "1.5" (ثانیه) به ثانیه"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+class TokenBucket:
+    """سطل توکن با ظرفیت یک دقیقه؛ موجودی می‌تواند منفی شود (رزرو جلوتر از زمان)
+
+    هر رزرو فوراً از موجودی کم می‌شود و درخواست‌کننده تا صفر شدن بدهی صبر می‌کند؛
+    پس درخواست‌ها به ترتیب رسیدن پذیرفته می‌شوند و هجوم هم‌زمان پیش نمی‌آید.
+    capacity=0 یعنی بدون محدودیت.
+    """
+    
+    __slots__ = ("capacity", "level", "updated")
+    
+    def __init__(self, per_minute: float, now: float = None):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = now if now is not None else time.monotonic()
+    
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+    
+    def refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.level + (now - self.updated) * self.rate, self.capacity)
+        self.updated = now
+    
+    def time_until(self, amount: float, now: float) -> float:
+        """ثانیه تا در دسترس بودن amount"""
+        if not self.capacity:
+            return 0.0
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return max(amount - self.level, 0.0) / self.rate
+    
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self.refill(now)
+            self.level -= min(amount, self.capacity)
+    
+    def give_back(self, amount: float, now: float):
+        if self.capacity:
+            self.refill(now)
+            self.level = min(self.level + amount, self.capacity)
+    
+    def set_capacity(self, per_minute: float):
+        # موجودی به نسبت حفظ می‌شود
+        if self.capacity and per_minute != self.capacity:
+            self.level = self.level * per_minute / self.capacity
+        elif not self.capacity:
+            self.level = float(per_minute)
+        self.capacity = float(per_minute)
+
+class QuotaReservation:
+    """سهمیه رزروشده برای یک درخواست؛ پس از پاسخ با مصرف واقعی تسویه می‌شود"""
+    
+    __slots__ = ("governor", "tokens", "settled")
+    
+    def __init__(self, governor: "QuotaGovernor", tokens: int):
+        self.governor = governor
+        self.tokens = tokens
+        self.settled = False
+    
+    def settle(self, used_tokens: Optional[int]):
+        """برگرداندن تفاوت تخمین و مصرف واقعی (None: تخمین حفظ می‌شود)"""
+        if self.settled:
+            return
+        self.settled = True
+        if used_tokens is not None and used_tokens < self.tokens:
+            self.governor.tokens.give_back(self.tokens - used_tokens, time.monotonic())
+    
+    def cancel(self):
+        """درخواست ارسال نشد یا ارائه‌دهنده آن را نپذیرفت (429): آزاد کردن کامل سهمیه"""
+        if self.settled:
+            return
+        self.settled = True
+        now = time.monotonic()
+        self.governor.requests.give_back(1, now)
+        self.governor.tokens.give_back(self.tokens, now)
+
+class QuotaGovernor:
+    """سهمیه درخواست در دقیقه (RPM) و توکن در دقیقه (TPM) یک ارائه‌دهنده/مدل
+
+    توکن‌ها از طول prompt و max_tokens تخمین زده می‌شوند (ارائه‌دهندگان هم max_tokens
+    را در سهمیه حساب می‌کنند) و پس از پاسخ با مصرف واقعی تسویه می‌شوند. هدرهای
+    x-ratelimit-* ظرفیت و موجودی را با سرور هماهنگ می‌کنند و 429 ارائه‌دهنده را
+    تا Retry-After مسدود می‌کند. درخواستی که بیش از max_wait باید منتظر بماند
+    QuotaExceededError می‌گیرد تا به ارائه‌دهنده دیگر برود.
+    """
+    
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_output_tokens: int = 0,
+                 chars_per_token: float = 1.5, max_wait: float = 2.0, retry_after: float = 5.0,
+                 enabled: bool = True):
+        now = time.monotonic()
+        self.name = name
+        self.enabled = enabled
+        self.requests = TokenBucket(rpm if enabled else 0, now)
+        self.tokens = TokenBucket(tpm if enabled else 0, now)
+        self.max_output_tokens = max_output_tokens
+        self.chars_per_token = chars_per_token
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._blocked_until = 0.0
+        
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.throttled = 0
+        self.header_updates = 0
+    
+    def estimate_tokens(self, prompt: str) -> int:
+        """تخمین توکن درخواست: طول prompt + حداکثر خروجی"""
+        return int(len(prompt) / self.chars_per_token) + self.max_output_tokens
+    
+    def wait_time(self, tokens: int, now: float = None) -> float:
+        """ثانیه انتظار تا پذیرش درخواستی با این تعداد توکن"""
+        if not self.enabled:
+            return 0.0
+        now = now if now is not None else time.monotonic()
+        return max(self._blocked_until - now,
+                   self.requests.time_until(1, now),
+                   self.tokens.time_until(tokens, now),
+                   0.0)
+    
+    def can_admit(self, prompt: str) -> bool:
+        """آیا درخواست در زمان انتظار مجاز پذیرفته می‌شود"""
+        return self.wait_time(self.estimate_tokens(prompt)) <= self.max_wait
+    
+    async def acquire(self, prompt: str) -> QuotaReservation:
+        """رزرو سهمیه؛ در صورت نیاز انتظار کوتاه، وگرنه QuotaExceededError"""
+        tokens = self.estimate_tokens(prompt)
+        now = time.monotonic()
+        wait = self.wait_time(tokens, now)
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise QuotaExceededError(f"Quota exhausted for {self.name} (free in {wait:.1f}s)")
+        
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        reservation = QuotaReservation(self, tokens)
+        self.admitted += 1
+        if wait > 0:
+            self.delayed += 1
+            self.total_wait += wait
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                reservation.cancel()
+                raise
+        return reservation
+    
+    def observe_headers(self, headers: Mapping[str, str], now: float = None):
+        """هماهنگی با هدرهای x-ratelimit-* (limit، remaining و reset)"""
+        if not self.enabled or not headers:
+            return
+        now = now if now is not None else time.monotonic()
+        updated = False
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                if limit is not None:
+                    bucket.set_capacity(float(limit))
+                    updated = True
+                if remaining is not None and bucket.capacity:
+                    # فقط کاهش: درخواست‌های هم‌زمان دیگر هنوز در پاسخ سرور دیده نشده‌اند
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+                    updated = True
+                    if float(remaining) <= 0:
+                        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self._blocked_until = max(self._blocked_until, now + reset)
+            except ValueError:
+                continue
+        if updated:
+            self.header_updates += 1
+    
+    def throttle(self, retry_after: Optional[float] = None, now: float = None):
+        """ارائه‌دهنده 429 داد: مسدود کردن تا Retry-After"""
+        if not self.enabled:
+            return
+        now = now if now is not None else time.monotonic()
+        delay = retry_after if retry_after is not None else self.retry_after
+        self._blocked_until = max(self._blocked_until, now + delay)
+        self.throttled += 1
+        logger.warning(f"Provider {self.name} rate limited; pausing for {delay:.1f}s")
+    
+    def get_stats(self, now: float = None) -> Dict[str, Any]:
+        """وضعیت سطل‌ها و آمار پذیرش"""
+        now = now if now is not None else time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "enabled": self.enabled,
+            "rpm_limit": int(self.requests.capacity),
+            "rpm_available": round(self.requests.level, 1),
+            "tpm_limit": int(self.tokens.capacity),
+            "tpm_available": int(self.tokens.level),
+            "blocked_for": round(max(self._blocked_until - now, 0.0), 1),
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "avg_wait": round(self.total_wait / self.delayed, 3) if self.delayed else 0,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "header_updates": self.header_updates
+        }
@@ -0,0 +1,159 @@
+# services/semantic_cache.py - تشخیص درخواست‌های تقریباً تکراری با SimHash و LSH
+
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.text_normalizer import normalize_for_key
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+
+# حروف غیر از حرف/عدد/فاصله (نقطه‌گذاری، گیومه و ...)
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+
+def normalize_for_similarity(text: str) -> str:
+    """نرمال‌سازی متن برای مقایسه شباهت"""
+    text = _PUNCTUATION_RE.sub(" ", normalize_for_key(text))
+    return " ".join(text.split())
+
+def _build_lane_tables() -> List[List[int]]:
+    """جدول پخش هر بایت hash در 8 «خط» شمارنده 32 بیتی یک عدد صحیح بزرگ"""
+    tables = []
+    for byte_position in range(FINGERPRINT_BITS // 8):
+        table = []
+        for byte_value in range(256):
+            spread = 0
+            for bit in range(8):
+                if byte_value >> bit & 1:
+                    spread |= 1 << ((byte_position * 8 + bit) * 32)
+            table.append(spread)
+        tables.append(table)
+    return tables
+
+_LANE_TABLES = _build_lane_tables()
+_LANE_MASK = (1 << 32) - 1
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """اثرانگشت 64 بیتی SimHash روی shingle های کلمه‌ای"""
+    words = text.split()
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    
+    # جمع شمارنده‌های هر بیت به صورت موازی در یک عدد صحیح بزرگ
+    lanes = 0
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        for position, byte_value in enumerate(digest):
+            lanes += _LANE_TABLES[position][byte_value]
+    
+    half = len(shingles) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if (lanes >> (bit * 32)) & _LANE_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def similarity(first: int, second: int) -> float:
+    """شباهت دو اثرانگشت (1 - فاصله همینگ نسبی)"""
+    return 1.0 - bin(first ^ second).count("1") / FINGERPRINT_BITS
+
+class SemanticCache:
+    """ایندکس LSH از اثرانگشت درخواست‌ها به کلید کش پاسخ"""
+    
+    def __init__(self, max_entries: int = 10000, bands: int = 8, min_length: int = 200):
+        if FINGERPRINT_BITS % bands:
+            raise ValueError("bands must divide the fingerprint size")
+        self.max_entries = max_entries
+        self.bands = bands
+        self.band_bits = FINGERPRINT_BITS // bands
+        self.min_length = min_length
+        
+        # entry: cache_key -> (namespace, fingerprint)
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, int], Set[str]] = {}
+        
+        self.lookups = 0
+        self.hits = 0
+        logger.info(f"Semantic cache initialized: max_entries={max_entries}, bands={bands}")
+    
+    def _band_keys(self, namespace: str, fingerprint: int):
+        """کلیدهای سطل LSH برای هر باند"""
+        mask = (1 << self.band_bits) - 1
+        return [
+            (namespace, band, (fingerprint >> (band * self.band_bits)) & mask)
+            for band in range(self.bands)
+        ]
+    
+    def fingerprint(self, text: str) -> Optional[int]:
+        """اثرانگشت متن (None برای متن‌های کوتاه که مقایسه تقریبی برایشان امن نیست)"""
+        normalized = normalize_for_similarity(text)
+        if len(normalized) < self.min_length:
+            return None
+        return simhash(normalized)
+    
+    def lookup(self, namespace: str, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """یافتن کلید کش مشابه‌ترین درخواست قبلی بالاتر از آستانه"""
+        fingerprint = self.fingerprint(text)
+        if fingerprint is None:
+            return None
+        
+        self.lookups += 1
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(namespace, fingerprint):
+            candidates.update(self._buckets.get(band_key, ()))
+        
+        best_key, best_score = None, threshold
+        for cache_key in candidates:
+            score = similarity(fingerprint, self._entries[cache_key][1])
+            if score >= best_score:
+                best_key, best_score = cache_key, score
+        
+        if best_key is None:
+            return None
+        
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        return best_key, best_score
+    
+    def add(self, namespace: str, text: str, cache_key: str):
+        """ثبت اثرانگشت درخواست پاسخ‌داده‌شده"""
+        fingerprint = self.fingerprint(text)
+        if fingerprint is None:
+            return
+        
+        self.remove(cache_key)
+        if len(self._entries) >= self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self.remove(oldest_key)
+        
+        self._entries[cache_key] = (namespace, fingerprint)
+        for band_key in self._band_keys(namespace, fingerprint):
+            self._buckets.setdefault(band_key, set()).add(cache_key)
+    
+    def remove(self, cache_key: str):
+        """حذف ورودی (مثلاً وقتی پاسخ از کش حذف شده)"""
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        namespace, fingerprint = entry
+        for band_key in self._band_keys(namespace, fingerprint):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(cache_key)
+                if not bucket:
+                    del self._buckets[band_key]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار کش معنایی"""
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups * 100, 2) if self.lookups else 0
+        }
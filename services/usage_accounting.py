@@ -0,0 +1,116 @@
+# services/usage_accounting.py - حسابداری توکن و هزینه به تفکیک کاربر، عملیات و ارائه‌دهنده
+
+import contextvars
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# کاربر درخواست جاری؛ ربات آن را در ابتدای پردازش هر update تنظیم می‌کند
+request_user: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("request_user", default=None)
+# عملیات درخواست جاری (operation_type)؛ سرویس AI آن را پیش از تولید پاسخ تنظیم می‌کند
+request_operation: contextvars.ContextVar[str] = contextvars.ContextVar("request_operation", default="general")
+
+class UsageCounter:
+    """شمارنده فشرده مصرف (برای هر کاربر/عملیات/ارائه‌دهنده یک نمونه)"""
+    __slots__ = ("requests", "prompt_tokens", "cached_tokens", "completion_tokens", "estimated", "cost")
+    
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0   # بخشی از prompt_tokens که از کش پیشوند ارائه‌دهنده خوانده شد
+        self.completion_tokens = 0
+        self.estimated = 0   # پاسخ‌هایی که توکن آن‌ها تخمینی است (ارائه‌دهنده usage نداد)
+        self.cost = 0.0
+    
+    def add(self, prompt_tokens: int, completion_tokens: int, cost: float, estimated: bool, cached_tokens: int = 0):
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+        if estimated:
+            self.estimated += 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_completion_tokens": round(self.completion_tokens / self.requests, 1) if self.requests else 0,
+            "estimated_requests": self.estimated,
+            "cost": round(self.cost, 6)
+        }
+
+class UsageAccounting:
+    """مجموع توکن و هزینه هر پاسخ موفق ارائه‌دهنده در سه بعد
+
+    هر پاسخ یک بار در شمارنده کاربر، عملیات و ارائه‌دهنده جمع می‌شود. درخواست‌های
+    ادغام‌شده (coalesced) و پاسخ‌های کش هزینه‌ای ندارند و به کاربری که تولید را
+    شروع کرده نسبت داده می‌شوند؛ درخواست‌های بدون کاربر (دسته‌ای، micro-batch) فقط
+    در عملیات و ارائه‌دهنده دیده می‌شوند. هزینه با قیمت هر میلیون توکن ارائه‌دهنده
+    در لحظه ثبت محاسبه می‌شود.
+    """
+    
+    def __init__(self, input_prices: Dict[str, float], output_prices: Dict[str, float]):
+        self.input_prices = input_prices
+        self.output_prices = output_prices
+        self.total = UsageCounter()
+        self.users: Dict[int, UsageCounter] = {}
+        self.operations: Dict[str, UsageCounter] = {}
+        self.providers: Dict[str, UsageCounter] = {}
+        self.started_at = datetime.now()
+    
+    @staticmethod
+    def _counter(table: Dict[Any, UsageCounter], key: Any) -> UsageCounter:
+        counter = table.get(key)
+        if counter is None:
+            counter = table[key] = UsageCounter()
+        return counter
+    
+    def cost(self, provider: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """هزینه (دلار) یک پاسخ"""
+        return (prompt_tokens * self.input_prices.get(provider, 0.0)
+                + completion_tokens * self.output_prices.get(provider, 0.0)) / 1_000_000
+    
+    def record(self, provider: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False,
+               operation: Optional[str] = None, user_id: Optional[int] = None, cached_tokens: int = 0):
+        """ثبت مصرف یک پاسخ (عملیات و کاربر پیش‌فرض از context درخواست)"""
+        operation = operation or request_operation.get()
+        user_id = user_id if user_id is not None else request_user.get()
+        cost = self.cost(provider, prompt_tokens, completion_tokens)
+        counters = [self.total, self._counter(self.providers, provider), self._counter(self.operations, operation)]
+        if user_id is not None:
+            counters.append(self._counter(self.users, user_id))
+        
+        for counter in counters:
+            counter.add(prompt_tokens, completion_tokens, cost, estimated, cached_tokens)
+    
+    @staticmethod
+    def _top(table: Dict[Any, UsageCounter], limit: Optional[int]) -> List[tuple]:
+        ranked = sorted(table.items(), key=lambda item: (item[1].cost, item[1].prompt_tokens
+                                                        + item[1].completion_tokens), reverse=True)
+        return ranked[:limit] if limit else ranked
+    
+    def top_users(self, limit: int = 5) -> List[tuple]:
+        """پرهزینه‌ترین کاربران: [(user_id, UsageCounter)]"""
+        return self._top(self.users, limit)
+    
+    def top_operations(self, limit: int = 5) -> List[tuple]:
+        """پرهزینه‌ترین عملیات: [(operation, UsageCounter)]"""
+        return self._top(self.operations, limit)
+    
+    def export(self, user_limit: Optional[int] = None) -> Dict[str, Any]:
+        """خروجی قابل پردازش (JSON) همه شمارنده‌ها؛ کاربران به ترتیب هزینه"""
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "since": self.started_at.isoformat(timespec="seconds"),
+            "prices_per_1m": {"input": self.input_prices, "output": self.output_prices},
+            "total": self.total.to_dict(),
+            "providers": {name: counter.to_dict() for name, counter in self._top(self.providers, None)},
+            "operations": {name: counter.to_dict() for name, counter in self._top(self.operations, None)},
+            "users": {str(user_id): counter.to_dict() for user_id, counter in self._top(self.users, user_limit)},
+            "user_count": len(self.users)
+        }
@@ -69,3 +69,18 @@ class MainKeyboard:
             [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
         ]
         return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    def get_page_navigation(key: str, page: int, total: int):
+        """دکمه‌های صفحه‌بندی پاسخ بلند (callback_data: page:<کلید>:<شماره صفحه>)"""
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"page:{key}:{page - 1}"))
+        navigation.append(InlineKeyboardButton(f"{page + 1}/{total}", callback_data=f"page:{key}:{page}"))
+        if page < total - 1:
+            navigation.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"page:{key}:{page + 1}"))
+        keyboard = [
+            navigation,
+            [InlineKeyboardButton("🔙 منوی اصلی", callback_data="main_menu")]
+        ]
+        return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,129 @@
+# utils/stream_renderer.py
+
+import logging
+import time
+from typing import Optional
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from core.config import config
+from utils.keyboards import MainKeyboard
+from utils.telegram_renderer import TELEGRAM_MESSAGE_LIMIT, remaining_source, render_pages
+
+logger = logging.getLogger(__name__)
+
+class TelegramStreamRenderer:
+    """نمایش تدریجی پاسخ AI با ویرایش پیام «در حال پردازش»"""
+    
+    def __init__(self, message, title: str = "", min_interval: float = None, min_growth: int = 20):
+        self.message = message
+        self.title = title
+        self.min_interval = min_interval if min_interval is not None else config.STREAM_EDIT_INTERVAL
+        self.min_growth = min_growth
+        self.edit_count = 0
+        self._next_edit_at = 0.0
+        self._rendered_length = 0
+        self._truncated = False
+        self._deleted = False
+        self._finished = False
+        self._delivered = 0   # صفحه‌های پاسخ نهایی که به کاربر رسیده‌اند
+    
+    def _render_preview(self, text: str) -> str:
+        """متن پیش‌نمایش (بدون Markdown تا متن ناقص خطا ندهد)"""
+        preview = f"{self.title}\n\n{text} ▌" if self.title else f"{text} ▌"
+        if len(preview) > TELEGRAM_MESSAGE_LIMIT:
+            self._truncated = True
+            preview = preview[:TELEGRAM_MESSAGE_LIMIT - 2] + " …"
+        return preview
+    
+    async def on_chunk(self, text: str):
+        """دریافت متن تجمعی و ویرایش پیام با رعایت محدودیت نرخ تلگرام
+
+        تولید مشترک پس از timeout درخواست هم ادامه می‌یابد؛ بعد از finish پیش‌نمایش
+        دیگر ویرایش نمی‌شود تا پاسخ نهایی (یا پیام timeout) و کیبورد آن از بین نرود.
+        """
+        if self._finished or self._truncated:
+            return
+        
+        now = time.monotonic()
+        if now < self._next_edit_at:
+            return
+        if len(text) - self._rendered_length < self.min_growth:
+            return
+        
+        self._next_edit_at = now + self.min_interval
+        try:
+            await self.message.edit_text(self._render_preview(text))
+            self._rendered_length = len(text)
+            self.edit_count += 1
+        except RetryAfter as e:
+            self._next_edit_at = now + float(e.retry_after)
+            logger.debug(f"Stream edit throttled by Telegram for {e.retry_after}s")
+        except TelegramError as e:
+            # خطای ویرایش نباید تولید پاسخ را متوقف کند
+            logger.debug(f"Stream edit skipped: {e}")
+    
+    async def finish(self, text: str, reply_markup=None):
+        """نمایش پاسخ نهایی (Markdown مدل) با قالب RENDER_PARSE_MODE
+
+        پاسخ بلند روی مرز پاراگراف به چند پیام، یا اگر بیش از RENDER_MAX_MESSAGES
+        پیام شود به صفحه‌هایی با دکمه قبلی/بعدی تقسیم می‌شود. اگر تلگرام قالب یکی از
+        صفحه‌ها را نپذیرد، همان صفحه و صفحه‌های بعد به صورت متن ساده فرستاده می‌شوند تا
+        پاسخ تولیدشده از دست نرود و صفحه‌های رسیده تکرار نشوند.
+        """
+        self._finished = True
+        key, pages = render_pages(text)
+        try:
+            await self._deliver(key, pages, reply_markup, config.RENDER_PARSE_MODE)
+        except BadRequest as e:
+            logger.warning(f"Rendered reply page {self._delivered + 1}/{len(pages)} rejected by Telegram, "
+                           f"sending the rest as plain text: {e}")
+            if self._delivered:
+                text = remaining_source(text, self._delivered)
+            key, pages = render_pages(text, parse_mode="")
+            await self._deliver(key, pages, reply_markup, None)
+    
+    async def _deliver(self, key: str, pages, reply_markup, parse_mode: Optional[str]):
+        if len(pages) > config.RENDER_MAX_MESSAGES and not self._delivered:
+            await self._show(pages[0], MainKeyboard.get_page_navigation(key, 0, len(pages)), parse_mode)
+            self._delivered += 1
+            return
+        
+        # چند پیام پشت سر هم؛ کیبورد زیر آخرین پیام. ادامه پاسخ (پس از خطای قالب) همیشه
+        # پیام جدید است تا صفحه‌های رسیده دست نخورند
+        for index, page in enumerate(pages, 1):
+            markup = reply_markup if index == len(pages) else None
+            if self._delivered:
+                await self.message.get_bot().send_message(
+                    chat_id=self.message.chat_id,
+                    text=page,
+                    reply_markup=markup,
+                    parse_mode=parse_mode
+                )
+            else:
+                await self._show(page, markup, parse_mode)
+            self._delivered += 1
+    
+    async def _show(self, text: str, reply_markup, parse_mode: Optional[str]):
+        """نمایش صفحه اول: ویرایش پیش‌نمایش stream، یا حذف پیام موقت و ارسال پیام جدید"""
+        if self.edit_count and not self._deleted:
+            try:
+                await self.message.edit_text(
+                    text,
+                    reply_markup=reply_markup,
+                    parse_mode=parse_mode
+                )
+                return
+            except BadRequest as e:
+                logger.warning(f"Final stream edit failed, sending a new message: {e}")
+        
+        # بدون stream (یا در صورت خطا): حذف پیام موقت و ارسال پیام جدید
+        if not self._deleted:
+            await self.message.delete()
+            self._deleted = True
+        await self.message.get_bot().send_message(
+            chat_id=self.message.chat_id,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
@@ -0,0 +1,359 @@
+# utils/telegram_renderer.py - تبدیل Markdown خروجی مدل به HTML/MarkdownV2 تلگرام و تقسیم به صفحه
+
+import hashlib
+import re
+import sys
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from core.config import config
+
+# حداکثر طول پیام تلگرام (پس از پردازش entity ها، به واحد UTF-16)
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# نشانه‌های درون‌خطی: escape، کد، لینک و تأکیدها (بلندترها اول)
+_INLINE_RE = re.compile(r"\\|`+|\[|\*\*|__|~~|\*|_")
+_LINK_RE = re.compile(r"\[([^\]\n]+)\]\(((?:https?|tg)://[^\s)]+)\)")
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_BULLET_RE = re.compile(r"^(\s*)[*+\-]\s+")
+_FENCE_RE = re.compile(r"^\s*```\s*([\w+\-]*)\s*$")
+
+_EMPHASIS = {"**": "bold", "__": "bold", "~~": "strike", "*": "italic", "_": "italic"}
+
+def telegram_length(text: str) -> int:
+    """طول متن به روش تلگرام (واحد UTF-16؛ ایموجی‌ها دو واحدند)"""
+    return len(text.encode("utf-16-le")) // 2
+
+class _HTMLFormat:
+    parse_mode = "HTML"
+    tags = {"bold": ("<b>", "</b>"), "italic": ("<i>", "</i>"), "strike": ("<s>", "</s>")}
+    
+    @staticmethod
+    def escape(text: str) -> str:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    
+    @classmethod
+    def code(cls, text: str) -> str:
+        return f"<code>{cls.escape(text)}</code>"
+    
+    @classmethod
+    def pre(cls, text: str, language: str = "") -> str:
+        if language:
+            return f'<pre><code class="language-{language}">{cls.escape(text)}</code></pre>'
+        return f"<pre>{cls.escape(text)}</pre>"
+    
+    @classmethod
+    def link(cls, label: str, url: str) -> str:
+        return f'<a href="{cls.escape(url).replace(chr(34), "&quot;")}">{label}</a>'
+
+class _MarkdownV2Format:
+    parse_mode = "MarkdownV2"
+    tags = {"bold": ("*", "*"), "italic": ("_", "_"), "strike": ("~", "~")}
+    _SPECIAL_RE = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+    
+    @classmethod
+    def escape(cls, text: str) -> str:
+        return cls._SPECIAL_RE.sub(r"\\\1", text)
+    
+    @staticmethod
+    def _escape_code(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("`", "\\`")
+    
+    @classmethod
+    def code(cls, text: str) -> str:
+        return f"`{cls._escape_code(text)}`"
+    
+    @classmethod
+    def pre(cls, text: str, language: str = "") -> str:
+        return f"```{language}\n{cls._escape_code(text)}\n```"
+    
+    @staticmethod
+    def link(label: str, url: str) -> str:
+        return f"[{label}]({url.replace(chr(92), chr(92) * 2).replace(')', chr(92) + ')')})"
+
+class _PlainFormat:
+    """بدون parse_mode: فقط متن (پشتیبان وقتی تلگرام قالب را رد کند)"""
+    parse_mode = None
+    tags = {"bold": ("", ""), "italic": ("", ""), "strike": ("", "")}
+    
+    @staticmethod
+    def escape(text: str) -> str:
+        return text
+    
+    @staticmethod
+    def code(text: str) -> str:
+        return text
+    
+    @staticmethod
+    def pre(text: str, language: str = "") -> str:
+        return text
+    
+    @staticmethod
+    def link(label: str, url: str) -> str:
+        return f"{label} ({url})"
+
+_FORMATS = {"HTML": _HTMLFormat, "MarkdownV2": _MarkdownV2Format, "": _PlainFormat}
+
+def _format(parse_mode: Optional[str]):
+    try:
+        return _FORMATS[parse_mode or ""]
+    except KeyError:
+        raise ValueError(f"Unsupported parse mode: {parse_mode}") from None
+
+def _render_inline(text: str, fmt) -> str:
+    """تبدیل یک خط در یک گذر؛ نشانه تأکید بی‌جفت به صورت متن عادی می‌ماند
+
+    جایگاه نشانه باز در خروجی نگه داشته می‌شود و فقط با رسیدن نشانه بسته به تگ
+    تبدیل می‌شود؛ پس تگ‌ها همیشه متوازن و تودرتوی درست‌اند.
+    """
+    out: List[Optional[str]] = []
+    stack: List[Tuple[str, int]] = []  # (نشانه، جایگاه در out)
+    position = 0
+    
+    while True:
+        match = _INLINE_RE.search(text, position)
+        if match is None:
+            out.append(fmt.escape(text[position:]))
+            break
+        start, token = match.start(), match.group()
+        out.append(fmt.escape(text[position:start]))
+        position = match.end()
+        
+        if token == "\\":
+            # escape صریح Markdown: کاراکتر بعدی متن عادی است
+            if position < len(text):
+                out.append(fmt.escape(text[position]))
+                position += 1
+            else:
+                out.append(fmt.escape(token))
+        
+        elif token.startswith("`"):
+            end = text.find(token, position)
+            if end < 0:
+                out.append(fmt.escape(token))
+            else:
+                out.append(fmt.code(text[position:end]))
+                position = end + len(token)
+        
+        elif token == "[":
+            link = _LINK_RE.match(text, start)
+            if link is None:
+                out.append(fmt.escape(token))
+            else:
+                out.append(fmt.link(_render_inline(link.group(1), fmt), link.group(2)))
+                position = link.end()
+        
+        else:
+            before = text[start - 1] if start else " "
+            after = text[position] if position < len(text) else " "
+            # _ درون کلمه (snake_case) تأکید نیست
+            intraword = token[0] == "_" and (before.isalnum() and after.isalnum())
+            can_open = not after.isspace() and not intraword
+            can_close = not before.isspace() and not intraword
+            open_index = next((index for index in range(len(stack) - 1, -1, -1) if stack[index][0] == token), None)
+            
+            if can_close and open_index is not None:
+                # نشانه‌های باز بالاتر جفت ندارند
+                for marker, slot in stack[open_index + 1:]:
+                    out[slot] = fmt.escape(marker)
+                marker, slot = stack[open_index]
+                del stack[open_index:]
+                opening, closing = fmt.tags[_EMPHASIS[marker]]
+                out[slot] = opening
+                out.append(closing)
+            elif can_open:
+                stack.append((token, len(out)))
+                out.append(None)
+            else:
+                out.append(fmt.escape(token))
+    
+    for marker, slot in stack:
+        out[slot] = fmt.escape(marker)
+    return "".join(out)
+
+def _render_line(line: str, fmt) -> str:
+    """سرتیتر به متن پررنگ و * / - ابتدای خط به بولت تبدیل می‌شود"""
+    heading = _HEADING_RE.match(line)
+    if heading:
+        opening, closing = fmt.tags["bold"]
+        return f"{opening}{_render_inline(heading.group(1), fmt)}{closing}"
+    bullet = _BULLET_RE.match(line)
+    if bullet:
+        return f"{bullet.group(1)}• {_render_inline(line[bullet.end():], fmt)}"
+    return _render_inline(line, fmt)
+
+def _blocks(text: str) -> Iterator[Tuple[str, str, List[str]]]:
+    """بلوک‌های متن: (paragraph، ""، خطوط) یا (code، زبان، خطوط)؛ بلوک کد بی‌پایان تا آخر متن ادامه دارد"""
+    lines = text.replace("\r\n", "\n").split("\n")
+    paragraph: List[str] = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        fence = _FENCE_RE.match(line)
+        if fence:
+            if paragraph:
+                yield "paragraph", "", paragraph
+                paragraph = []
+            code = []
+            index += 1
+            while index < len(lines) and not _FENCE_RE.match(lines[index]):
+                code.append(lines[index])
+                index += 1
+            yield "code", fence.group(1), code
+        elif line.strip():
+            paragraph.append(line)
+        elif paragraph:
+            yield "paragraph", "", paragraph
+            paragraph = []
+        index += 1
+    if paragraph:
+        yield "paragraph", "", paragraph
+
+def _split_words(line: str, limit: int) -> Iterator[str]:
+    """شکستن خط خیلی بلند روی فاصله‌ها (و در صورت نبود فاصله، روی کاراکترها)"""
+    piece = ""
+    for word in line.split(" "):
+        while len(word) > limit:
+            if piece:
+                yield piece
+                piece = ""
+            yield word[:limit]
+            word = word[limit:]
+        if piece and len(piece) + len(word) + 1 > limit:
+            yield piece
+            piece = ""
+        piece = f"{piece} {word}" if piece else word
+    if piece:
+        yield piece
+
+def _fenced(lines: List[str], language: str) -> str:
+    return "\n".join([f"```{language}"] + lines + ["```"])
+
+def _units(text: str, fmt, limit: int) -> Iterator[Tuple[str, str, str]]:
+    """واحدهای رندرشده با جداکننده بعدشان و Markdown مبدأ: بلوک، در غیر این صورت خط،
+    در غیر این صورت تکه خط
+
+    هر واحد جداگانه رندر شده و متوازن است، پس مرز صفحه‌ها هرگز وسط یک تگ نمی‌افتد.
+    """
+    for kind, language, lines in _blocks(text):
+        if kind == "code":
+            rendered = fmt.pre("\n".join(lines), language)
+            if telegram_length(rendered) <= limit:
+                yield rendered, "\n\n", _fenced(lines, language)
+                continue
+            # کد بلند: چند بلوک کد پشت سر هم
+            group: List[str] = []
+            for line in lines:
+                for piece in _split_words(line, limit // 2) if len(line) > limit // 2 else [line]:
+                    if group and telegram_length(fmt.pre("\n".join(group + [piece]), language)) > limit:
+                        yield fmt.pre("\n".join(group), language), "\n", _fenced(group, language)
+                        group = []
+                    group.append(piece)
+            if group:
+                yield fmt.pre("\n".join(group), language), "\n\n", _fenced(group, language)
+            continue
+        
+        rendered_lines = [_render_line(line, fmt) for line in lines]
+        rendered = "\n".join(rendered_lines)
+        if telegram_length(rendered) <= limit:
+            yield rendered, "\n\n", "\n".join(lines)
+            continue
+        for index, (line, rendered_line) in enumerate(zip(lines, rendered_lines)):
+            separator = "\n\n" if index == len(lines) - 1 else "\n"
+            if telegram_length(rendered_line) <= limit:
+                yield rendered_line, separator, line
+                continue
+            # تکه‌ها طوری انتخاب می‌شوند که پس از escape هم در حد مجاز بمانند
+            pieces = list(_split_words(line, limit // 2))
+            for piece_index, piece in enumerate(pieces):
+                yield _render_line(piece, fmt), separator if piece_index == len(pieces) - 1 else " ", piece
+
+def render_markdown(text: str, parse_mode: Optional[str] = "HTML") -> str:
+    """تبدیل Markdown مدل به قالب تلگرام (HTML، MarkdownV2 یا None برای متن ساده)"""
+    fmt = _format(parse_mode)
+    return "".join(unit + separator for unit, separator, _ in _units(text, fmt, sys.maxsize)).rstrip()
+
+def _paginate(text: str, fmt, limit: int) -> List[Tuple[str, str]]:
+    """(صفحه رندرشده، Markdown مبدأ آن) در حد limit، روی مرز پاراگراف (سپس خط)"""
+    pages: List[Tuple[str, str]] = []
+    current = source = ""
+    for unit, separator, unit_source in _units(text, fmt, limit):
+        if current and telegram_length(current.rstrip()) + telegram_length(unit) + 2 > limit:
+            pages.append((current.rstrip(), source.rstrip()))
+            current = source = ""
+        current += unit + separator
+        source += unit_source + separator
+    if current.strip():
+        pages.append((current.rstrip(), source.rstrip()))
+    return pages
+
+def split_rendered(text: str, parse_mode: Optional[str] = "HTML", limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """رندر و تقسیم به صفحه‌هایی در حد limit، روی مرز پاراگراف (سپس خط)"""
+    fmt = _format(parse_mode)
+    pages = [page for page, _ in _paginate(text, fmt, limit)]
+    return pages or [fmt.escape(text.strip()) or "…"]
+
+def remaining_source(text: str, delivered: int, parse_mode: Optional[str] = None,
+                     limit: int = TELEGRAM_MESSAGE_LIMIT) -> str:
+    """Markdown مبدأ صفحه‌های پس از delivered صفحه اول split_rendered
+
+    برای ارسال ادامه پاسخ با قالب دیگر (متن ساده) وقتی تلگرام یکی از صفحه‌ها را رد کند.
+    """
+    parse_mode = config.RENDER_PARSE_MODE if parse_mode is None else parse_mode
+    pages = _paginate(text, _format(parse_mode), limit)
+    return "\n\n".join(source for _, source in pages[delivered:])
+
+class RenderedPageCache:
+    """صفحه‌های رندرشده هر پاسخ (LRU) با کلید hash متن پاسخ
+
+    متن پاسخ کش‌شده AI ثابت است، پس پاسخ تکراری (hit کش AI) دوباره رندر نمی‌شود و
+    دکمه‌های صفحه‌بندی پیام‌های قبلی تا خارج شدن از این کش کار می‌کنند.
+    """
+    
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._pages: "OrderedDict[str, Tuple[Optional[str], Tuple[str, ...]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(text: str, parse_mode: Optional[str]) -> str:
+        """کلید کوتاه (برای callback_data با سقف 64 بایت)"""
+        return hashlib.md5(f"{parse_mode}:{text}".encode("utf-8")).hexdigest()[:16]
+    
+    def get(self, key: str) -> Optional[Tuple[Optional[str], List[str]]]:
+        """(parse_mode برای ارسال، صفحه‌ها) یا None"""
+        entry = self._pages.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._pages.move_to_end(key)
+        self.hits += 1
+        return entry[0], list(entry[1])
+    
+    def set(self, key: str, parse_mode: Optional[str], pages: List[str]):
+        self._pages[key] = (parse_mode or None, tuple(pages))
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+    
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._pages),
+            "max_size": self.max_size,
+            "hit_rate": round(self.hits / total * 100, 2) if total else 0
+        }
+
+page_cache = RenderedPageCache(config.RENDER_CACHE_SIZE)
+
+def render_pages(text: str, parse_mode: Optional[str] = None) -> Tuple[str, List[str]]:
+    """(کلید، صفحه‌ها) پاسخ؛ parse_mode پیش‌فرض RENDER_PARSE_MODE و "" برای متن ساده است"""
+    parse_mode = config.RENDER_PARSE_MODE if parse_mode is None else parse_mode
+    key = page_cache.make_key(text, parse_mode)
+    cached = page_cache.get(key)
+    if cached is not None:
+        return key, cached[1]
+    pages = split_rendered(text, parse_mode)
+    page_cache.set(key, parse_mode, pages)
+    return key, pages
@@ -0,0 +1,91 @@
+# utils/text_chunker.py
+
+import re
+import zlib
+from typing import Iterator, List, Tuple
+
+# پایان جمله: . ! ? ؟ … (با گیومه/پرانتز بسته پس از آن) و سپس فاصله؛ "3.5" جمله را نمی‌شکند
+_SENTENCE_END_RE = re.compile(r"([.!?؟…]+[»\"'”)\]]*)\s+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+def estimate_tokens(text: str, chars_per_token: float = 1.5) -> int:
+    """تخمین تعداد توکن از طول متن"""
+    return int(len(text) / chars_per_token)
+
+def _split_sentences(paragraph: str) -> List[str]:
+    """جمله‌های یک پاراگراف (هر خط جدید هم مرز جمله است)"""
+    sentences = []
+    for line in paragraph.split("\n"):
+        start = 0
+        for match in _SENTENCE_END_RE.finditer(line):
+            sentences.append(line[start:match.end(1)])
+            start = match.end()
+        if line[start:].strip():
+            sentences.append(line[start:])
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+def _split_words(sentence: str, max_chars: int) -> Iterator[str]:
+    """شکستن جمله خیلی بلند روی فاصله‌ها"""
+    piece = []
+    size = 0
+    for word in sentence.split():
+        if piece and size + len(word) + 1 > max_chars:
+            yield " ".join(piece)
+            piece, size = [], 0
+        piece.append(word)
+        size += len(word) + 1
+    if piece:
+        yield " ".join(piece)
+
+def _units(text: str, max_chars: int) -> Iterator[Tuple[str, str]]:
+    """واحدهای متن با جداکننده بعدشان: پاراگراف، در غیر این صورت جمله، در غیر این صورت تکه"""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph, "\n\n"
+            continue
+        sentences = _split_sentences(paragraph)
+        for index, sentence in enumerate(sentences):
+            separator = "\n\n" if index == len(sentences) - 1 else " "
+            if len(sentence) <= max_chars:
+                yield sentence, separator
+            else:
+                pieces = list(_split_words(sentence, max_chars))
+                for piece_index, piece in enumerate(pieces):
+                    yield piece, separator if piece_index == len(pieces) - 1 else " "
+
+def _is_anchor(unit: str, spacing: int) -> bool:
+    """مرز وابسته به محتوا: فقط به متن خود واحد بستگی دارد، نه به موقعیت آن"""
+    return zlib.crc32(unit.encode("utf-8")) % spacing == 0
+
+def split_into_chunks(text: str, max_tokens: int, chars_per_token: float = 1.5,
+                      min_fill: float = 0.5, anchor_spacing: int = 3) -> List[str]:
+    """تقسیم متن فارسی به تکه‌هایی در بودجه توکن، روی مرز پاراگراف و جمله
+
+    مرز تکه‌ها تا حد امکان وابسته به محتواست: وقتی تکه دست‌کم min_fill بودجه را پر
+    کرده باشد، پس از واحدی بسته می‌شود که hash آن شرط anchor را دارد. پس ویرایش یک
+    پاراگراف فقط تکه‌های اطراف آن را تغییر می‌دهد و بقیه تکه‌ها (و خلاصه کش‌شده‌شان)
+    ثابت می‌مانند؛ با پر کردن حریصانه، هر تغییر طول مرز همه تکه‌های بعدی را جابه‌جا می‌کرد.
+    """
+    max_chars = max(int(max_tokens * chars_per_token), 200)
+    chunks = []
+    current: List[Tuple[str, str]] = []
+    size = 0
+    
+    def flush():
+        nonlocal current, size
+        if current:
+            chunks.append("".join(unit + separator for unit, separator in current).strip())
+        current, size = [], 0
+    
+    for unit, separator in _units(text, max_chars):
+        if current and size + len(unit) > max_chars:
+            flush()
+        current.append((unit, separator))
+        size += len(unit) + len(separator)
+        if size >= max_chars * min_fill and _is_anchor(unit, anchor_spacing):
+            flush()
+    flush()
+    return chunks